@@ -0,0 +1,290 @@
+'''
+Dataset catalog
+
+Indexes the plates, wells, measurements and patch files below data/images:
+
+    data/images/<plate>[/<well>[/<measurement>]]/patches/ or patches.ppk
+
+The index is kept in a SQLite file so a start-up does not have to walk the
+tree, and is mirrored in memory so every query is answered without touching
+the disk. refresh() does an mtime sweep: every known directory is stat'ed,
+but only directories whose mtime changed are listed again.
+
+The GUI shares one instance (get_app_data()) and refreshes it off the GUI
+thread through catalogLoader.CatalogRefresher.
+'''
+
+import os
+import time
+import zlib
+import sqlite3
+import threading
+
+from AppModules import patchPack
+
+DATA_DIR = "data/images"
+INDEX_PATH = os.path.join("data", "cache", "catalog.sqlite")
+PATCH_DIR_NAME = "patches"
+# plate / well / measurement
+MAX_DEPTH = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    source TEXT PRIMARY KEY,
+    plate TEXT NOT NULL,
+    well TEXT NOT NULL,
+    measurement TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS patches (
+    source TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (source, position)
+);
+"""
+
+
+def catalog_path(data_dir=DATA_DIR):
+    """The app's index for data/images, a separate one for any other directory."""
+    if os.path.abspath(data_dir) == os.path.abspath(DATA_DIR):
+        return INDEX_PATH
+    digest = zlib.crc32(os.path.abspath(data_dir).encode("utf-8"))
+    return os.path.join(os.path.dirname(INDEX_PATH), f"catalog-{digest:08x}.sqlite")
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class AppData:
+    def __init__(self, data_dir=DATA_DIR, index_path=None):
+        self.data_dir = data_dir
+        # the index only knows the directories of one data_dir
+        self.index_path = index_path or catalog_path(data_dir)
+        self._lock = threading.RLock()
+        self._dirs = {}      # directory -> mtime_ns of every scanned directory
+        self._records = {}   # source -> (plate, well, measurement, mtime_ns)
+        self._patches = {}   # source -> [patch sources in grid order]
+        self._by_key = {}    # (plate, well, measurement) -> source
+        self._plates = []
+        self._wells = {}
+        self._measurements = {}
+        self._ordered = []
+        self.last_refresh_seconds = 0.0
+        self._load_index()
+        self.refresh()
+
+    # ---- persistence -------------------------------------------------------
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.index_path)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _load_index(self):
+        try:
+            with self._connect() as connection:
+                self._dirs = dict(connection.execute("SELECT path, mtime_ns FROM dirs"))
+                for source, plate, well, measurement, mtime_ns in connection.execute(
+                        "SELECT source, plate, well, measurement, mtime_ns FROM records"):
+                    self._records[source] = (plate, well, measurement, mtime_ns)
+                    self._patches[source] = []
+                for source, _, path in connection.execute(
+                        "SELECT source, position, path FROM patches ORDER BY source, position"):
+                    self._patches.setdefault(source, []).append(path)
+        except sqlite3.DatabaseError:
+            # a corrupt index is rebuilt from scratch by the next refresh
+            self._dirs, self._records, self._patches = {}, {}, {}
+
+    def _save_changes(self, dirs, removed_dirs, records, removed_records):
+        with self._connect() as connection:
+            connection.executemany("DELETE FROM dirs WHERE path = ?", [(d,) for d in removed_dirs])
+            connection.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?)", dirs.items())
+            stale = [(s,) for s in list(removed_records) + list(records)]
+            connection.executemany("DELETE FROM records WHERE source = ?", stale)
+            connection.executemany("DELETE FROM patches WHERE source = ?", stale)
+            connection.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?)",
+                                   [(s,) + self._records[s] for s in records])
+            connection.executemany("INSERT INTO patches VALUES (?, ?, ?)",
+                                   [(s, i, p) for s in records for i, p in enumerate(self._patches[s])])
+
+    # ---- scanning ----------------------------------------------------------
+
+    def _scan_dir(self, directory, depth, changed_dirs, changed_records):
+        """Lists one directory and records the patch sources it contains."""
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        changed_dirs[directory] = _mtime_ns(directory)
+        self._dirs[directory] = changed_dirs[directory]
+
+        rel = os.path.relpath(directory, self.data_dir)
+        parts = [] if rel == "." else rel.replace("\\", "/").split("/")
+        if parts and (PATCH_DIR_NAME in names or patchPack.PACK_NAME in names):
+            self._index_source(directory, parts, changed_records)
+        if depth >= MAX_DEPTH:
+            return
+        for name in names:
+            child = os.path.join(directory, name)
+            if name == PATCH_DIR_NAME or child in self._dirs or not os.path.isdir(child):
+                continue
+            if name.endswith((".tmp", ".old")):
+                continue
+            self._scan_dir(child, depth + 1, changed_dirs, changed_records)
+
+    def _index_source(self, directory, parts, changed_records):
+        pack_path = os.path.join(directory, patchPack.PACK_NAME)
+        marker = pack_path if os.path.isfile(pack_path) else os.path.join(directory, PATCH_DIR_NAME)
+        mtime_ns = _mtime_ns(marker)
+        record = self._records.get(directory)
+        if record is not None and record[3] == mtime_ns:
+            return
+        plate, well, measurement = (parts + ["", ""])[:3]
+        self._records[directory] = (plate, well, measurement, mtime_ns)
+        self._patches[directory] = patchPack.list_patch_sources(directory)
+        changed_records.add(directory)
+
+    def refresh(self):
+        """
+        Brings the index up to date with the disk. Only directories whose
+        mtime changed are listed; returns True if anything changed.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            changed_dirs, changed_records, removed_dirs, removed_records = {}, set(), set(), set()
+            if not self._dirs:
+                self._scan_dir(self.data_dir, 0, changed_dirs, changed_records)
+            else:
+                for directory, mtime_ns in list(self._dirs.items()):
+                    current = _mtime_ns(directory)
+                    if current is None:
+                        removed_dirs.add(directory)
+                    elif current != mtime_ns:
+                        depth = 0 if directory == self.data_dir else \
+                            len(os.path.relpath(directory, self.data_dir).replace("\\", "/").split("/"))
+                        del self._dirs[directory]
+                        self._scan_dir(directory, depth, changed_dirs, changed_records)
+                # patches/ and packs change without touching their parent directory
+                for source in list(self._records):
+                    if source in removed_dirs or not os.path.isdir(source):
+                        removed_records.add(source)
+                        continue
+                    pack_path = os.path.join(source, patchPack.PACK_NAME)
+                    marker = pack_path if os.path.isfile(pack_path) else os.path.join(source, PATCH_DIR_NAME)
+                    if _mtime_ns(marker) != self._records[source][3]:
+                        rel = os.path.relpath(source, self.data_dir).replace("\\", "/").split("/")
+                        self._index_source(source, rel, changed_records)
+            for directory in removed_dirs:
+                self._dirs.pop(directory, None)
+            for source in removed_records:
+                self._records.pop(source, None)
+                self._patches.pop(source, None)
+
+            changed = bool(changed_records or removed_records or removed_dirs)
+            if changed or changed_dirs:
+                try:
+                    self._save_changes(changed_dirs, removed_dirs, changed_records, removed_records)
+                except sqlite3.Error:
+                    # the in-memory catalog is still correct, the next start rescans
+                    pass
+            if changed or not self._plates:
+                self._rebuild_views()
+        self.last_refresh_seconds = time.perf_counter() - start
+        return changed
+
+    def _rebuild_views(self):
+        self._by_key = {}
+        wells, measurements = {}, {}
+        for source, (plate, well, measurement, _) in self._records.items():
+            self._by_key[(plate, well, measurement)] = source
+            wells.setdefault(plate, set()).add(well)
+            measurements.setdefault((plate, well), set()).add(measurement)
+        self._plates = sorted(wells)
+        self._wells = {plate: sorted(w for w in names if w) for plate, names in wells.items()}
+        self._measurements = {key: sorted(m for m in names if m) for key, names in measurements.items()}
+        self._ordered = sorted(self._by_key)
+
+    # ---- queries -----------------------------------------------------------
+
+    def getPlateNames(self):
+        with self._lock:
+            return list(self._plates)
+
+    def getWellNames(self, plate):
+        with self._lock:
+            return list(self._wells.get(plate, []))
+
+    def getMeasurementNames(self, plate, well):
+        with self._lock:
+            return list(self._measurements.get((plate, well or ""), []))
+
+    def getRecordKeys(self, plates=None):
+        """(plate, well, measurement) of every record in catalog order, optionally of some plates only."""
+        with self._lock:
+            return [key for key in self._ordered if plates is None or key[0] in plates]
+
+    def getTotalRecords(self):
+        with self._lock:
+            return len(self._by_key)
+
+    def getDataByIndex(self, index):
+        """
+        The record at `index` as a dict (plate, well, measurement, patches);
+        index -1 returns every record.
+        """
+        with self._lock:
+            if index == -1:
+                return [self._record_dict(key) for key in self._ordered]
+            return self._record_dict(self._ordered[index])
+
+    def _record_dict(self, key):
+        plate, well, measurement = key
+        return {"plate": plate, "well": well, "measurement": measurement,
+                "patches": list(self._patches[self._by_key[key]])}
+
+    def getPatchImageFiles(self, plate, well=None, measurement=None):
+        """
+        Patch sources of one plate/well/measurement in grid order. Levels the
+        dataset does not have (e.g. plates without well folders) are ignored,
+        and a None well or measurement selects the first one available.
+        Safe to call from a worker thread while the catalog refreshes.
+        """
+        well = well or ""
+        measurement = measurement or ""
+        with self._lock:
+            for key in ((plate, well, measurement), (plate, well, ""), (plate, "", "")):
+                source = self._by_key.get(key)
+                if source is not None:
+                    return list(self._patches[source])
+            if not well:
+                wells = self._wells.get(plate)
+                if wells:
+                    return self.getPatchImageFiles(plate, wells[0], measurement)
+            elif not measurement:
+                measurements = self._measurements.get((plate, well))
+                if measurements:
+                    return self.getPatchImageFiles(plate, well, measurements[0])
+        return []
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_app_data():
+    """The process-wide catalog of DATA_DIR, shared by the main window and Page2."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = AppData()
+        return _shared
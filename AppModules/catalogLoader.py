@@ -0,0 +1,66 @@
+'''
+Refreshes the dataset catalog in the background.
+
+AppData.refresh() stats every known directory, which takes a noticeable
+fraction of a second on large trees, so it runs on a QThreadPool thread;
+catalogChanged is emitted on the GUI thread when the sweep found new,
+changed or removed plates, wells or measurements.
+'''
+
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from AppModules import tracing
+
+
+class _RefreshSignals(QObject):
+    done = Signal(object)  # True/False from refresh(), or the exception
+
+
+class _RefreshTask(QRunnable):
+    def __init__(self, signals, app_data):
+        super().__init__()
+        self.signals = signals
+        self.app_data = app_data
+
+    def run(self):
+        try:
+            with tracing.span("catalog refresh"):
+                changed = self.app_data.refresh()
+        except Exception as e:
+            changed = e
+        self.signals.done.emit(changed)
+
+
+class CatalogRefresher(QObject):
+    """
+    refresh() starts a sweep unless one is still running. catalogChanged()
+    follows a sweep that changed the catalog.
+    """
+    catalogChanged = Signal()
+
+    def __init__(self, app_data, pool=None, parent=None):
+        super().__init__(parent)
+        self.app_data = app_data
+        self.pool = pool or QThreadPool.globalInstance()
+        self._running = threading.Event()
+        self._signals = _RefreshSignals()
+        self._signals.done.connect(self._on_done)
+
+    def isRunning(self):
+        return self._running.is_set()
+
+    def refresh(self):
+        if self._running.is_set():
+            return False
+        self._running.set()
+        self.pool.start(_RefreshTask(self._signals, self.app_data))
+        return True
+
+    def _on_done(self, changed):
+        self._running.clear()
+        if isinstance(changed, Exception):
+            tracing.instant("catalog refresh failed", error=str(changed))
+        elif changed:
+            self.catalogChanged.emit()
@@ -0,0 +1,180 @@
+'''
+Runs the cell counter for Page2 in the background.
+
+All patches of a well go to one worker process in a single batched
+cellCount call, so the GUI thread only ever receives finished counts.
+Counts are remembered per source path and mtime. CellContourLoader does
+the same for the cell outlines of the patch shown in the viewer.
+'''
+
+import time
+import threading
+
+from PySide6.QtCore import QObject, Signal
+
+from AppModules import cellCount, patchClassifier, tracing
+from AppModules.imageIO import source_mtime_ns
+
+_counts = {}  # (path, mtime_ns) -> count
+_counts_lock = threading.Lock()
+
+
+def _key(path):
+    try:
+        return (path, source_mtime_ns(path))
+    except OSError:
+        return None
+
+
+class _CountSignals(QObject):
+    done = Signal(int, object)  # generation, future
+
+
+class CellCountLoader(QObject):
+    """
+    countsReady({path: count}) is emitted once per count() call, with every
+    readable patch of the request; unreadable patches are left out.
+    """
+    countsReady = Signal(dict)
+
+    def __init__(self, min_area=cellCount.DEFAULT_MIN_AREA, workers=None, parent=None):
+        super().__init__(parent)
+        self.min_area = min_area
+        self.workers = workers
+        self.generation = 0
+        self.last_seconds = None
+        self._future = None
+        self._known = {}
+        self._start = 0.0
+        self._signals = _CountSignals()
+        self._signals.done.connect(self._on_done)
+
+    def cached(self, path):
+        key = _key(path)
+        with _counts_lock:
+            return _counts.get(key) if key is not None else None
+
+    def count(self, paths):
+        """Cancels the previous request and counts the cells of `paths`."""
+        self.cancel()
+        self.generation += 1
+        self._known = {}
+        todo = []
+        for path in paths:
+            count = self.cached(path)
+            if count is not None:
+                self._known[path] = count
+            else:
+                todo.append(path)
+        if not todo:
+            self.countsReady.emit(dict(self._known))
+            return self.generation
+        self._start = time.perf_counter()
+        self._future = patchClassifier.submit(cellCount.count_cells_in_patches, todo, self.min_area,
+                                              workers=self.workers)
+        signals = self._signals
+        generation = self.generation
+        # runs on the executor's thread; the signal hops to the GUI thread
+        self._future.add_done_callback(lambda f: f.cancelled() or signals.done.emit(generation, f))
+        return self.generation
+
+    def cancel(self):
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+    def _on_done(self, generation, future):
+        if generation != self.generation:
+            return
+        self._future = None
+        try:
+            result = future.result()
+        except Exception as e:
+            tracing.instant("cell counting failed", error=str(e))
+            return
+        self.last_seconds = time.perf_counter() - self._start
+        tracing.complete("cell count", self._start, self.last_seconds, patches=len(result["counts"]),
+                         cache_hits=result["cache_hits"])
+        counts = dict(self._known)
+        for path, count in result["counts"].items():
+            if count is None:
+                continue
+            counts[path] = count
+            key = _key(path)
+            if key is not None:
+                with _counts_lock:
+                    _counts[key] = count
+        self.countsReady.emit(counts)
+
+
+_contours = {}  # (path, mtime_ns) -> contours_in_patch() result
+_contours_lock = threading.Lock()
+# outlines of this many patches are kept; each holds a few thousand small arrays
+MAX_CACHED_CONTOURS = 32
+
+
+class CellContourLoader(QObject):
+    """
+    Finds the cell outlines of one patch at a time in a worker process.
+    contoursReady(path, result) is emitted for the latest request only, with
+    the dict of cellCount.contours_in_patch(); unreadable patches emit nothing.
+    """
+    contoursReady = Signal(str, dict)
+
+    def __init__(self, min_area=cellCount.DEFAULT_MIN_AREA, workers=None, parent=None):
+        super().__init__(parent)
+        self.min_area = min_area
+        self.workers = workers
+        self.generation = 0
+        self.last_seconds = None
+        self._future = None
+        self._path = None
+        self._start = 0.0
+        self._signals = _CountSignals()
+        self._signals.done.connect(self._on_done)
+
+    def cached(self, path):
+        key = _key(path)
+        with _contours_lock:
+            return _contours.get(key) if key is not None else None
+
+    def load(self, path):
+        """Cancels the previous request and finds the outlines of `path`."""
+        self.cancel()
+        self.generation += 1
+        self._path = path
+        result = self.cached(path)
+        if result is not None:
+            self.contoursReady.emit(path, result)
+            return self.generation
+        self._start = time.perf_counter()
+        self._future = patchClassifier.submit(cellCount.contours_in_patch, path, self.min_area,
+                                              workers=self.workers)
+        signals = self._signals
+        generation = self.generation
+        self._future.add_done_callback(lambda f: f.cancelled() or signals.done.emit(generation, f))
+        return self.generation
+
+    def cancel(self):
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+    def _on_done(self, generation, future):
+        if generation != self.generation:
+            return
+        self._future = None
+        try:
+            result = future.result()
+        except Exception as e:
+            tracing.instant("cell contours failed", path=self._path, error=str(e))
+            return
+        self.last_seconds = time.perf_counter() - self._start
+        tracing.complete("cell contours", self._start, self.last_seconds, cells=len(result["contours"]))
+        key = _key(self._path)
+        if key is not None:
+            with _contours_lock:
+                _contours[key] = result
+                while len(_contours) > MAX_CACHED_CONTOURS:
+                    del _contours[next(iter(_contours))]
+        self.contoursReady.emit(self._path, result)
@@ -0,0 +1,119 @@
+'''
+Runs the patch classifier for the grids in the background.
+
+Batches go to the patchClassifier worker processes; as each batch finishes
+its scores are emitted on the GUI thread, so highlights appear while the
+rest of the plate is still being scored. Scores are remembered per source
+path and mtime, so switching back to a plate does not score it again.
+'''
+
+import os
+import time
+import threading
+
+from PySide6.QtCore import QObject, Signal
+
+from AppModules import patchClassifier, tracing
+from AppModules.imageIO import source_mtime_ns
+
+_scores = {}  # (path, mtime_ns, model_spec) -> (score, highlighted)
+_scores_lock = threading.Lock()
+
+
+class _ClassifierSignals(QObject):
+    batchDone = Signal(int, object)  # generation, classify_batch result
+
+
+class ClassificationLoader(QObject):
+    """
+    patchScored(path, score, highlighted) is emitted for every patch of the
+    current generation; finished(stats) once all its batches are done, with
+    the patchClassifier.throughput() numbers. Unreadable patches are skipped.
+    """
+    patchScored = Signal(str, float, bool)
+    finished = Signal(dict)
+
+    def __init__(self, model_spec=patchClassifier.DEFAULT_MODEL, batch_size=patchClassifier.DEFAULT_BATCH_SIZE,
+                 workers=None, parent=None):
+        super().__init__(parent)
+        self.model_spec = model_spec
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.generation = 0
+        self.last_stats = None
+        self._futures = []
+        self._results = []
+        self._remaining = 0
+        self._start = 0.0
+        self._signals = _ClassifierSignals()
+        self._signals.batchDone.connect(self._on_batch)
+        # the owning grid may be deleted mid-run; drop its queued batches too
+        futures = self._futures
+        self.destroyed.connect(lambda *_: [f.cancel() for f in futures])
+
+    def _key(self, path):
+        try:
+            return (path, source_mtime_ns(path), self.model_spec)
+        except OSError:
+            return None
+
+    def classify(self, paths):
+        """Cancels any running work and scores `paths`. Returns the new generation."""
+        self.cancel()
+        self.generation += 1
+        generation = self.generation
+        todo = []
+        for path in paths:
+            key = self._key(path)
+            with _scores_lock:
+                known = _scores.get(key) if key is not None else None
+            if known is not None:
+                self.patchScored.emit(path, known[0], known[1])
+            elif key is not None:
+                todo.append(path)
+        self._results = []
+        self._start = time.perf_counter()
+        jobs = patchClassifier.batches(todo, self.batch_size)
+        self._remaining = len(jobs)
+        if not jobs:
+            return generation
+        signals = self._signals
+        for batch in jobs:
+            future = patchClassifier.submit_batch(batch, self.model_spec, self.workers)
+            # runs on the executor's thread; the signal hops to the GUI thread
+            future.add_done_callback(lambda f, g=generation: f.cancelled() or signals.batchDone.emit(g, f))
+            self._futures.append(future)
+        return generation
+
+    def cancel(self):
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+        self._remaining = 0
+
+    def _on_batch(self, generation, future):
+        if generation != self.generation:
+            return
+        self._remaining -= 1
+        try:
+            result = future.result()
+        except Exception as e:
+            tracing.instant("patch classification failed", error=str(e))
+            result = None
+        if result is not None:
+            self._results.append(result)
+            for path, score, highlighted in zip(result["paths"], result["scores"], result["highlighted"]):
+                if score is None:
+                    continue
+                key = self._key(path)
+                if key is not None:
+                    with _scores_lock:
+                        _scores[key] = (score, highlighted)
+                self.patchScored.emit(path, score, highlighted)
+        if self._remaining == 0:
+            self._futures.clear()
+            self.last_stats = patchClassifier.throughput(self._results, time.perf_counter() - self._start,
+                                                         self.workers)
+            tracing.complete("classify", self._start, self.last_stats["wall_seconds"],
+                             patches=self.last_stats["patches"], cache_hits=self.last_stats["cache_hits"])
+            self.finished.emit(self.last_stats)
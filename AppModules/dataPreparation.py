@@ -1,34 +1,603 @@
 '''
 Cut images to 4x4 grid
 
+Tiles every plate under data/images into a patches/ directory (or a single
+patches.ppk pack, see patchPack). Plates are
+processed in parallel and a manifest remembers what was tiled with which
+parameters, so re-running only touches new or changed source images.
+The grid, patch size, stride and overlap are configurable, and a streaming
+mode keeps peak memory bounded for very large sources. Patch files can be
+written with any of the patchCodecs (PNG at any level, lossless WebP, raw
+TIFF/PPM, ...); --benchmark-codecs compares them on the tiled patches.
+
 '''
 
 from PIL import Image
-import os 
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def cut_image_into_4x4(image_path, output_prefix="patch", output_dir="data"):
-    img = Image.open(image_path)
+from AppModules import patchCodecs, patchPack, resultCache, thumbnailCache, tracing
+from AppModules.memoryStats import peak_rss_bytes, reset_peak_rss
+
+DATA_DIR = "data/images"
+PATCH_DIR_NAME = "patches"
+MANIFEST_NAME = "tiling_manifest.json"
+MANIFEST_VERSION = 1
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".ppm", ".pgm")
+
+# Bits per pixel of the raw layouts that can be decoded band by band
+RAW_BITS_PER_PIXEL = {
+    "1": 1, "L": 8, "P": 8, "I;16": 16, "I;16B": 16, "I;16L": 16,
+    "RGB": 24, "BGR": 24, "RGBA": 32, "BGRA": 32, "RGBX": 32, "BGRX": 32,
+    "I": 32, "I;32": 32, "F": 32, "F;32F": 32,
+}
+
+TILING_DEFAULTS = {
+    "rows": 4,
+    "cols": 4,
+    "patch_size": None,
+    "stride": None,
+    "overlap": 0,
+    "output_prefix": "patch",
+    "streaming": False,
+    "max_decode_pixels": None,
+    "layout": "png",
+    "pack_codec": "raw",
+    "patch_codec": patchCodecs.DEFAULT_CODEC,
+}
+
+
+def _pair(value):
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return (value, value)
+    return (int(value[0]), int(value[1]))
+
+
+def tile_boxes(width, height, rows=4, cols=4, patch_size=None, stride=None, overlap=0):
+    """
+    Returns [(row, col, (left, upper, right, lower)), ...] covering the image.
+
+    With patch_size (int or (w, h)) patches of that size are laid out every
+    stride pixels (default: patch_size - overlap) and partial patches at the
+    right/bottom edge are dropped. Otherwise the image is split into a
+    rows x cols grid and overlap widens every cell into its neighbours.
+    """
+    patch_size = _pair(patch_size)
+    if patch_size is not None:
+        pw, ph = patch_size
+        sx, sy = _pair(stride) or (pw - overlap, ph - overlap)
+        if pw <= 0 or ph <= 0 or sx <= 0 or sy <= 0:
+            raise ValueError("patch size and stride must be positive")
+        boxes = []
+        for i, upper in enumerate(range(0, height - ph + 1, sy)):
+            for j, left in enumerate(range(0, width - pw + 1, sx)):
+                boxes.append((i, j, (left, upper, left + pw, upper + ph)))
+        return boxes
+
+    if rows <= 0 or cols <= 0:
+        raise ValueError("rows and cols must be positive")
+    patch_width = width // cols
+    patch_height = height // rows
+    boxes = []
+    for i in range(rows):
+        for j in range(cols):
+            left = max(0, j * patch_width - overlap)
+            upper = max(0, i * patch_height - overlap)
+            right = min(width, (j + 1) * patch_width + overlap)
+            lower = min(height, (i + 1) * patch_height + overlap)
+            boxes.append((i, j, (left, upper, right, lower)))
+    return boxes
+
+
+def _draft_reduction(img, max_decode_pixels):
+    """Lets the JPEG decoder scale down by 1/2, 1/4 or 1/8 while decoding."""
+    width, height = img.size
+    if not max_decode_pixels or width * height <= max_decode_pixels:
+        return 1
+    if img.format != "JPEG":
+        return 1
+    scale = 1
+    while scale < 8 and (width // scale) * (height // scale) > max_decode_pixels:
+        scale *= 2
+    img.draft(img.mode, (width // scale, height // scale))
+    return width // img.size[0] if img.size[0] else 1
+
+
+def _raw_band_reader(img, image_path):
+    """
+    Returns read_band(upper, lower) for uncompressed single-strip images
+    (BMP, PPM/PGM, uncompressed TIFF) so only the rows of one band are ever
+    in memory. Returns None for formats that need a full decode.
+    """
+    if len(img.tile) != 1:
+        return None
+    codec, extents, offset, args = img.tile[0][:4]
+    if codec != "raw" or tuple(extents) != (0, 0) + img.size:
+        return None
+    if isinstance(args, str):
+        args = (args,)
+    rawmode = args[0]
+    stride = args[1] if len(args) > 1 else 0
+    orientation = args[2] if len(args) > 2 else 1
+    bits = RAW_BITS_PER_PIXEL.get(rawmode)
+    if bits is None or orientation not in (1, -1):
+        return None
     width, height = img.size
-    patch_width = width // 4
-    patch_height = height // 4
-
-    for i in range(4):
-        for j in range(4):
-            left = j * patch_width
-            upper = i * patch_height
-            right = (j + 1) * patch_width
-            lower = (i + 1) * patch_height
-            box = (left, upper, right, lower)
-            patch = img.crop(box)
-            patch.save(os.path.join(output_dir,f"{output_prefix}_{i}_{j}.png")) # Save patches with a naming convention
+    if not stride:
+        stride = (width * bits + 7) // 8
+    # frombuffer only sees pixel indices, so palette images need their palette back
+    palette_mode = img.palette.mode if img.mode in ("P", "PA") and img.palette else None
+    palette = img.getpalette(palette_mode) if palette_mode else None
+
+    def read_band(upper, lower):
+        band_height = lower - upper
+        # bottom-up images store the last row first
+        first_row = upper if orientation == 1 else height - lower
+        with open(image_path, "rb") as f:
+            f.seek(offset + first_row * stride)
+            data = f.read(band_height * stride)
+        band = Image.frombuffer(img.mode, (width, band_height), data, "raw", rawmode, stride, orientation)
+        if palette is not None:
+            band.putpalette(palette, palette_mode)
+            band.info.update(img.info)
+        return band
+
+    return read_band
+
+
+def iter_patches(image_path, rows=4, cols=4, patch_size=None, stride=None, overlap=0,
+                 streaming=False, max_decode_pixels=None, info=None):
+    """
+    Yields (row, col, patch) for image_path.
+
+    In streaming mode the source is decoded one band of patch rows at a time
+    where the format allows it, and JPEGs larger than max_decode_pixels are
+    decoded at reduced resolution, so peak memory stays bounded by the band
+    rather than the whole bitmap. If given, `info` is filled with the patch
+    count and the decode strategy that was used ("band", "draft" or "full").
+    """
+    info = {} if info is None else info
+    img = Image.open(image_path)
+    try:
+        reduction = _draft_reduction(img, max_decode_pixels) if streaming else 1
+        width, height = img.size
+        boxes = tile_boxes(width, height, rows, cols, patch_size, stride, overlap)
+        read_band = _raw_band_reader(img, image_path) if streaming else None
+        info["patches"] = len(boxes)
+        info["reduction"] = reduction
+        info["decode"] = "band" if read_band else "draft" if reduction > 1 else "full"
+
+        if read_band is not None:
+            bands = {}
+            for i, j, box in boxes:
+                bands.setdefault((box[1], box[3]), []).append((i, j, box))
+            for (upper, lower), band_boxes in sorted(bands.items()):
+                band = read_band(upper, lower)
+                for i, j, (left, _, right, _) in band_boxes:
+                    yield i, j, band.crop((left, 0, right, lower - upper))
+                del band
+        else:
+            for i, j, box in boxes:
+                yield i, j, img.crop(box)
+    finally:
+        img.close()
+
+
+def cut_image(image_path, output_dir="data", output_prefix="patch", layout="png", pack_codec="raw",
+              patch_codec=patchCodecs.DEFAULT_CODEC, **options):
+    """
+    Cuts image_path into patches named {output_prefix}_{row}_{col}.
+
+    With layout="png" every patch is saved as one file in output_dir, in the
+    format of patch_codec (see patchCodecs; PNG by default); with
+    layout="pack" all patches go into the single pack file output_dir
+    (see patchPack). The remaining keyword arguments are the iter_patches
+    options. Returns a dict with the patch count and decode strategy.
+    """
+    info = {}
+    patches = iter_patches(image_path, info=info, **options)
+    if layout == "pack":
+        with patchPack.PatchPackWriter(output_dir, codec=pack_codec) as writer:
+            for i, j, patch in patches:
+                writer.add(f"{output_prefix}_{i}_{j}", patch, i, j)
+    elif layout == "png":
+        codec = patchCodecs.get_codec(patch_codec)
+        for i, j, patch in patches:
+            codec.save(patch, os.path.join(output_dir, f"{output_prefix}_{i}_{j}")) # Save patches with a naming convention
+    else:
+        raise ValueError(f"unknown patch layout {layout!r}")
+    return info
+
+
+def cut_image_in_memory(image_path, name=None, output_prefix="patch", rows=4, cols=4,
+                        patch_size=None, stride=None, overlap=0):
+    """
+    Cuts image_path into patches that are only kept in memory and returns
+    their "mem://<name>/<output_prefix>_<row>_<col>" references (see
+    imageBridge) in grid order, ready for the grids and viewers without
+    writing and decoding PNGs. The image is decoded once; every patch is a
+    view into that one array, so no pixels are copied. Needs Qt and NumPy.
+    """
+    import numpy as np
+    from AppModules import imageBridge
+    name = name or os.path.splitext(os.path.basename(image_path))[0]
+    with Image.open(image_path) as img:
+        if img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGB")
+        pixels = np.asarray(img)
+    imageBridge.clear_registry(name + "/")
+    height, width = pixels.shape[:2]
+    return [imageBridge.register(f"{name}/{output_prefix}_{i}_{j}", pixels[top:bottom, left:right])
+            for i, j, (left, top, right, bottom) in tile_boxes(width, height, rows, cols, patch_size, stride, overlap)]
+
+
+def cut_image_into_4x4(image_path, output_prefix="patch", output_dir="data"):
+    return cut_image(image_path, output_dir=output_dir, output_prefix=output_prefix)
+
+
+def tiling_params(**options):
+    """Parameters that affect the patch output; a change forces re-tiling."""
+    unknown = set(options) - set(TILING_DEFAULTS)
+    if unknown:
+        raise TypeError("unknown tiling options: {}".format(", ".join(sorted(unknown))))
+    params = dict(TILING_DEFAULTS)
+    params.update(options)
+    for key in ("patch_size", "stride"):
+        if params[key] is not None:
+            params[key] = list(_pair(params[key]))
+    patchCodecs.get_codec(params["patch_codec"])  # fail early on an unknown codec
+    return params
+
+
+def find_source_images(input_dir=DATA_DIR):
+    """
+    Returns (plate_dir, source_image_path) for every plate directory in
+    input_dir. The source image is the first image file of the plate, the
+    patches directory and any leftovers from interrupted runs are ignored.
+    """
+    sources = []
+    if not os.path.isdir(input_dir):
+        return sources
+    for name in sorted(os.listdir(input_dir)):
+        plate_dir = os.path.join(input_dir, name)
+        if not os.path.isdir(plate_dir):
+            continue
+        images = [f for f in sorted(os.listdir(plate_dir))
+                  if f.lower().endswith(IMAGE_EXTENSIONS)
+                  and os.path.isfile(os.path.join(plate_dir, f))]
+        if images:
+            sources.append((plate_dir, os.path.join(plate_dir, images[0])))
+    return sources
+
+
+def in_shard(name, shard):
+    """
+    Whether a plate belongs to shard (index, count), index counting from 1.
+    Plates are spread by a stable hash of their name, so every process of a
+    sharded run agrees on the split without talking to the others.
+    """
+    if shard is None:
+        return True
+    index, count = shard
+    return zlib.crc32(name.encode("utf-8")) % count == index - 1
+
+
+def manifest_name(shard=None):
+    """Sharded runs keep their own manifest, so parallel shards never overwrite each other's progress."""
+    if shard is None:
+        return MANIFEST_NAME
+    root, ext = os.path.splitext(MANIFEST_NAME)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+
+def load_manifest(input_dir=DATA_DIR, name=MANIFEST_NAME):
+    manifest_path = os.path.join(input_dir, name)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "images": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "images": {}}
+    return manifest
+
+
+def save_manifest(manifest, input_dir=DATA_DIR, name=MANIFEST_NAME):
+    """Writes the manifest through a temp file so it is never half-written."""
+    manifest_path = os.path.join(input_dir, name)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, manifest_path)
+
+
+def source_signature(image_path):
+    st = os.stat(image_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def output_path(plate_dir, layout="png"):
+    """Where the patches of a plate go: the patches/ directory or patches.ppk."""
+    if layout == "pack":
+        return os.path.join(plate_dir, patchPack.PACK_NAME)
+    return os.path.join(plate_dir, PATCH_DIR_NAME)
+
+
+def remove_other_layout(plate_dir, layout):
+    """
+    Removes what the layout that was not chosen left in plate_dir, so a plate
+    re-tiled as PNGs stops serving the tiles of an earlier pack and vice versa.
+    """
+    other = output_path(plate_dir, "png" if layout == "pack" else "pack")
+    if not os.path.exists(other):
+        return
+    # drops its thumbnails and decoded images and unmaps the pack first
+    thumbnailCache.invalidate_group(other)
+    if os.path.isdir(other):
+        shutil.rmtree(other, ignore_errors=True)
+    else:
+        os.remove(other)
+    resultCache.get_result_cache().forget_missing(other)
+
+
+def is_up_to_date(entry, image_path, params, output_dir):
+    """True when the manifest entry matches the source file and parameters."""
+    if not entry or not os.path.exists(output_dir):
+        return False
+    try:
+        signature = source_signature(image_path)
+    except OSError:
+        return False
+    # options added after an entry was written count as their defaults
+    stored = dict(TILING_DEFAULTS, **entry.get("params", {}))
+    return (entry.get("size") == signature["size"]
+            and entry.get("mtime_ns") == signature["mtime_ns"]
+            and stored == params)
+
+
+def replace_directory(tmp_dir, final_dir):
+    """
+    Moves a fully written tmp_dir into place. The old directory is renamed
+    aside first, so a crash at any point leaves either the old or the new
+    patch set, never a mix of both.
+    """
+    old_dir = final_dir + ".old"
+    if os.path.isdir(old_dir):
+        shutil.rmtree(old_dir)
+    if os.path.isdir(final_dir):
+        os.replace(final_dir, old_dir)
+    os.replace(tmp_dir, final_dir)
+    if os.path.isdir(old_dir):
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def tile_image(image_path, output_dir, params):
+    """
+    Tiles one source image into output_dir atomically. Runs in a worker
+    process and returns the manifest entry, including the wall time and the
+    peak RSS of the worker while it processed this image. Where the peak
+    cannot be reset (anywhere but Linux) it is the worker's peak so far,
+    which peak_rss_scope records as "process" instead of "image".
+    """
+    per_image_peak = reset_peak_rss()
+    start = time.perf_counter()
+    signature = source_signature(image_path)
+    with tracing.span("tile image", path=image_path):
+        if params["layout"] == "pack":
+            # the pack writer already writes to a temp file and renames it into place
+            result = cut_image(image_path, output_dir=output_dir, **params)
+        else:
+            result = _cut_image_atomic(image_path, output_dir, params)
+    entry = dict(signature)
+    entry["params"] = params
+    entry["patches"] = result["patches"]
+    entry["decode"] = result["decode"]
+    entry["seconds"] = round(time.perf_counter() - start, 4)
+    entry["peak_rss"] = peak_rss_bytes()
+    entry["peak_rss_scope"] = "image" if per_image_peak else "process"
+    return entry
+
+
+def _cut_image_atomic(image_path, output_dir, params):
+    tmp_dir = output_dir + ".tmp"
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    try:
+        result = cut_image(image_path, output_dir=tmp_dir, **params)
+        replace_directory(tmp_dir, output_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return result
+
+
+def tile_dataset(input_dir=DATA_DIR, workers=None, force=False, shard=None, **options):
+    """
+    Tiles every plate of input_dir, skipping images whose size, mtime and
+    tiling parameters match the manifest. shard=(index, count) only tiles
+    the plates of that shard (see in_shard) and records them in the shard's
+    own manifest. Extra keyword arguments are the cut_image tiling options.
+    Returns a report dict with counts, elapsed seconds, images per second
+    and per-image wall time / peak RSS.
+    """
+    start = time.perf_counter()
+    params = tiling_params(**options)
+    name = manifest_name(shard)
+    manifest = load_manifest(input_dir, name)
+    entries = manifest["images"]
+    # a shard also trusts what an unsharded run already tiled
+    shared = load_manifest(input_dir)["images"] if shard is not None else {}
+
+    jobs = []
+    skipped = 0
+    for plate_dir, image_path in find_source_images(input_dir):
+        if not in_shard(os.path.basename(plate_dir), shard):
+            continue
+        key = os.path.relpath(image_path, input_dir).replace("\\", "/")
+        output_dir = output_path(plate_dir, params["layout"])
+        if not force and (is_up_to_date(entries.get(key), image_path, params, output_dir)
+                          or is_up_to_date(shared.get(key), image_path, params, output_dir)):
+            skipped += 1
+            continue
+        jobs.append((key, image_path, output_dir))
+        # a pack this process has mapped cannot be replaced on Windows
+        thumbnailCache.invalidate_group(output_dir)
+
+    failed = {}
+    per_image = {}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+
+    def _record(key, entry, output_dir):
+        entries[key] = entry
+        thumbnailCache.invalidate_group(output_dir)
+        # patches of the old tiling that were not written again (e.g. another codec)
+        resultCache.get_result_cache().forget_missing(output_dir)
+        remove_other_layout(os.path.dirname(output_dir), params["layout"])
+        per_image[key] = {k: entry[k] for k in ("seconds", "peak_rss", "decode", "patches")}
+        per_image[key]["peak_rss_scope"] = entry.get("peak_rss_scope", "image")
+        tracing.counter("tiling", tiled=len(per_image), failed=len(failed))
+        # Persist progress as we go so an interrupted run resumes where it stopped
+        save_manifest(manifest, input_dir, name)
+
+    if workers == 1:
+        for key, image_path, output_dir in jobs:
+            try:
+                _record(key, tile_image(image_path, output_dir, params), output_dir)
+            except Exception as exc:
+                failed[key] = str(exc)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(tile_image, image_path, output_dir, params): (key, output_dir)
+                       for key, image_path, output_dir in jobs}
+            for future in as_completed(futures):
+                key, output_dir = futures[future]
+                try:
+                    entry = future.result()
+                    # worker processes do not trace; place their span by its end and duration
+                    tracing.complete("tile image", time.perf_counter() - entry["seconds"], entry["seconds"],
+                                     path=key, patches=entry["patches"], decode=entry["decode"])
+                    _record(key, entry, output_dir)
+                except Exception as exc:
+                    failed[key] = str(exc)
+
+    elapsed = time.perf_counter() - start
+    tracing.complete("tile dataset", start, elapsed, tiled=len(per_image), skipped=skipped, workers=workers)
+    return {
+        "tiled": len(per_image),
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": elapsed,
+        "images_per_second": len(per_image) / elapsed if elapsed > 0 else 0.0,
+        "images": per_image,
+    }
+
+
+def format_report(report, per_image=False):
+    """
+    One summary line, plus one line per image with per_image. Peaks marked
+    "worker lifetime" come from platforms where the peak RSS cannot be reset
+    between images, so they also cover the images the worker tiled before.
+    """
+    line = "tiled {tiled}, skipped {skipped}, failed {failed} in {seconds:.2f}s ({images_per_second:.2f} images/s)"
+    lines = [line.format(**dict(report, failed=len(report["failed"])))]
+    if per_image:
+        for key, stats in sorted(report["images"].items()):
+            rss = stats["peak_rss"]
+            rss = "n/a" if rss is None else "{:.1f} MB".format(rss / 2**20)
+            if stats["peak_rss"] is not None and stats.get("peak_rss_scope") == "process":
+                rss += " (worker lifetime)"
+            lines.append("  {}: {:.3f}s, peak RSS {}, {} patches, {} decode".format(
+                key, stats["seconds"], rss, stats["patches"], stats["decode"]))
+    return "\n".join(lines)
+
+
+def _parse_size(value):
+    parts = value.lower().split("x")
+    return int(parts[0]) if len(parts) == 1 else (int(parts[0]), int(parts[1]))
+
+
+def _codec_spec(value):
+    import argparse
+    try:
+        return patchCodecs.get_codec(value).name
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def add_tiling_arguments(parser):
+    """Adds the tiling options to an argparse parser."""
+    parser.add_argument("--grid", default="4x4", help="rows x cols of the patch grid, e.g. 8x8")
+    parser.add_argument("--patch-size", type=_parse_size, default=None, help="fixed patch size WxH, overrides --grid")
+    parser.add_argument("--stride", type=_parse_size, default=None, help="step between patches WxH")
+    parser.add_argument("--overlap", type=int, default=0)
+    parser.add_argument("--streaming", action="store_true", help="decode large sources band by band")
+    parser.add_argument("--max-decode-pixels", type=int, default=None,
+                        help="decode JPEGs above this many pixels at reduced resolution (streaming only)")
+    parser.add_argument("--layout", choices=("png", "pack"), default="png",
+                        help="one file per patch (see --codec) or a single patches.ppk pack per image")
+    parser.add_argument("--pack-codec", choices=patchPack.CODECS, default="raw")
+    parser.add_argument("--codec", type=_codec_spec, default=patchCodecs.DEFAULT_CODEC,
+                        help="patch file format: " + ", ".join(patchCodecs.codec_names()) + ", png:<0-9> or jpeg:<1-100>")
+
+
+def tiling_options_from_args(args):
+    rows, cols = _parse_size(args.grid) if "x" in args.grid else (int(args.grid), int(args.grid))
+    return {
+        "rows": rows,
+        "cols": cols,
+        "patch_size": args.patch_size,
+        "stride": args.stride,
+        "overlap": args.overlap,
+        "streaming": args.streaming,
+        "max_decode_pixels": args.max_decode_pixels,
+        "layout": args.layout,
+        "pack_codec": args.pack_codec,
+        "patch_codec": args.codec,
+    }
+
 
 # Example usage:
-input_dir = "data/images"
-images = os.listdir(input_dir)
-for i in images:
-    data_path = os.path.join(input_dir,i)
-    files = os.listdir(data_path)
-    file_path = os.path.join(data_path,files[0])
-    op_path = os.path.join(data_path,"patches")
-    os.makedirs(op_path,exist_ok=True)
-    cut_image_into_4x4(file_path,output_dir=op_path)
+#   python -m AppModules.dataPreparation [input_dir] [--force] [--workers N] [--grid 8x8] [--streaming]
+#   python -m AppModules.dataPreparation --codec webp          # lossless WebP patches
+#   python -m AppModules.dataPreparation --benchmark-codecs    # compare codecs on the tiled patches
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Cut every plate image into patches")
+    parser.add_argument("input_dir", nargs="?", default=DATA_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="re-tile even if the manifest is up to date")
+    parser.add_argument("--verbose", action="store_true", help="print wall time and peak RSS per image")
+    parser.add_argument("--trace", metavar="PATH", default=None, help="write a Chrome trace of the run to PATH")
+    parser.add_argument("--benchmark-codecs", nargs="?", const="png,png:1,webp,tiff,ppm,jpeg", default=None,
+                        metavar="CODECS", help="compare encode/decode time and size of patch codecs instead of tiling")
+    add_tiling_arguments(parser)
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable(args.trace)
+
+    if args.benchmark_codecs:
+        patches = patchCodecs.sample_patches(args.input_dir)
+        if not patches:
+            sys.exit(f"no tiled patches found below {args.input_dir}")
+        print(f"{len(patches)} patches of {patches[0].size[0]}x{patches[0].size[1]}")
+        print(patchCodecs.format_benchmark(patchCodecs.benchmark(patches, args.benchmark_codecs.split(","))))
+        sys.exit(0)
+
+    report = tile_dataset(args.input_dir, workers=args.workers, force=args.force,
+                          **tiling_options_from_args(args))
+    print(format_report(report, per_image=args.verbose))
+    for key, error in report["failed"].items():
+        print(f"  {key}: {error}", file=sys.stderr)
+    sys.exit(1 if report["failed"] else 0)
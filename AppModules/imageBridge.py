@@ -0,0 +1,226 @@
+'''
+Zero-copy conversions between NumPy arrays and QImages, and in-memory
+patch sources.
+
+    image = qimage_from_array(array)      # wraps the array's buffer
+    array = array_from_qimage(image)      # view onto the image's pixels
+
+Wrapping never copies for uint8 arrays of shape (H, W), (H, W, 3) or
+(H, W, 4) whose pixels are contiguous within a row (any row stride works,
+so crops of a larger array can be wrapped too). The wrapped object is kept
+alive by the Python side of the result; QPixmap.fromImage() and copies made
+in C++ are fine, but a wrapper must not be handed to another thread through
+a queued signal after its Python owner is gone - use detached() for that.
+PIL images cannot export their memory, so qimage_from_pil() copies once.
+
+Patches that only exist in memory (freshly tiled or processed) can be
+registered as "mem://<name>" sources. imageIO, and with it the grids, the
+viewers and the ImageService, reads them like files:
+
+    refs = [register(f"plate1/patch_{r}_{c}", tile) for (r, c), tile in tiles]
+    grid.setImagePaths(refs)
+
+Worker processes cannot see this process' registry, so the classifier and
+the cell counter treat memory sources as unreadable.
+
+stats() counts wrapped images and views, and every copy with its size, so
+the copies and allocations per frame can be measured.
+'''
+
+import threading
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+from AppModules import tracing
+from AppModules.imageIO import MEMORY_PREFIX
+
+_FORMATS = {1: QImage.Format_Grayscale8, 3: QImage.Format_RGB888, 4: QImage.Format_RGBA8888}
+# QImage formats that can be viewed as uint8 arrays, with their channel count
+_CHANNELS = {
+    QImage.Format_Grayscale8: 1,
+    QImage.Format_RGB888: 3,
+    QImage.Format_RGBA8888: 4,
+    QImage.Format_RGBA8888_Premultiplied: 4,
+    QImage.Format_RGBX8888: 4,
+}
+
+_stats_lock = threading.Lock()
+_stats = {"wrapped": 0, "views": 0, "copies": 0, "copied_bytes": 0}
+
+
+def _count(kind, nbytes=0):
+    with _stats_lock:
+        _stats[kind] += 1
+        if kind == "copies":
+            _stats["copied_bytes"] += nbytes
+            tracing.counter("image bridge", copies=_stats["copies"], copied_bytes=_stats["copied_bytes"])
+
+
+def stats():
+    """Counts of zero-copy wraps and views, and of copies and the bytes they allocated."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+class _OwnedArray(np.ndarray):
+    """ndarray view that keeps the QImage it points into alive."""
+    _owner = None
+
+    def __array_finalize__(self, obj):
+        self._owner = getattr(obj, "_owner", None)
+
+
+# ---- NumPy -> QImage -------------------------------------------------------
+
+def qimage_from_array(array, copy=False):
+    """
+    A QImage over a uint8 (H, W), (H, W, 3) or (H, W, 4) array (grey, RGB,
+    RGBA). Shares the array's memory unless copy is True or its pixels are
+    not contiguous within a row, in which case a compact copy is wrapped.
+    """
+    array = np.asarray(array)
+    if array.dtype != np.uint8 or array.ndim not in (2, 3) or (array.ndim == 3 and array.shape[2] not in (3, 4)):
+        raise ValueError(f"expected a uint8 (H, W[, 3|4]) array, got {array.dtype} {array.shape}")
+    channels = 1 if array.ndim == 2 else array.shape[2]
+    height, width = array.shape[:2]
+    row_contiguous = array.strides[-1] == 1 and (array.ndim == 2 or array.strides[1] == channels)
+    if copy or not row_contiguous or array.strides[0] < width * channels:
+        array = np.ascontiguousarray(array).copy() if copy else np.ascontiguousarray(array)
+        _count("copies", array.nbytes)
+    else:
+        _count("wrapped")
+    # a flat byte view from the first pixel to the end of the last row, over the same memory
+    span = array.strides[0] * (height - 1) + width * channels
+    buffer = np.lib.stride_tricks.as_strided(array, shape=(span,), strides=(1,))
+    image = QImage(buffer, width, height, array.strides[0], _FORMATS[channels])
+    # the Python wrapper keeps the buffer alive for as long as the image is used from Python
+    image._bridge_owner = (array, buffer)
+    return image
+
+
+def qimage_from_pil(image):
+    """A QImage of a PIL image. PIL does not expose its memory, so this copies once."""
+    if image.mode not in ("L", "RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    array = np.asarray(image)
+    _count("copies", array.nbytes)
+    return qimage_from_array(array)
+
+
+def detached(image):
+    """A copy of `image` that owns its pixels, safe to queue to other threads."""
+    _count("copies", image.sizeInBytes())
+    return image.copy()
+
+
+# ---- QImage -> NumPy -------------------------------------------------------
+
+def array_from_qimage(image, writable=False):
+    """
+    The pixels of `image` as a uint8 (H, W) or (H, W, C) array sharing its
+    memory. Formats without a uint8 channel layout (e.g. ARGB32) are
+    converted to RGBA8888 first, which copies. With writable=True the array
+    can be modified in place (Qt detaches the image first if it is shared).
+    """
+    channels = _CHANNELS.get(image.format())
+    if channels is None:
+        image = image.convertToFormat(QImage.Format_RGBA8888)
+        channels = 4
+        _count("copies", image.sizeInBytes())
+    else:
+        _count("views")
+    height, width, bytes_per_line = image.height(), image.width(), image.bytesPerLine()
+    bits = image.bits() if writable else image.constBits()
+    rows = np.frombuffer(bits, dtype=np.uint8, count=bytes_per_line * height).reshape(height, bytes_per_line)
+    array = rows[:, :width * channels]
+    if channels > 1:
+        array = array.reshape(height, width, channels)
+    array = array.view(_OwnedArray)
+    array._owner = image
+    if not writable:
+        array.flags.writeable = False
+    return array
+
+
+# ---- in-memory sources -----------------------------------------------------
+
+_registry_lock = threading.Lock()
+_registry = {}  # ref -> (generation, QImage)
+_generation = 0
+
+
+def memory_ref(name):
+    return name if name.startswith(MEMORY_PREFIX) else MEMORY_PREFIX + name
+
+
+def register(name, data):
+    """
+    Makes an ndarray, PIL image or QImage readable as the patch source
+    "mem://<name>" and returns that reference. Registering the same name
+    again replaces the image and counts as a modification (its caches are
+    not reused).
+    """
+    global _generation
+    if isinstance(data, QImage):
+        image = data
+    elif isinstance(data, np.ndarray):
+        image = qimage_from_array(data)
+    else:
+        image = qimage_from_pil(data)
+    ref = memory_ref(name)
+    with _registry_lock:
+        _generation += 1
+        _registry[ref] = (_generation, image)
+    return ref
+
+
+def unregister(ref):
+    with _registry_lock:
+        _registry.pop(memory_ref(ref), None)
+
+
+def clear_registry(prefix=""):
+    """Drops every memory source whose name starts with `prefix`."""
+    prefix = memory_ref(prefix)
+    with _registry_lock:
+        for ref in [ref for ref in _registry if ref.startswith(prefix)]:
+            del _registry[ref]
+
+
+def lookup(ref):
+    """(generation, QImage) of a memory source; raises FileNotFoundError if unknown."""
+    with _registry_lock:
+        entry = _registry.get(ref)
+    if entry is None:
+        raise FileNotFoundError(ref)
+    return entry
+
+
+def memory_refs(prefix=""):
+    prefix = memory_ref(prefix)
+    with _registry_lock:
+        return sorted(ref for ref in _registry if ref.startswith(prefix))
+
+
+# Example usage:
+#   python -m AppModules.imageBridge    # wrap / view round trip with copy counts
+if __name__ == "__main__":
+    import time
+
+    array = np.random.default_rng(0).integers(0, 255, (2048, 2048, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    image = qimage_from_array(array)
+    view = array_from_qimage(image)
+    wrapped = time.perf_counter() - start
+    start = time.perf_counter()
+    copied = QImage(array.tobytes(), 2048, 2048, 2048 * 3, QImage.Format_RGB888).copy()
+    copy_seconds = time.perf_counter() - start
+    assert np.shares_memory(view, array) and not copied.isNull()
+    print(f"wrap + view {wrapped * 1e6:.0f} us, copy {copy_seconds * 1e6:.0f} us, {stats()}")
@@ -0,0 +1,112 @@
+'''
+Image loading shared by the grid and the viewers.
+
+Every patch source is a string: a normal image file path, a
+"<pack>::<tile>" reference into a patch pack (see patchPack) or a
+"mem://<name>" image registered in memory (see imageBridge). These helpers
+hide the difference so widgets never open files themselves.
+'''
+
+import os
+
+from PySide6.QtCore import Qt, QSize
+from PySide6.QtGui import QImage, QImageReader, QPixmap
+
+from AppModules import patchPack, tracing
+
+MEMORY_PREFIX = "mem://"
+
+
+def is_memory_ref(path):
+    return path.startswith(MEMORY_PREFIX)
+
+
+def _memory_entry(path):
+    # imported on first use: it pulls in NumPy
+    from AppModules.imageBridge import lookup
+    return lookup(path)
+
+
+def source_mtime_ns(path):
+    """
+    Modification time of the file backing a patch source. For memory sources
+    this is their registration generation, which changes on re-registration.
+    """
+    if is_memory_ref(path):
+        return _memory_entry(path)[0]
+    ref = patchPack.split_ref(path)
+    return os.stat(ref[0] if ref else path).st_mtime_ns
+
+
+def source_size(path):
+    """
+    Pixel size of a patch source read from its header (QSize, invalid if
+    unreadable). Nothing is decoded.
+    """
+    if is_memory_ref(path):
+        try:
+            return _memory_entry(path)[1].size()
+        except OSError:
+            return QSize()
+    ref = patchPack.split_ref(path)
+    if ref is None:
+        return QImageReader(path).size()
+    try:
+        tile = patchPack.open_pack(ref[0]).tile_info(ref[1])
+    except (OSError, KeyError, ValueError):
+        return QSize()
+    return QSize(tile["width"], tile["height"])
+
+
+def read_qimage(path, max_size=None):
+    """
+    Decodes a patch source into a QImage. Pack tiles are wrapped without
+    copying; returns a null QImage when the source cannot be read.
+
+    With max_size (a QSize) the image is scaled to fit it, keeping the aspect
+    ratio. For files this happens inside QImageReader, which lets decoders
+    such as JPEG skip most of the full-resolution work.
+    """
+    with tracing.span("decode", path=path) as span:
+        image = _read_qimage(path, max_size)
+        span.set(width=image.width(), height=image.height())
+    return image
+
+
+def _read_qimage(path, max_size):
+    if is_memory_ref(path):
+        try:
+            # shared with the registered buffer, nothing is decoded or copied
+            image = _memory_entry(path)[1]
+        except OSError:
+            return QImage()
+        return _fit(image, max_size)
+    ref = patchPack.split_ref(path)
+    if ref is None:
+        if max_size is None:
+            return QImage(path)
+        reader = QImageReader(path)
+        size = reader.size()
+        if size.isValid() and (size.width() > max_size.width() or size.height() > max_size.height()):
+            reader.setScaledSize(size.scaled(max_size, Qt.KeepAspectRatio))
+        return reader.read()
+    try:
+        image = patchPack.open_pack(ref[0]).tile_qimage(ref[1])
+    except (OSError, KeyError, ValueError):
+        return QImage()
+    return _fit(image, max_size)
+
+
+def _fit(image, max_size):
+    if max_size is not None and (image.width() > max_size.width() or image.height() > max_size.height()):
+        image = image.scaled(max_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return image
+
+
+def read_pixmap(path):
+    """Like read_qimage but returns a QPixmap ready for display."""
+    if patchPack.split_ref(path) is None and not is_memory_ref(path):
+        with tracing.span("decode", path=path):
+            return QPixmap(path)
+    image = read_qimage(path)
+    return QPixmap.fromImage(image) if not image.isNull() else QPixmap()
@@ -0,0 +1,222 @@
+'''
+Shared in-memory store of decoded images.
+
+Every decoded image the app keeps around (grid thumbnails, prefetched
+patches, the images of the viewers) lives in one LRU bounded by a single
+byte budget, so a few large sources can no longer push the app into swap.
+The budget defaults to DEFAULT_BUDGET and can be changed with the
+APP_IMAGE_BUDGET_MB environment variable or set_budget().
+
+Images are keyed by namespace, source path, source mtime and the size they
+were decoded at. Callers that only show an image fitted into a widget ask
+for it at that size: files are then decoded at display resolution inside
+QImageReader (JPEGs skip most of the full-resolution work through DCT
+scaling), and if the full-resolution image is already in memory it is
+scaled from there instead of decoding again.
+
+Evicting an image only drops the service's reference; an image still shown
+by a widget stays alive until the widget lets go of it (QImages are
+implicitly shared, so handing one out does not copy it).
+'''
+
+import os
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import Qt, QSize
+from PySide6.QtGui import QImage
+
+from AppModules import tracing
+from AppModules.imageIO import read_qimage, source_mtime_ns
+
+DEFAULT_BUDGET = 256 * 1024 * 1024
+DISPLAY = "display"
+FULL = (0, 0)
+
+
+def _budget_from_environment():
+    value = os.environ.get("APP_IMAGE_BUDGET_MB")
+    try:
+        return int(float(value) * 1024 * 1024) if value else DEFAULT_BUDGET
+    except ValueError:
+        return DEFAULT_BUDGET
+
+
+def _fits(image, size):
+    return image.width() <= size.width() and image.height() <= size.height()
+
+
+class ImageService:
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes if budget_bytes is not None else _budget_from_environment()
+        self._images = OrderedDict()  # (namespace, path, mtime_ns, width, height) -> QImage
+        self._bytes = 0
+        self._namespace_bytes = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decoded_bytes = 0
+
+    # ---- generic store -----------------------------------------------------
+
+    @staticmethod
+    def key(namespace, path, size=None):
+        """Cache key of `path` at `size` (None = full resolution); raises OSError if it is gone."""
+        width, height = (size.width(), size.height()) if size is not None else FULL
+        return (namespace, path, source_mtime_ns(path), width, height)
+
+    def get(self, key):
+        """The image stored under `key`, or None. Counts a hit or a miss."""
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        """Stores `image` under `key` and evicts least recently used images over the budget."""
+        size = image.sizeInBytes()
+        if image.isNull() or size > self.budget_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._images[key] = image
+            self._bytes += size
+            self._namespace_bytes[key[0]] = self._namespace_bytes.get(key[0], 0) + size
+            self._evict(self.budget_bytes)
+
+    def _discard(self, key):
+        image = self._images.pop(key, None)
+        if image is not None:
+            size = image.sizeInBytes()
+            self._bytes -= size
+            self._namespace_bytes[key[0]] -= size
+        return image
+
+    def _evict(self, limit):
+        while self._bytes > limit and self._images:
+            key = next(iter(self._images))
+            self._discard(key)
+            self.evictions += 1
+        tracing.counter("image memory", bytes=self._bytes, entries=len(self._images))
+
+    # ---- decoding ----------------------------------------------------------
+
+    def cached(self, path, size=None, namespace=DISPLAY):
+        """The image if it is already in memory, else None. Never decodes."""
+        try:
+            return self.get(self.key(namespace, path, size))
+        except OSError:
+            return None
+
+    def contains(self, path, size=None, namespace=DISPLAY):
+        """Whether the image is in memory; neither counted nor moved in the LRU."""
+        try:
+            key = self.key(namespace, path, size)
+        except OSError:
+            return False
+        with self._lock:
+            return key in self._images
+
+    def image(self, path, size=None, namespace=DISPLAY):
+        """
+        `path` decoded to fit `size` (a QSize, keeping the aspect ratio), or at
+        full resolution when size is None. Safe to call from worker threads.
+        Returns a null QImage if the source cannot be read.
+        """
+        try:
+            key = self.key(namespace, path, size)
+        except OSError:
+            return QImage()
+        image = self.get(key)
+        if image is not None:
+            return image
+        full = None
+        if size is not None:
+            with self._lock:
+                full = self._images.get(key[:3] + FULL)
+        if full is not None:
+            # already decoded at full resolution: scaling beats decoding again
+            if _fits(full, size):
+                # the source is smaller than asked for; storing it twice would count it twice
+                return full
+            with tracing.span("scale", width=size.width(), height=size.height()):
+                image = full.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        else:
+            image = read_qimage(path, size)
+            with self._lock:
+                self.decoded_bytes += image.sizeInBytes()
+        self.put(key, image)
+        return image
+
+    # ---- housekeeping ------------------------------------------------------
+
+    def invalidate(self, path=None, group=None, namespace=None):
+        """
+        Forgets images of one source path, of every source of a group
+        (patches/ directory or pack, see thumbnailCache.source_group), of one
+        namespace, or everything when nothing is given.
+        """
+        from AppModules.thumbnailCache import source_group
+        group = os.path.abspath(group) if group is not None else None
+        with self._lock:
+            for key in list(self._images):
+                if namespace is not None and key[0] != namespace:
+                    continue
+                if path is not None and key[1] != path:
+                    continue
+                if group is not None and source_group(key[1]) != group:
+                    continue
+                self._discard(key)
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._evict(budget_bytes)
+
+    def namespace_stats(self, namespace):
+        with self._lock:
+            return {
+                "entries": sum(1 for key in self._images if key[0] == namespace),
+                "bytes": self._namespace_bytes.get(namespace, 0),
+            }
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._images),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "decoded_bytes": self.decoded_bytes,
+                "namespaces": {name: size for name, size in self._namespace_bytes.items() if size},
+            }
+
+
+def display_size(widget, minimum=QSize(64, 64)):
+    """The device-pixel size an image shown fitted into `widget` needs."""
+    size = widget.size()
+    ratio = widget.devicePixelRatioF()
+    return QSize(max(minimum.width(), int(size.width() * ratio)),
+                 max(minimum.height(), int(size.height() * ratio)))
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_image_service():
+    """The process-wide service shared by all viewers and grids."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ImageService()
+        return _shared
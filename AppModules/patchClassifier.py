@@ -0,0 +1,267 @@
+'''
+Batched CPU patch classifier.
+
+Patches are decoded, downscaled to the model's input size and stacked into
+one (N, H, W, 3) uint8 array per batch, so a model scores a whole batch with
+vectorised NumPy instead of one patch at a time. Batches run in a pool of
+worker processes; results are yielded batch by batch as they complete.
+
+A model is any object with
+
+    input_size    side length patches are scaled to
+    threshold     scores >= threshold are highlighted
+    predict(batch) -> (N,) float array
+    version       optional; scores are cached per model spec and version
+
+and is named by a spec string: "baseline" for ContentBaseline below, or
+"package.module:Name" for a class importable in the worker processes.
+No Qt here, so workers stay light.
+
+    python -m AppModules.patchClassifier data/images --workers 4
+'''
+
+import os
+import sys
+import time
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PIL import Image
+
+from AppModules import patchPack
+
+DEFAULT_MODEL = "baseline"
+DEFAULT_BATCH_SIZE = 64
+
+
+class ContentBaseline:
+    """
+    Scores a patch by the fraction of pixels that stand out from its
+    background: pixels whose grey value differs from the patch median by
+    more than `contrast`. Dense, stained regions score high, empty ones low.
+    """
+    input_size = 64
+    # bump when the scoring changes so cached scores are not reused
+    version = "1"
+
+    def __init__(self, contrast=40, threshold=0.15):
+        self.contrast = contrast
+        self.threshold = threshold
+
+    def predict(self, batch):
+        grey = batch[..., 0] * 0.299 + batch[..., 1] * 0.587 + batch[..., 2] * 0.114
+        flat = grey.reshape(len(grey), -1)
+        background = np.median(flat, axis=1, keepdims=True)
+        return (np.abs(flat - background) > self.contrast).mean(axis=1)
+
+
+_models = {}
+
+
+def load_model(spec=DEFAULT_MODEL):
+    """The model for a spec string, created once per process."""
+    if not isinstance(spec, str):
+        return spec
+    model = _models.get(spec)
+    if model is None:
+        if spec == "baseline":
+            model = ContentBaseline()
+        else:
+            module_name, _, class_name = spec.partition(":")
+            if not class_name:
+                raise ValueError(f"model spec must be 'baseline' or 'module:Class', got {spec!r}")
+            model = getattr(importlib.import_module(module_name), class_name)()
+        _models[spec] = model
+    return model
+
+
+def load_patch_array(path, size):
+    """A patch source as a (size, size, 3) uint8 array."""
+    if patchPack.is_pack_ref(path):
+        image = patchPack.read_ref_image(path)
+    else:
+        image = Image.open(path)
+        # JPEG decoders can skip most of the work for a small target
+        image.draft("RGB", (size, size))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != (size, size):
+        image = image.resize((size, size), Image.BILINEAR)
+    return np.asarray(image)
+
+
+def _score(model, paths, timings):
+    """{path: score or None} for a list of paths, as one stacked batch."""
+    start = time.perf_counter()
+    size = model.input_size
+    batch = np.empty((len(paths), size, size, 3), dtype=np.uint8)
+    readable = np.ones(len(paths), dtype=bool)
+    for i, path in enumerate(paths):
+        try:
+            batch[i] = load_patch_array(path, size)
+        except (OSError, KeyError, ValueError):
+            readable[i] = False
+    decoded = time.perf_counter()
+    scores = np.full(len(paths), np.nan)
+    if readable.any():
+        scores[readable] = model.predict(batch[readable])
+    timings["decode_seconds"] += decoded - start
+    timings["predict_seconds"] += time.perf_counter() - decoded
+    return {path: None if np.isnan(score) else float(score) for path, score in zip(paths, scores)}
+
+
+def classify_batch(paths, model_spec=DEFAULT_MODEL, use_cache=True):
+    """
+    Scores one batch. Unreadable patches get a score of None. Runs in the
+    worker processes, so everything it returns is plain Python data. Scores
+    of models named by a spec string are kept in the result cache.
+    """
+    model = load_model(model_spec)
+    timings = {"decode_seconds": 0.0, "predict_seconds": 0.0}
+    hits = 0
+    if use_cache and isinstance(model_spec, str):
+        from AppModules.resultCache import cached_call
+        scores, hits = cached_call(f"classifier/{model_spec}", getattr(model, "version", "1"), paths,
+                                   lambda missing: _score(model, missing, timings))
+    else:
+        scores = _score(model, paths, timings)
+    scores = [scores.get(path) for path in paths]
+    return {
+        "paths": list(paths),
+        "scores": scores,
+        "highlighted": [score is not None and score >= model.threshold for score in scores],
+        "cache_hits": hits,
+        **timings,
+    }
+
+
+def batches(paths, batch_size=DEFAULT_BATCH_SIZE):
+    paths = list(paths)
+    return [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+
+
+_executor = None
+_executor_workers = None
+
+
+def get_executor(workers=None):
+    """
+    The shared worker pool, also used by the cell counter. Workers are
+    spawned rather than forked, which is what Windows does anyway and keeps
+    them clear of the GUI's threads.
+    """
+    global _executor, _executor_workers
+    workers = workers or os.cpu_count() or 1
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _executor_workers = workers
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def submit(fn, *args, workers=None):
+    """Queues fn(*args) on the shared pool, replacing the pool if a worker died."""
+    try:
+        return get_executor(workers).submit(fn, *args)
+    except BrokenProcessPool:
+        shutdown_executor()
+        return get_executor(workers).submit(fn, *args)
+
+
+def submit_batch(batch, model_spec=DEFAULT_MODEL, workers=None):
+    return submit(classify_batch, batch, model_spec, workers=workers)
+
+
+def iter_classify(paths, model_spec=DEFAULT_MODEL, batch_size=DEFAULT_BATCH_SIZE, workers=None):
+    """
+    Yields classify_batch() results in completion order. workers=0 runs
+    in-process, which also accepts a model object instead of a spec.
+    """
+    if workers == 0:
+        for batch in batches(paths, batch_size):
+            yield classify_batch(batch, model_spec)
+        return
+    futures = [submit_batch(batch, model_spec, workers) for batch in batches(paths, batch_size)]
+    try:
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def throughput(results, wall_seconds, workers):
+    """
+    Patches per second overall and per core, from a list of batch results.
+    Per-core figures count only the cores that had a batch to run, which is
+    fewer than `workers` when there were fewer batches than workers.
+    """
+    patches = sum(len(r["paths"]) for r in results)
+    busy = sum(r["decode_seconds"] + r["predict_seconds"] for r in results)
+    workers = max(1, workers)
+    cores = max(1, min(workers, len(results)))
+    return {
+        "patches": patches,
+        "batches": len(results),
+        "workers": workers,
+        "cores_used": cores,
+        "wall_seconds": wall_seconds,
+        "patches_per_second": patches / wall_seconds if wall_seconds else 0.0,
+        "patches_per_second_per_core": patches / wall_seconds / cores if wall_seconds else 0.0,
+        # per core while busy, i.e. without pool start-up and idle workers
+        "patches_per_busy_core_second": patches / busy if busy else 0.0,
+        "decode_seconds": sum(r["decode_seconds"] for r in results),
+        "predict_seconds": sum(r["predict_seconds"] for r in results),
+        "cache_hits": sum(r.get("cache_hits", 0) for r in results),
+        "cache_hit_ratio": sum(r.get("cache_hits", 0) for r in results) / patches if patches else 0.0,
+    }
+
+
+def classify(paths, model_spec=DEFAULT_MODEL, batch_size=DEFAULT_BATCH_SIZE, workers=None):
+    """Scores every path; returns ({path: (score, highlighted)}, throughput stats)."""
+    start = time.perf_counter()
+    results = list(iter_classify(paths, model_spec, batch_size, workers))
+    scores = {}
+    for result in results:
+        for path, score, highlighted in zip(result["paths"], result["scores"], result["highlighted"]):
+            scores[path] = (score, highlighted)
+    workers = 1 if workers == 0 else (workers or os.cpu_count() or 1)
+    return scores, throughput(results, time.perf_counter() - start, workers)
+
+
+# Example usage
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Score every patch below a data directory.")
+    parser.add_argument("input_dir", nargs="?", default="data/images")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="'baseline' or 'module:Class'")
+    parser.add_argument("--workers", type=int, default=None, help="0 runs in-process")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    paths = []
+    for name in sorted(os.listdir(args.input_dir)):
+        plate_dir = os.path.join(args.input_dir, name)
+        if os.path.isdir(plate_dir):
+            paths += patchPack.list_patch_sources(plate_dir)
+    if not paths:
+        sys.exit(f"no patches found below {args.input_dir}")
+    scores, stats = classify(paths, args.model, args.batch_size, args.workers)
+    highlighted = sum(1 for _, flag in scores.values() if flag)
+    print(f"{stats['patches']} patches, {highlighted} highlighted, {stats['wall_seconds']:.2f}s, "
+          f"{stats['cache_hits']} from the result cache")
+    print(f"{stats['patches_per_second']:.1f} patches/s, "
+          f"{stats['patches_per_second_per_core']:.1f} per core ({stats['workers']} workers), "
+          f"{stats['patches_per_busy_core_second']:.1f} per busy core-second")
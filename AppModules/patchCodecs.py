@@ -0,0 +1,231 @@
+'''
+Patch file codecs
+
+The image format patches are written in when they are tiled into a
+patches/ directory. Every codec writes a format that both Qt (grids and
+viewers) and PIL (classifier, cell counter) recognise by content, so
+readers need no changes whichever one a plate was tiled with.
+
+    png         PNG, zlib level 6 (PIL's default)
+    png:<0-9>   PNG with another compression level; png:1 is much faster
+    webp        lossless WebP, fastest effort setting
+    tiff        uncompressed TIFF
+    ppm         raw pixels behind a tiny header (PPM / PGM)
+    jpeg[:q]    lossy JPEG, quality 95 by default
+
+Other codecs can be added with register_codec(). benchmark() measures
+encode time, decode time (PIL and Qt) and size of each codec on real
+patches, to pick the trade-off for a deployment:
+
+    python -m AppModules.patchCodecs data/images --limit 64
+'''
+
+import io
+import os
+import time
+
+from PIL import Image
+
+DEFAULT_CODEC = "png"
+
+
+class PatchCodec:
+    """
+    One way of writing a patch file. `modes` are the PIL modes the format
+    stores without loss; patches of other modes are written by the first
+    codec of the `fallback` chain that can hold them, and only converted to
+    RGB(A) when none can.
+    """
+
+    def __init__(self, name, extension, pil_format, options=None, lossless=True,
+                 modes=("L", "RGB", "RGBA"), fallback="png"):
+        self.name = name
+        self.extension = extension
+        self.pil_format = pil_format
+        self.options = dict(options or {})
+        self.lossless = lossless
+        self.modes = modes
+        self.fallback = fallback
+
+    def __repr__(self):
+        return f"PatchCodec({self.name!r})"
+
+    def for_mode(self, mode):
+        codec = self
+        while mode not in codec.modes:
+            if codec.fallback is None:
+                # nothing lossless holds it; the requested codec converts
+                return self
+            codec = get_codec(codec.fallback)
+        return codec
+
+    def encode(self, image):
+        """The file content of `image` as bytes."""
+        buffer = io.BytesIO()
+        self._save(image, buffer)
+        return buffer.getvalue()
+
+    def save(self, image, path_without_extension):
+        """Writes `image` next to the given path with this codec's extension; returns the file path."""
+        codec = self.for_mode(image.mode)
+        if codec is not self:
+            return codec.save(image, path_without_extension)
+        path = path_without_extension + self.extension
+        self._save(image, path)
+        return path
+
+    def _save(self, image, target):
+        if image.mode not in self.modes:
+            image = image.convert("RGBA" if "A" in image.getbands() and "RGBA" in self.modes else "RGB")
+        image.save(target, self.pil_format, **self.options)
+
+
+_CODECS = {}
+
+
+def register_codec(codec):
+    _CODECS[codec.name] = codec
+    return codec
+
+
+# modes each format round-trips unchanged through PIL; 16-bit PNGs keep I;16
+PNG_MODES = ("1", "L", "LA", "P", "I;16", "RGB", "RGBA")
+TIFF_MODES = ("1", "L", "LA", "P", "I;16", "I;16B", "I", "F", "RGB", "RGBA", "CMYK", "LAB")
+JPEG_MODES = ("L", "RGB", "CMYK")
+
+register_codec(PatchCodec("png", ".png", "PNG", {"compress_level": 6}, modes=PNG_MODES, fallback="tiff"))
+register_codec(PatchCodec("webp", ".webp", "WEBP", {"lossless": True, "quality": 0, "method": 0}))
+register_codec(PatchCodec("tiff", ".tif", "TIFF", {"compression": "raw"}, modes=TIFF_MODES, fallback=None))
+register_codec(PatchCodec("ppm", ".ppm", "PPM", modes=("1", "L", "RGB"), fallback="tiff"))
+register_codec(PatchCodec("jpeg", ".jpg", "JPEG", {"quality": 95}, lossless=False, modes=JPEG_MODES))
+
+
+def get_codec(spec=DEFAULT_CODEC):
+    """
+    The codec named by `spec`: a registered name, or "png:<level>" /
+    "jpeg:<quality>" for those formats with another setting.
+    """
+    if isinstance(spec, PatchCodec):
+        return spec
+    codec = _CODECS.get(spec)
+    if codec is not None:
+        return codec
+    name, _, value = spec.partition(":")
+    try:
+        number = int(value)
+    except ValueError:
+        number = None
+    if name == "png" and number is not None and 0 <= number <= 9:
+        return register_codec(PatchCodec(spec, ".png", "PNG", {"compress_level": number},
+                                         modes=PNG_MODES, fallback="tiff"))
+    if name == "jpeg" and number is not None and 1 <= number <= 100:
+        return register_codec(PatchCodec(spec, ".jpg", "JPEG", {"quality": number}, lossless=False,
+                                         modes=JPEG_MODES))
+    raise ValueError(f"unknown patch codec {spec!r}, expected one of {', '.join(codec_names())} "
+                     f"or png:<0-9> / jpeg:<1-100>")
+
+
+def codec_names():
+    return sorted(_CODECS)
+
+
+# ---- benchmark ---------------------------------------------------------------
+
+def _qt_decoder():
+    """Decodes bytes like the grids do, or None if Qt is not available."""
+    try:
+        from PySide6.QtGui import QImage
+    except ImportError:
+        return None
+    return lambda data: QImage.fromData(data)
+
+
+def benchmark(images, specs=("png", "png:1", "webp", "tiff", "ppm", "jpeg"), repeats=3):
+    """
+    Encodes and decodes every PIL image of `images` with each codec and
+    returns one dict per codec: encode and decode ms per patch (best of
+    `repeats`), decode ms through Qt, mean file size and its ratio to the
+    raw pixels, and whether the round trip was lossless.
+    """
+    raw_bytes = sum(len(image.tobytes()) for image in images)
+    qt_decode = _qt_decoder()
+    results = []
+    for spec in specs:
+        codec = get_codec(spec)
+        encode_times, decode_times, qt_times = [], [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            encoded = [codec.for_mode(image.mode).encode(image) for image in images]
+            encode_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            decoded = []
+            for data in encoded:
+                with Image.open(io.BytesIO(data)) as image:
+                    image.load()
+                    decoded.append(image)
+            decode_times.append(time.perf_counter() - start)
+            if qt_decode is not None:
+                start = time.perf_counter()
+                for data in encoded:
+                    qt_decode(data)
+                qt_times.append(time.perf_counter() - start)
+        size = sum(len(data) for data in encoded)
+        count = max(1, len(images))
+        results.append({
+            "codec": codec.name,
+            "encode_ms": min(encode_times) * 1000 / count,
+            "decode_ms": min(decode_times) * 1000 / count,
+            "qt_decode_ms": min(qt_times) * 1000 / count if qt_times else None,
+            "kb_per_patch": size / count / 1024,
+            "size_ratio": size / raw_bytes if raw_bytes else 0.0,
+            "lossless": all(a.tobytes() == b.tobytes() for a, b in zip(images, decoded)),
+        })
+    return results
+
+
+def format_benchmark(results):
+    lines = [f"{'codec':<10} {'encode ms':>10} {'decode ms':>10} {'qt ms':>8} {'KB/patch':>9} {'size':>6}  lossless"]
+    for r in results:
+        qt = f"{r['qt_decode_ms']:.2f}" if r["qt_decode_ms"] is not None else "n/a"
+        lines.append(f"{r['codec']:<10} {r['encode_ms']:>10.2f} {r['decode_ms']:>10.2f} {qt:>8} "
+                     f"{r['kb_per_patch']:>9.1f} {r['size_ratio']:>6.0%}  {'yes' if r['lossless'] else 'no'}")
+    return "\n".join(lines)
+
+
+def sample_patches(input_dir, limit=64):
+    """Up to `limit` patches of the tiled plates below input_dir, as PIL images."""
+    from AppModules import patchPack
+    images = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        if "patches" not in dirs and patchPack.PACK_NAME not in files:
+            continue
+        if "patches" in dirs:
+            dirs.remove("patches")
+        for source in patchPack.list_patch_sources(root):
+            image = patchPack.read_ref_image(source) if patchPack.is_pack_ref(source) else Image.open(source)
+            image.load()
+            images.append(image)
+            if len(images) >= limit:
+                return images
+    return images
+
+
+# Example usage:
+#   python -m AppModules.patchCodecs [input_dir] [--codecs png,png:1,webp] [--limit 64]
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare patch codecs on the patches of a data directory")
+    parser.add_argument("input_dir", nargs="?", default="data/images")
+    parser.add_argument("--codecs", default="png,png:1,webp,tiff,ppm,jpeg")
+    parser.add_argument("--limit", type=int, default=64, help="patches to sample")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    patches = sample_patches(args.input_dir, args.limit)
+    if not patches:
+        sys.exit(f"no tiled patches found below {args.input_dir}")
+    print(f"{len(patches)} patches of {patches[0].size[0]}x{patches[0].size[1]}")
+    print(format_benchmark(benchmark(patches, args.codecs.split(","), args.repeats)))
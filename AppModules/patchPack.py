@@ -0,0 +1,341 @@
+'''
+Single-file patch pack
+
+Stores all patches of a source image in one file next to the patches/
+directory (patches.ppk) instead of one PNG per patch:
+
+    [magic "PPK1"][flags u32][index offset u64][index length u64]
+    [tile data, each tile 64-byte aligned] ... [JSON index]
+
+Tiles are stored as raw pixels (codec "raw", read zero-copy through mmap)
+or zlib level 1 (codec "zlib", smaller but needs one decompress per read),
+in the mode of the source image (8 or 16-bit, palette, float, ...).
+Individual tiles are addressed with "<pack path>::<tile name>" references,
+which are plain strings and can be passed around like patch file paths.
+'''
+
+import os
+import re
+import sys
+import json
+import mmap
+import zlib
+import struct
+import threading
+
+from PIL import Image
+
+PACK_NAME = "patches.ppk"
+PACK_EXTENSION = ".ppk"
+PACK_REF_SEP = "::"
+MAGIC = b"PPK1"
+HEADER = struct.Struct("<4sIQQ")
+ALIGNMENT = 64
+CODECS = ("raw", "zlib")
+# bits per pixel of the modes stored as they are; others are converted to RGB(A)
+MODE_BITS = {"1": 1, "L": 8, "P": 8, "LA": 16, "I;16": 16, "I;16B": 16, "I": 32, "F": 32,
+             "RGB": 24, "RGBA": 32, "CMYK": 32}
+# NumPy (dtype, channels) of the modes tile_array can view without copying
+ARRAY_TYPES = {"L": ("u1", 1), "P": ("u1", 1), "LA": ("u1", 2), "RGB": ("u1", 3), "RGBA": ("u1", 4),
+               "CMYK": ("u1", 4), "I;16": ("<u2", 1), "I;16B": (">u2", 1), "I": ("=i4", 1), "F": ("=f4", 1)}
+PATCH_NAME_RE = re.compile(r"_(\d+)_(\d+)$")
+
+
+def make_ref(pack_path, name):
+    return f"{pack_path}{PACK_REF_SEP}{name}"
+
+
+def split_ref(path):
+    """Returns (pack_path, tile_name) for a pack reference, None for a file path."""
+    if PACK_REF_SEP not in path:
+        return None
+    pack_path, name = path.rsplit(PACK_REF_SEP, 1)
+    return pack_path, name
+
+
+def is_pack_ref(path):
+    return isinstance(path, str) and PACK_REF_SEP in path
+
+
+def patch_grid_position(name):
+    """(row, col) parsed from a patch name like patch_2_3(.png), or None."""
+    match = PATCH_NAME_RE.search(os.path.splitext(os.path.basename(name))[0])
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def _sort_key(name):
+    return patch_grid_position(name) or (sys.maxsize, sys.maxsize), name
+
+
+def _bytes_per_line(width, mode):
+    # QImage wants 32-bit aligned scanlines for zero-copy wrapping
+    return ((width * MODE_BITS[mode] + 7) // 8 + 3) & ~3
+
+
+class PatchPackWriter:
+    """
+    Streams tiles into a pack file. The pack is written to a temp file and
+    only moved into place by close(), so readers never see a partial pack.
+    """
+
+    def __init__(self, pack_path, codec="raw"):
+        if codec not in CODECS:
+            raise ValueError(f"unknown pack codec {codec!r}, expected one of {CODECS}")
+        self.pack_path = pack_path
+        self.codec = codec
+        self._tmp_path = pack_path + ".tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(HEADER.pack(MAGIC, 0, 0, 0))
+        self._tiles = []
+
+    def add(self, name, image, row=None, col=None):
+        """Appends a PIL image as tile `name`."""
+        if image.mode not in MODE_BITS or (image.mode == "P" and "transparency" in image.info):
+            image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+        width, height = image.size
+        bpl = _bytes_per_line(width, image.mode)
+        data = image.tobytes("raw", image.mode, bpl, 1)
+        if self.codec == "zlib":
+            data = zlib.compress(data, 1)
+        pad = -self._file.tell() % ALIGNMENT
+        self._file.write(b"\0" * pad)
+        offset = self._file.tell()
+        self._file.write(data)
+        if row is None or col is None:
+            row, col = patch_grid_position(name) or (len(self._tiles), 0)
+        tile = {
+            "name": name, "row": row, "col": col,
+            "width": width, "height": height, "mode": image.mode,
+            "bytes_per_line": bpl, "codec": self.codec,
+            "offset": offset, "length": len(data),
+        }
+        if image.mode == "P":
+            tile["palette"] = image.getpalette()
+        self._tiles.append(tile)
+
+    def close(self):
+        index = json.dumps({"version": 1, "tiles": self._tiles}).encode("utf-8")
+        index_offset = self._file.tell()
+        self._file.write(index)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, 0, index_offset, len(index)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.pack_path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class PatchPack:
+    """Read-only, memory-mapped view of a pack file."""
+
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        with open(pack_path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.mtime_ns = st.st_mtime_ns
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _flags, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{pack_path} is not a patch pack")
+        index = json.loads(bytes(self._map[index_offset:index_offset + index_length]))
+        self._tiles = {tile["name"]: tile for tile in index["tiles"]}
+        self._order = sorted(self._tiles, key=lambda n: (self._tiles[n]["row"], self._tiles[n]["col"], n))
+
+    def names(self):
+        """Tile names in grid order."""
+        return list(self._order)
+
+    def refs(self):
+        return [make_ref(self.pack_path, name) for name in self._order]
+
+    def tile_info(self, name):
+        return self._tiles[name]
+
+    def tile_buffer(self, name):
+        """
+        Raw pixel buffer of a tile. For "raw" tiles this is a memoryview of
+        the mapping, no bytes are copied.
+        """
+        tile = self._tiles[name]
+        view = memoryview(self._map)[tile["offset"]:tile["offset"] + tile["length"]]
+        if tile["codec"] == "zlib":
+            return zlib.decompress(view)
+        return view
+
+    def tile_image(self, name):
+        """Tile as a PIL image."""
+        tile = self._tiles[name]
+        image = Image.frombuffer(tile["mode"], (tile["width"], tile["height"]), self.tile_buffer(name),
+                                 "raw", tile["mode"], tile["bytes_per_line"], 1)
+        if "palette" in tile:
+            image.putpalette(tile["palette"])
+        return image
+
+    def tile_qimage(self, name):
+        """
+        Tile as a QImage wrapping the pack buffer. The QImage keeps the pack
+        and buffer alive for as long as it exists. Modes Qt has no format for
+        (palette, 1-bit, 32-bit, CMYK) are converted to an RGB(A) copy.
+        """
+        from PySide6.QtGui import QImage
+        formats = {"L": QImage.Format_Grayscale8, "RGB": QImage.Format_RGB888, "RGBA": QImage.Format_RGBA8888}
+        if sys.byteorder == "little":
+            formats["I;16"] = QImage.Format_Grayscale16
+        tile = self._tiles[name]
+        if tile["mode"] not in formats:
+            pil_image = self.tile_image(name)
+            pil_image = pil_image.convert("RGBA" if "A" in pil_image.getbands() else "RGB")
+            data = pil_image.tobytes()
+            return QImage(data, tile["width"], tile["height"], tile["width"] * len(pil_image.mode),
+                          formats[pil_image.mode]).copy()
+        buffer = self.tile_buffer(name)
+        image = QImage(buffer, tile["width"], tile["height"], tile["bytes_per_line"], formats[tile["mode"]])
+        image._pack_buffer = (self, buffer)
+        return image
+
+    def tile_array(self, name):
+        """
+        Tile as a read-only (H, W[, C]) NumPy array over the pack buffer; a
+        copy for 1-bit tiles, which have no NumPy dtype.
+        """
+        import numpy as np
+        tile = self._tiles[name]
+        if tile["mode"] not in ARRAY_TYPES:
+            return np.asarray(self.tile_image(name))
+        dtype, channels = ARRAY_TYPES[tile["mode"]]
+        rows = np.frombuffer(self.tile_buffer(name), dtype=np.uint8).reshape(tile["height"], tile["bytes_per_line"])
+        array = rows[:, :tile["width"] * channels * np.dtype(dtype).itemsize].view(dtype)
+        return array if channels == 1 else array.reshape(tile["height"], tile["width"], channels)
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            # tiles handed out as zero-copy views still reference the mapping;
+            # it is released once they are garbage collected
+            pass
+
+
+_open_packs = {}  # absolute pack path -> PatchPack
+_open_packs_lock = threading.Lock()
+
+
+def open_pack(pack_path):
+    """Returns a shared PatchPack, reopened if the file was replaced on disk."""
+    key = os.path.abspath(pack_path)
+    with _open_packs_lock:
+        pack = _open_packs.get(key)
+        try:
+            mtime_ns = os.stat(pack_path).st_mtime_ns
+        except OSError:
+            _open_packs.pop(key, None)
+            raise
+        if pack is None or pack.mtime_ns != mtime_ns:
+            if pack is not None:
+                pack.close()
+            pack = PatchPack(pack_path)
+            _open_packs[key] = pack
+        return pack
+
+
+def close_pack(pack_path):
+    """
+    Closes and forgets the shared reader of a pack, so the file can be
+    replaced or removed; Windows refuses to while it is mapped. The next
+    open_pack() maps it again.
+    """
+    with _open_packs_lock:
+        pack = _open_packs.pop(os.path.abspath(pack_path), None)
+    if pack is not None:
+        pack.close()
+
+
+def read_ref_image(ref):
+    """PIL image for a pack reference."""
+    pack_path, name = split_ref(ref)
+    return open_pack(pack_path).tile_image(name)
+
+
+def list_patch_sources(plate_dir):
+    """
+    Patch sources of a plate in grid order: tile references when the plate
+    has a patches.ppk pack, otherwise the files of its patches/ directory.
+    """
+    pack_path = os.path.join(plate_dir, PACK_NAME)
+    if os.path.isfile(pack_path):
+        return open_pack(pack_path).refs()
+    patch_dir = os.path.join(plate_dir, "patches")
+    if not os.path.isdir(patch_dir):
+        return []
+    names = sorted(os.listdir(patch_dir), key=_sort_key)
+    return [os.path.join(patch_dir, n) for n in names if os.path.isfile(os.path.join(patch_dir, n))]
+
+
+def pack_from_directory(patch_dir, pack_path=None, codec="raw"):
+    """Converts a directory of patch images into a pack. Returns the pack path."""
+    if pack_path is None:
+        pack_path = os.path.join(os.path.dirname(os.path.normpath(patch_dir)), PACK_NAME)
+    names = sorted(os.listdir(patch_dir), key=_sort_key)
+    with PatchPackWriter(pack_path, codec=codec) as writer:
+        for file_name in names:
+            file_path = os.path.join(patch_dir, file_name)
+            if not os.path.isfile(file_path):
+                continue
+            with Image.open(file_path) as img:
+                img.load()
+                writer.add(os.path.splitext(file_name)[0], img)
+    return pack_path
+
+
+def directory_from_pack(pack_path, patch_dir=None):
+    """Expands a pack back into one PNG per tile. Returns the directory."""
+    if patch_dir is None:
+        patch_dir = os.path.join(os.path.dirname(pack_path), "patches")
+    os.makedirs(patch_dir, exist_ok=True)
+    pack = PatchPack(pack_path)
+    try:
+        for name in pack.names():
+            pack.tile_image(name).save(os.path.join(patch_dir, f"{name}.png"))
+    finally:
+        pack.close()
+    return patch_dir
+
+
+# Example usage:
+#   python -m AppModules.patchPack to-pack data/images/img1/patches [--codec zlib]
+#   python -m AppModules.patchPack to-png data/images/img1/patches.ppk
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert between patches/ directories and patch packs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    to_pack = sub.add_parser("to-pack")
+    to_pack.add_argument("patch_dir")
+    to_pack.add_argument("pack_path", nargs="?")
+    to_pack.add_argument("--codec", choices=CODECS, default="raw")
+    to_png = sub.add_parser("to-png")
+    to_png.add_argument("pack_path")
+    to_png.add_argument("patch_dir", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "to-pack":
+        print(pack_from_directory(args.patch_dir, args.pack_path, codec=args.codec))
+    else:
+        print(directory_from_pack(args.pack_path, args.patch_dir))
@@ -0,0 +1,133 @@
+'''
+Predictive prefetching of patch images.
+
+Page2 tells the prefetcher which patches the operator is likely to look at
+next (grid neighbours, the next well, the next measurement). They are
+decoded on worker threads at the size they will be shown at into the shared
+ImageService, so they count against the app-wide memory budget, and the
+matching grid / strip thumbnails are warmed in the ThumbnailCache at the
+same time. A new prefetch() call supersedes whatever was still queued.
+'''
+
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from AppModules.imageService import get_image_service
+from AppModules.thumbnailCache import get_thumbnail_cache
+
+
+class _PrefetchSignals(QObject):
+    decoded = Signal(int, str, bool)  # generation, path, readable
+
+
+class _PrefetchTask(QRunnable):
+    def __init__(self, signals, cancelled, generation, path, full, thumbnail_sizes, service, size):
+        super().__init__()
+        self.signals = signals
+        self.cancelled = cancelled
+        self.generation = generation
+        self.path = path
+        self.full = full
+        self.thumbnail_sizes = thumbnail_sizes
+        self.service = service
+        self.size = size
+
+    def run(self):
+        if self.cancelled.is_set():
+            return
+        cache = get_thumbnail_cache()
+        for size in self.thumbnail_sizes:
+            cache.image(self.path, size)
+        if self.full and not self.cancelled.is_set():
+            image = self.service.image(self.path, self.size)
+            if not self.cancelled.is_set():
+                self.signals.decoded.emit(self.generation, self.path, not image.isNull())
+
+
+class PatchPrefetcher(QObject):
+    """
+    Prefetches patch images decoded to fit `size` (None = full resolution),
+    the size get() callers show them at.
+    """
+    def __init__(self, size=None, pool=None, service=None, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.pool = pool or QThreadPool.globalInstance()
+        self.service = service or get_image_service()
+        self._unused = set()  # prefetched paths not asked for yet
+        self._in_flight = set()
+        self._generation = 0
+        self._cancelled = threading.Event()
+        self._signals = _PrefetchSignals()
+        self._signals.decoded.connect(self._on_decoded)
+        # queued tasks must not emit once the owning page is gone
+        holder = self._holder = [self._cancelled]
+        self.destroyed.connect(lambda *_: holder[0].set())
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.wasted = 0
+
+    def prefetch(self, paths, full=True, thumbnail_sizes=(), replace=True):
+        """
+        Queues `paths` in priority order. Unless replace is False, work queued
+        by earlier calls that has not started yet is cancelled first. Paths
+        already in memory are only refreshed in the LRU order.
+        """
+        if replace:
+            self._cancelled.set()
+            self._cancelled = self._holder[0] = threading.Event()
+            self._generation += 1
+            self._in_flight.clear()
+        for path in paths:
+            cached = full and self.service.contains(path, self.size)
+            if cached and not thumbnail_sizes:
+                continue
+            if path in self._in_flight:
+                continue
+            self._in_flight.add(path)
+            self.pool.start(_PrefetchTask(self._signals, self._cancelled, self._generation, path,
+                                          full and not cached, tuple(thumbnail_sizes), self.service, self.size))
+
+    def get(self, path):
+        """The decoded image if it is in memory, else None. Counts hits and misses."""
+        image = self.service.cached(path, self.size)
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._unused.discard(path)
+        return image
+
+    def _on_decoded(self, generation, path, readable):
+        if generation == self._generation:
+            self._in_flight.discard(path)
+        if readable and path not in self._unused:
+            self._unused.add(path)
+            self.prefetched += 1
+
+    def _count_wasted(self):
+        # prefetched images evicted before anyone looked at them
+        evicted = {path for path in self._unused if not self.service.contains(path, self.size)}
+        self._unused -= evicted
+        self.wasted += len(evicted)
+
+    def clear(self):
+        self._cancelled.set()
+        self._cancelled = self._holder[0] = threading.Event()
+        self._count_wasted()
+        self._unused.clear()
+        self._in_flight.clear()
+
+    def stats(self):
+        self._count_wasted()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "prefetched": self.prefetched,
+            "wasted": self.wasted,
+            "unused": len(self._unused),
+        }
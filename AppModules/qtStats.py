@@ -0,0 +1,69 @@
+'''
+Live Qt object counts, used to check that widgets are reused instead of
+being rebuilt on every selection.
+
+Qt has no global object registry, so live_qobject_count() walks the object
+trees rooted at the application and at every top-level widget. Parentless
+non-widget QObjects are not reachable that way and are not counted.
+'''
+
+from collections import deque
+
+from PySide6.QtCore import QObject, QTimer, QCoreApplication, Signal
+from PySide6.QtWidgets import QApplication
+
+SAMPLE_INTERVAL_MS = 5000
+MAX_SAMPLES = 720
+
+
+def live_qobject_count():
+    app = QCoreApplication.instance()
+    if app is None:
+        return 0
+    count = 1 + len(app.findChildren(QObject))
+    if isinstance(app, QApplication):
+        for widget in app.topLevelWidgets():
+            count += 1 + len(widget.findChildren(QObject))
+    return count
+
+
+def live_widget_count():
+    return len(QApplication.allWidgets()) if QApplication.instance() is not None else 0
+
+
+def counts():
+    return {"qobjects": live_qobject_count(), "widgets": live_widget_count()}
+
+
+class QObjectMonitor(QObject):
+    """
+    Samples the live object counts on a timer. `sampled` carries the
+    QObject and widget counts; growth() compares the newest sample with the
+    very first one so a steady climb over a long session is easy to spot.
+    """
+    sampled = Signal(int, int)  # qobjects, widgets
+
+    def __init__(self, interval_ms=SAMPLE_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.first = None
+        self.samples = deque(maxlen=MAX_SAMPLES)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.sample)
+        self._timer.start(interval_ms)
+
+    def sample(self):
+        current = counts()
+        if self.first is None:
+            self.first = current
+        self.samples.append(current)
+        self.sampled.emit(current["qobjects"], current["widgets"])
+        return current
+
+    def growth(self):
+        if self.first is None:
+            return {"qobjects": 0, "widgets": 0}
+        last = self.samples[-1]
+        return {key: last[key] - self.first[key] for key in last}
+
+    def stop(self):
+        self._timer.stop()
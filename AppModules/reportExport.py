@@ -0,0 +1,339 @@
+'''
+Streaming export of per-patch and per-well statistics.
+
+Whole plates can hold millions of patches, so the report is never built in
+memory: patches are analysed chunk by chunk (cell counts and classifier
+scores, through the worker pool and the result cache) and every chunk is
+written out before the next one is taken. Memory stays bounded by the
+chunk size whatever the size of the dataset.
+
+Two files are written, in CSV or Parquet (Parquet needs pyarrow):
+
+    report.csv          one row per patch
+    report_wells.csv    one row per plate/well/measurement
+
+Both are written to a temporary name and only moved into place once the
+export finished, so a cancelled or failed export leaves nothing behind.
+
+    python -m AppModules.reportExport data/report.csv [--plates P1,P2] [--workers 4]
+'''
+
+import os
+import csv
+import time
+import importlib.util
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from AppModules import cellCount, patchClassifier, tracing
+from AppModules.memoryStats import peak_rss_bytes, reset_peak_rss
+
+# (name, Arrow type) of the report columns
+PATCH_COLUMNS = (("plate", "string"), ("well", "string"), ("measurement", "string"), ("position", "int64"),
+                 ("source", "string"), ("cells", "int64"), ("score", "float64"), ("highlighted", "bool"))
+WELL_COLUMNS = (("plate", "string"), ("well", "string"), ("measurement", "string"), ("patches", "int64"),
+                ("analysed", "int64"), ("cells", "int64"), ("cells_per_patch", "float64"),
+                ("highlighted", "int64"), ("mean_score", "float64"))
+FORMATS = ("csv", "parquet")
+# patches analysed and written per step; bounds the rows held in memory
+DEFAULT_CHUNK = 4096
+# patches per cell counting job, so a chunk is spread over the workers
+COUNT_BATCH = 256
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def parquet_available():
+    """True when pyarrow, which the Parquet writer needs, is installed."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def format_for_path(path):
+    return "parquet" if os.path.splitext(path)[1].lower() in (".parquet", ".pq") else "csv"
+
+
+def well_report_path(path):
+    root, ext = os.path.splitext(path)
+    return f"{root}_wells{ext}"
+
+
+# ---- writers -----------------------------------------------------------------
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self.columns = [name for name, _ in columns]
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+
+    def write(self, rows):
+        """Writes a chunk given as a dict of equally long column lists."""
+        self._writer.writerows(zip(*(rows[name] for name in self.columns)))
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """One row group per chunk, so nothing but the current chunk is kept in memory."""
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow); use a .csv file instead")
+        self._pa = pyarrow
+        self.columns = [name for name, _ in columns]
+        self._schema = pyarrow.schema(list(columns))
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        self._writer.write_table(self._pa.Table.from_pydict({name: rows[name] for name in self.columns},
+                                                            schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_writer(path, columns, fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown report format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    return ParquetWriter(path, columns) if fmt == "parquet" else CsvWriter(path, columns)
+
+
+# ---- analysis ----------------------------------------------------------------
+
+def _chunks(paths, size):
+    for start in range(0, len(paths), size):
+        yield start, paths[start:start + size]
+
+
+def _submit_chunk(paths, workers):
+    """Futures of the cell counts and classifier scores of one chunk of patches."""
+    counts = [patchClassifier.submit(cellCount.count_cells_in_patches, batch, workers=workers)
+              for batch in patchClassifier.batches(paths, COUNT_BATCH)]
+    scores = [patchClassifier.submit_batch(batch, workers=workers) for batch in patchClassifier.batches(paths)]
+    return counts, scores
+
+
+def _analyse_in_process(paths):
+    counts = cellCount.count_cells_in_patches(paths)["counts"]
+    result = patchClassifier.classify_batch(paths)
+    return counts, result
+
+
+def _collect(futures, cancelled):
+    """Waits for the futures, checking for cancellation every 100ms."""
+    pending = set(futures)
+    while pending:
+        if cancelled is not None and cancelled.is_set():
+            for future in futures:
+                future.cancel()
+            raise ExportCancelled()
+        _, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+    return [future.result() for future in futures]
+
+
+def _chunk_rows(key, start, paths, counts, classified):
+    plate, well, measurement = key
+    scores, highlighted = {}, {}
+    for result in classified:
+        for path, score, flag in zip(result["paths"], result["scores"], result["highlighted"]):
+            scores[path] = score
+            highlighted[path] = flag
+    return {
+        "plate": [plate] * len(paths),
+        "well": [well] * len(paths),
+        "measurement": [measurement] * len(paths),
+        "position": list(range(start, start + len(paths))),
+        "source": list(paths),
+        "cells": [counts.get(path) for path in paths],
+        "score": [scores.get(path) for path in paths],
+        "highlighted": [bool(highlighted.get(path)) for path in paths],
+    }
+
+
+class _WellTotals:
+    def __init__(self, key):
+        self.key = key
+        self.patches = self.analysed = self.cells = self.highlighted = 0
+        self.score_sum = 0.0
+        self.scored = 0
+
+    def add(self, rows):
+        self.patches += len(rows["source"])
+        for cells, score, flag in zip(rows["cells"], rows["score"], rows["highlighted"]):
+            if cells is not None:
+                self.analysed += 1
+                self.cells += cells
+            if score is not None:
+                self.scored += 1
+                self.score_sum += score
+            self.highlighted += flag
+
+    def row(self):
+        plate, well, measurement = self.key
+        return {
+            "plate": plate, "well": well, "measurement": measurement,
+            "patches": self.patches, "analysed": self.analysed, "cells": self.cells,
+            "cells_per_patch": self.cells / self.analysed if self.analysed else None,
+            "highlighted": self.highlighted,
+            "mean_score": self.score_sum / self.scored if self.scored else None,
+        }
+
+
+def iter_patch_chunks(records, chunk=DEFAULT_CHUNK, workers=None, cancelled=None):
+    """
+    Yields (key, rows) per chunk of patches, rows being a dict of column
+    lists, for records given as ((plate, well, measurement), patch sources)
+    pairs. The next chunk is already being analysed while one is yielded.
+    workers=0 analyses in-process.
+    """
+    jobs = ((key, start, paths) for key, sources in records for start, paths in _chunks(sources, chunk))
+    if workers == 0:
+        for key, start, paths in jobs:
+            if cancelled is not None and cancelled.is_set():
+                raise ExportCancelled()
+            counts, classified = _analyse_in_process(paths)
+            yield key, _chunk_rows(key, start, paths, counts, [classified])
+        return
+    queued = []
+    try:
+        for job in jobs:
+            queued.append((job, _submit_chunk(job[2], workers)))
+            if len(queued) < 2:
+                continue
+            yield _finish_chunk(queued.pop(0), cancelled)
+        while queued:
+            yield _finish_chunk(queued.pop(0), cancelled)
+    finally:
+        for _, (counts, scores) in queued:
+            for future in counts + scores:
+                future.cancel()
+
+
+def _finish_chunk(entry, cancelled):
+    (key, start, paths), (count_futures, score_futures) = entry
+    try:
+        counts = {}
+        for result in _collect(count_futures, cancelled):
+            counts.update(result["counts"])
+        classified = _collect(score_futures, cancelled)
+    finally:
+        # the chunk is no longer queued, so a cancellation must stop all of its jobs here;
+        # finished futures ignore cancel()
+        for future in count_futures + score_futures:
+            future.cancel()
+    return key, _chunk_rows(key, start, paths, counts, classified)
+
+
+# ---- export ------------------------------------------------------------------
+
+def export_report(path, app_data, plates=None, fmt=None, chunk=DEFAULT_CHUNK, workers=None,
+                  progress=None, cancelled=None):
+    """
+    Writes the patch report to `path` and the well summary next to it (see
+    well_report_path). plates limits the export to some plates; fmt defaults
+    to the file extension. progress(done, total) is called after every chunk
+    and `cancelled` (a threading.Event) stops the export between chunks, in
+    which case ExportCancelled is raised and no file is left behind.
+
+    Returns rows, seconds, rows_per_second and peak_rss (bytes, None where
+    unavailable) of the export.
+    """
+    fmt = fmt or format_for_path(path)
+    keys = app_data.getRecordKeys(plates)
+    total = sum(len(app_data.getPatchImageFiles(*key)) for key in keys)
+    # one record's sources at a time; their rows are produced chunk by chunk
+    records = ((key, app_data.getPatchImageFiles(*key)) for key in keys)
+    well_path = well_report_path(path)
+    partial = [f"{path}.part", f"{well_path}.part"]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    reset_peak_rss()
+    start = time.perf_counter()
+    patch_writer = open_writer(partial[0], PATCH_COLUMNS, fmt)
+    well_writer = None
+    done = wells = 0
+    finished = False
+    try:
+        well_writer = open_writer(partial[1], WELL_COLUMNS, fmt)
+        totals = None
+        with tracing.span("report export", patches=total, format=fmt):
+            for key, rows in iter_patch_chunks(records, chunk, workers, cancelled):
+                if totals is None or totals.key != key:
+                    if totals is not None:
+                        well_writer.write({name: [value] for name, value in totals.row().items()})
+                        wells += 1
+                    totals = _WellTotals(key)
+                totals.add(rows)
+                patch_writer.write(rows)
+                done += len(rows["source"])
+                tracing.counter("report export", rows=done)
+                if progress is not None:
+                    progress(done, total)
+            if totals is not None:
+                well_writer.write({name: [value] for name, value in totals.row().items()})
+                wells += 1
+        finished = True
+    finally:
+        patch_writer.close()
+        if well_writer is not None:
+            well_writer.close()
+        if finished:
+            os.replace(partial[0], path)
+            os.replace(partial[1], well_path)
+        else:
+            for name in partial:
+                if os.path.exists(name):
+                    os.remove(name)
+    seconds = time.perf_counter() - start
+    rows = done + wells
+    return {
+        "path": path,
+        "well_path": well_path,
+        "format": fmt,
+        "patch_rows": done,
+        "well_rows": wells,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else 0.0,
+        "peak_rss": peak_rss_bytes(),
+    }
+
+
+def format_stats(stats):
+    peak = stats["peak_rss"]
+    peak = f"{peak / 2**20:.0f} MB" if peak is not None else "n/a"
+    return (f"{stats['patch_rows']} patch rows and {stats['well_rows']} well rows in {stats['seconds']:.2f}s "
+            f"({stats['rows_per_second']:.0f} rows/s), peak memory {peak}")
+
+
+# Example usage:
+#   python -m AppModules.reportExport data/report.csv
+#   python -m AppModules.reportExport data/report.parquet --plates img1 --workers 4
+if __name__ == "__main__":
+    import sys
+    import argparse
+    from AppModules.AppData import AppData, DATA_DIR, catalog_path
+
+    parser = argparse.ArgumentParser(description="Export per-patch and per-well statistics")
+    parser.add_argument("output", help="report file (.csv or .parquet)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--plates", default=None, help="comma separated plate names (default: all)")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="patches per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="0 runs in-process")
+    args = parser.parse_args()
+
+    plates = set(args.plates.split(",")) if args.plates else None
+    # the index of --data-dir, never the app's catalog of data/images
+    app_data = AppData(args.data_dir, catalog_path(args.data_dir))
+    try:
+        stats = export_report(args.output, app_data, plates, chunk=args.chunk, workers=args.workers,
+                              progress=lambda done, total: print(f"\r{done}/{total} patches", end="", flush=True))
+    except (RuntimeError, ValueError) as e:
+        sys.exit(str(e))
+    finally:
+        patchClassifier.shutdown_executor()
+    print()
+    print(format_stats(stats))
@@ -0,0 +1,98 @@
+'''
+Runs the report export for the "Download Report" menu in the background.
+
+The export loop runs on a QThreadPool thread (the analysis itself goes to
+the worker processes); progress, the final stats or the error are handed
+back to the GUI thread with queued signals.
+'''
+
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from AppModules import reportExport
+
+
+class _ExportSignals(QObject):
+    progress = Signal(int, int, int)  # generation, done, total
+    finished = Signal(int, dict)
+    failed = Signal(int, str)
+
+
+class _ExportTask(QRunnable):
+    def __init__(self, signals, generation, cancelled, path, app_data, options):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.cancelled = cancelled
+        self.path = path
+        self.app_data = app_data
+        self.options = options
+
+    def run(self):
+        generation, signals = self.generation, self.signals
+        try:
+            stats = reportExport.export_report(
+                self.path, self.app_data, cancelled=self.cancelled,
+                progress=lambda done, total: signals.progress.emit(generation, done, total), **self.options)
+        except reportExport.ExportCancelled:
+            signals.failed.emit(generation, "cancelled")
+        except Exception as e:
+            signals.failed.emit(generation, str(e))
+        else:
+            signals.finished.emit(generation, stats)
+
+
+class ReportExportLoader(QObject):
+    """
+    progress(done, total) is emitted per written chunk, then either
+    finished(stats) with the reportExport.export_report() stats or
+    failed(message); message is "cancelled" after cancel().
+    """
+    progress = Signal(int, int)
+    finished = Signal(dict)
+    failed = Signal(str)
+
+    def __init__(self, pool=None, parent=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self.generation = 0
+        self._cancelled = threading.Event()
+        self._holder = [self._cancelled]
+        self._running = False
+        self._signals = _ExportSignals()
+        self._signals.progress.connect(self._on_progress)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        # an export must not outlive the window that started it
+        holder = self._holder
+        self.destroyed.connect(lambda *_: holder[0].set())
+
+    def isRunning(self):
+        return self._running
+
+    def export(self, path, app_data, **options):
+        """Starts exporting to `path`; options go to reportExport.export_report()."""
+        self.cancel()
+        self.generation += 1
+        self._cancelled = self._holder[0] = threading.Event()
+        self._running = True
+        self.pool.start(_ExportTask(self._signals, self.generation, self._cancelled, path, app_data, options))
+        return self.generation
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _on_progress(self, generation, done, total):
+        if generation == self.generation:
+            self.progress.emit(done, total)
+
+    def _on_finished(self, generation, stats):
+        if generation == self.generation:
+            self._running = False
+            self.finished.emit(stats)
+
+    def _on_failed(self, generation, message):
+        if generation == self.generation:
+            self._running = False
+            self.failed.emit(message)
@@ -0,0 +1,336 @@
+'''
+Persistent, content-addressed cache of per-patch analysis results.
+
+Results (classifier scores, cell counts, statistics, ...) are stored in a
+SQLite file keyed by the hash of the patch content plus the analysis name
+and version, so they survive restarts, re-tiling that produces identical
+patches, and moving the data directory. Changing an analysis' parameters
+means bumping its version; old entries then age out.
+
+Content hashes are memoised per source path, size and mtime, so a patch is
+only read again when it changed. All lookups and writes are batched: one
+transaction per get_many() / put_many(). The cache is bounded by the total
+size of the stored values, kept up to date by triggers so checking it costs
+nothing, and evicts least recently used entries first. Content hashes of
+evicted results and of sources that no longer exist are pruned as well.
+
+The file is shared by the GUI and the worker processes (WAL mode).
+
+    python -m AppModules.resultCache          # hit ratios and disk usage
+    python -m AppModules.resultCache --clear
+'''
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from AppModules import patchPack
+
+DEFAULT_PATH = os.path.join("data", "cache", "results.sqlite")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# SQLite limits the number of parameters per statement
+CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    digest TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (digest, analysis, version)
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    analysis TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS results_added AFTER INSERT ON results
+BEGIN UPDATE totals SET bytes = bytes + NEW.size WHERE name = 'results'; END;
+CREATE TRIGGER IF NOT EXISTS results_removed AFTER DELETE ON results
+BEGIN UPDATE totals SET bytes = bytes - OLD.size WHERE name = 'results'; END;
+CREATE TRIGGER IF NOT EXISTS results_resized AFTER UPDATE OF size ON results
+BEGIN UPDATE totals SET bytes = bytes + NEW.size - OLD.size WHERE name = 'results'; END;
+"""
+
+
+def _chunks(items, size=CHUNK):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _source_stat(source):
+    ref = patchPack.split_ref(source)
+    stat = os.stat(ref[0] if ref else source)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def content_digest(source):
+    """Hash of the bytes of a patch source: the file, or the tile of a pack."""
+    digest = hashlib.blake2b(digest_size=16)
+    ref = patchPack.split_ref(source)
+    if ref is not None:
+        digest.update(patchPack.open_pack(ref[0]).tile_buffer(ref[1]))
+    else:
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # INSERT OR REPLACE fires the delete trigger for the row it replaces only with this on
+        self._db.execute("PRAGMA recursive_triggers=ON")
+        self._db.executescript(SCHEMA)
+        with self._db:
+            # caches written before the running total existed are summed once
+            self._db.execute("INSERT OR IGNORE INTO totals SELECT 'results', COALESCE(SUM(size), 0) FROM results")
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ---- content hashes ----------------------------------------------------
+
+    def digests(self, sources):
+        """{source: digest} for every readable source; unreadable ones are left out."""
+        stats = {}
+        missing = []
+        for source in sources:
+            try:
+                stats[source] = _source_stat(source)
+            except OSError:
+                missing.append((source,))
+        known = {}
+        with self._lock:
+            if missing:
+                with self._db:
+                    self._db.executemany("DELETE FROM digests WHERE source = ?", missing)
+            for chunk in _chunks(stats):
+                rows = self._db.execute(
+                    f"SELECT source, size, mtime_ns, digest FROM digests WHERE source IN ({','.join('?' * len(chunk))})",
+                    chunk)
+                for source, size, mtime_ns, digest in rows:
+                    if stats[source] == (size, mtime_ns):
+                        known[source] = digest
+        fresh = []
+        for source in stats:
+            if source in known:
+                continue
+            try:
+                known[source] = content_digest(source)
+            except (OSError, KeyError, ValueError):
+                continue
+            fresh.append((source,) + stats[source] + (known[source],))
+        if fresh:
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)", fresh)
+        return known
+
+    # ---- results -----------------------------------------------------------
+
+    def get_many(self, analysis, version, sources):
+        """
+        Cached values of `analysis`/`version` for `sources`, as
+        {source: value}. Sources without a cached value are left out.
+        """
+        version = str(version)
+        digests = self.digests(sources)
+        by_digest = {}
+        for source, digest in digests.items():
+            by_digest.setdefault(digest, []).append(source)
+        found = {}
+        with self._lock, self._db:
+            for chunk in _chunks(by_digest):
+                rows = self._db.execute(
+                    f"SELECT digest, value FROM results WHERE analysis = ? AND version = ? "
+                    f"AND digest IN ({','.join('?' * len(chunk))})", [analysis, version] + chunk)
+                for digest, value in rows:
+                    value = json.loads(value)
+                    for source in by_digest[digest]:
+                        found[source] = value
+            used = {digests[source] for source in found}
+            now = time.time()
+            self._db.executemany("UPDATE results SET last_used = ? WHERE digest = ? AND analysis = ? AND version = ?",
+                                 [(now, digest, analysis, version) for digest in used])
+            hits = len(found)
+            misses = len(sources) - hits
+            self._db.execute("INSERT INTO counters VALUES (?, ?, ?) ON CONFLICT(analysis) DO UPDATE "
+                             "SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                             (analysis, hits, misses))
+            self.hits += hits
+            self.misses += misses
+        return found
+
+    def put_many(self, analysis, version, values):
+        """Stores {source: value} (JSON-serialisable values) for `analysis`/`version`."""
+        version = str(version)
+        digests = self.digests(values)
+        now = time.time()
+        rows = []
+        for source, digest in digests.items():
+            encoded = json.dumps(values[source])
+            rows.append((digest, analysis, version, encoded, len(encoded), now))
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._evict()
+
+    def total_bytes(self):
+        """Size of all stored values."""
+        with self._lock:
+            return self._db.execute("SELECT bytes FROM totals WHERE name = 'results'").fetchone()[0]
+
+    def _evict(self):
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        # drop the least recently used entries down to 90% of the budget
+        excess = total - int(self.max_bytes * 0.9)
+        doomed = []
+        for rowid, size in self._db.execute("SELECT rowid, size FROM results ORDER BY last_used"):
+            doomed.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM results WHERE rowid = ?", doomed)
+        # hashes no result refers to any more are only kept for re-reads; drop them
+        self._db.execute("DELETE FROM digests WHERE digest NOT IN (SELECT digest FROM results)")
+
+    def forget_missing(self, prefix=None):
+        """
+        Drops the content hashes of sources that no longer exist, of every
+        source or only of those below `prefix` (a patches/ directory or
+        pack, e.g. after it was re-tiled). Returns how many were dropped.
+        """
+        with self._lock:
+            if prefix is None:
+                rows = self._db.execute("SELECT source FROM digests").fetchall()
+            else:
+                pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                rows = self._db.execute("SELECT source FROM digests WHERE source LIKE ? ESCAPE '\\'",
+                                        (pattern,)).fetchall()
+        gone = []
+        for (source,) in rows:
+            try:
+                _source_stat(source)
+            except OSError:
+                gone.append((source,))
+        if gone:
+            with self._lock, self._db:
+                self._db.executemany("DELETE FROM digests WHERE source = ?", gone)
+        return len(gone)
+
+    def clear(self, analysis=None):
+        with self._lock, self._db:
+            if analysis is None:
+                self._db.execute("DELETE FROM results")
+                self._db.execute("DELETE FROM counters")
+            else:
+                self._db.execute("DELETE FROM results WHERE analysis = ?", (analysis,))
+                self._db.execute("DELETE FROM counters WHERE analysis = ?", (analysis,))
+
+    def stats(self):
+        """Hit ratios (this instance and all-time per analysis) and disk usage."""
+        with self._lock:
+            analyses = {}
+            for analysis, entries, size in self._db.execute(
+                    "SELECT analysis, COUNT(*), SUM(size) FROM results GROUP BY analysis"):
+                analyses[analysis] = {"entries": entries, "bytes": size, "hits": 0, "misses": 0}
+            for analysis, hits, misses in self._db.execute("SELECT analysis, hits, misses FROM counters"):
+                entry = analyses.setdefault(analysis, {"entries": 0, "bytes": 0})
+                entry.update(hits=hits, misses=misses,
+                             hit_ratio=hits / (hits + misses) if hits + misses else 0.0)
+        file_bytes = sum(os.path.getsize(self.path + suffix) for suffix in ("", "-wal", "-shm")
+                         if os.path.exists(self.path + suffix))
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": sum(a["entries"] for a in analyses.values()),
+            "value_bytes": sum(a["bytes"] or 0 for a in analyses.values()),
+            "file_bytes": file_bytes,
+            "max_bytes": self.max_bytes,
+            "analyses": analyses,
+        }
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_result_cache(path=DEFAULT_PATH):
+    """The process-wide cache for `path`."""
+    with _shared_lock:
+        cache = _shared.get(path)
+        if cache is None:
+            cache = _shared[path] = ResultCache(path)
+        return cache
+
+
+def cached_call(analysis, version, sources, compute, cache=None):
+    """
+    Returns {source: value} for every source, taking what it can from the
+    cache and calling compute(missing_sources) -> {source: value} for the
+    rest. Values of None are returned but not stored. Also returns the
+    number of cache hits.
+    """
+    cache = cache or get_result_cache()
+    values = cache.get_many(analysis, version, sources)
+    hits = len(values)
+    missing = [source for source in sources if source not in values]
+    if missing:
+        computed = compute(missing)
+        cache.put_many(analysis, version, {s: v for s, v in computed.items() if v is not None})
+        values.update(computed)
+    return values, hits
+
+
+# Example usage
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or clear the analysis result cache.")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--clear", action="store_true")
+    parser.add_argument("--prune", action="store_true", help="forget the hashes of patches that no longer exist")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.path)
+    if args.clear:
+        cache.clear()
+    if args.prune:
+        print(f"pruned {cache.forget_missing()} hashes of missing patches")
+    stats = cache.stats()
+    print(f"{stats['entries']} results, {stats['value_bytes'] / 1024:.1f} KiB of values, "
+          f"{stats['file_bytes'] / 1024:.1f} KiB on disk (budget {stats['max_bytes'] / 1024 / 1024:.0f} MiB)")
+    for analysis, entry in sorted(stats["analyses"].items()):
+        print(f"  {analysis}: {entry['entries']} results, hit ratio {entry.get('hit_ratio', 0.0):.2f} "
+              f"({entry['hits']} hits, {entry['misses']} misses)")
@@ -0,0 +1,180 @@
+'''
+Selection pipeline for Page2's plate / well / measurement dropdowns.
+
+A dropdown change only updates the pending selection and restarts a short
+debounce timer, so a burst of changes (building the page, a plate change
+that refills the well list, scrolling through a dropdown) settles into a
+single lookup. The lookup runs on a QThreadPool worker and comes back with
+the generation it was started for; a result whose selection has changed
+again in the meantime is dropped, so the page refreshes its grid and viewer
+once per settled selection.
+
+Latency is measured from the first change of a burst: to the lookup result
+("selection lookup") and to the first paint of the watched widgets once
+the result was applied ("selection to first pixels").
+'''
+
+import time
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, QEvent, Signal
+
+from AppModules import tracing
+
+# changes closer together than this are coalesced into one lookup
+DEBOUNCE_MS = 80
+# the lookup goes ahead of thumbnail decodes queued on the same pool
+LOOKUP_PRIORITY = 10
+
+
+def lookup(app_data, plate, well, measurement):
+    """
+    Resolves a selection against the catalog: the wells of the plate (the
+    well falls back to the first one if the plate does not have it) and the
+    patch sources of the selection.
+    """
+    wells = app_data.getWellNames(plate)
+    if wells and well not in wells:
+        well = wells[0]
+    return {
+        "plate": plate,
+        "well": well,
+        "measurement": measurement,
+        "wells": wells,
+        "paths": app_data.getPatchImageFiles(plate, well, measurement),
+    }
+
+
+class _SelectionSignals(QObject):
+    resolved = Signal(int, object)  # generation, lookup() result or exception
+
+
+class _LookupTask(QRunnable):
+    def __init__(self, signals, generation, app_data, selection):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.app_data = app_data
+        self.selection = selection
+
+    def run(self):
+        try:
+            result = lookup(self.app_data, *self.selection)
+        except Exception as e:
+            result = e
+        self.signals.resolved.emit(self.generation, result)
+
+
+class SelectionController(QObject):
+    """
+    selectionReady(result) is emitted on the GUI thread once per settled
+    selection, with the dict of lookup() plus its generation. latencyMeasured
+    (dict) follows at the first paint of a watched widget after that, with
+    the ms spent debouncing, looking up, applying (the selectionReady
+    handlers) and in total until the first pixels.
+    """
+    selectionReady = Signal(dict)
+    latencyMeasured = Signal(dict)
+
+    def __init__(self, app_data, debounce_ms=DEBOUNCE_MS, parent=None, pool=None):
+        super().__init__(parent)
+        self.app_data = app_data
+        self.pool = pool or QThreadPool.globalInstance()
+        self.generation = 0
+        self.last_latency = {}
+        self._selection = (None, None, None)  # plate, well, measurement
+        self._burst_start = None
+        self._settled_at = None
+        self._in_flight = False
+        self._awaiting_pixels = None  # latency dict of the applied selection, until its first paint
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._settle)
+        self._signals = _SelectionSignals()
+        self._signals.resolved.connect(self._on_resolved)
+
+    def selection(self):
+        return self._selection
+
+    def setSelection(self, plate, well, measurement):
+        """Sets the selection without looking it up, e.g. before the page is built."""
+        self._selection = (plate, well, measurement)
+
+    def resolve(self):
+        """Looks the current selection up synchronously and returns the lookup() result."""
+        return lookup(self.app_data, *self._selection)
+
+    def setPlate(self, plate):
+        self._change(plate, *self._selection[1:])
+
+    def setWell(self, well):
+        self._change(self._selection[0], well, self._selection[2])
+
+    def setMeasurement(self, measurement):
+        self._change(*self._selection[:2], measurement)
+
+    def isSettled(self):
+        """True when no change is waiting for the debounce timer or a lookup."""
+        return not self._timer.isActive() and not self._in_flight
+
+    def reload(self):
+        """Looks the current selection up again right away, e.g. after the catalog changed."""
+        self._change(*self._selection)
+        self.flush()
+
+    def flush(self):
+        """Starts the lookup of a pending change right away instead of after the debounce."""
+        if self._timer.isActive():
+            self._timer.stop()
+            self._settle()
+
+    def watchPaint(self, widget):
+        """The first paint of `widget` after a selection was applied ends its latency measurement."""
+        widget.installEventFilter(self)
+
+    def _change(self, plate, well, measurement):
+        self._selection = (plate, well, measurement)
+        if self._burst_start is None:
+            self._burst_start = time.perf_counter()
+        # results of lookups already under way are stale from here on
+        self.generation += 1
+        self._awaiting_pixels = None
+        self._timer.start()
+
+    def _settle(self):
+        self._settled_at = time.perf_counter()
+        self._in_flight = True
+        self.pool.start(_LookupTask(self._signals, self.generation, self.app_data, self._selection), LOOKUP_PRIORITY)
+
+    def _on_resolved(self, generation, result):
+        if generation != self.generation:
+            tracing.instant("selection dropped", generation=generation)
+            return
+        self._in_flight = False
+        start, self._burst_start = self._burst_start, None
+        if isinstance(result, Exception):
+            tracing.instant("selection lookup failed", error=str(result))
+            return
+        resolved = time.perf_counter()
+        tracing.complete("selection lookup", start, resolved - start, patches=len(result["paths"]))
+        latency = {
+            "generation": generation,
+            "debounce_ms": (self._settled_at - start) * 1000,
+            "lookup_ms": (resolved - self._settled_at) * 1000,
+        }
+        self.selectionReady.emit(dict(result, generation=generation))
+        applied = time.perf_counter()
+        latency["apply_ms"] = (applied - resolved) * 1000
+        latency["start"] = start
+        self._awaiting_pixels = latency
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self._awaiting_pixels is not None:
+            latency, self._awaiting_pixels = self._awaiting_pixels, None
+            start = latency.pop("start")
+            latency["first_pixels_ms"] = (time.perf_counter() - start) * 1000
+            tracing.complete("selection to first pixels", start, latency["first_pixels_ms"] / 1000,
+                             generation=latency["generation"])
+            self.last_latency = latency
+            self.latencyMeasured.emit(latency)
+        return False
@@ -0,0 +1,110 @@
+'''
+Uniform grid ("bucket") index over axis-aligned boxes.
+
+Used for hit testing cell outlines: a point or rectangle query only looks
+at the items of the buckets it touches instead of scanning every item.
+Items are (x0, y0, x1, y1) boxes; an item is listed in every bucket its box
+overlaps, so queries never miss one at a bucket border.
+
+    index = GridIndex.from_boxes(boxes)          # (N, 4) array
+    index.query_point(x, y)                      # ids whose box contains it
+    index.query_rect(x0, y0, x1, y1)             # ids whose box overlaps it
+'''
+
+import math
+
+import numpy as np
+
+
+class GridIndex:
+    def __init__(self, cell_size=64.0):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = float(cell_size)
+        self._buckets = {}  # (bx, by) -> [item, ...]
+        self._boxes = {}    # item -> (x0, y0, x1, y1)
+
+    @classmethod
+    def from_boxes(cls, boxes, cell_size=None):
+        """
+        Index of the rows of a (N, 4) box array, as items 0..N-1. By default
+        buckets are twice the median box size, which keeps both the number of
+        buckets per item and the items per bucket small.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if cell_size is None:
+            extent = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) if len(boxes) else []
+            cell_size = max(1.0, 2.0 * float(np.median(extent))) if len(boxes) else 64.0
+        index = cls(cell_size)
+        first = np.floor(boxes[:, :2] / index.cell_size).astype(np.int64)
+        last = np.floor(boxes[:, 2:] / index.cell_size).astype(np.int64)
+        buckets = index._buckets
+        for item, ((bx0, by0), (bx1, by1), box) in enumerate(zip(first.tolist(), last.tolist(), boxes.tolist())):
+            index._boxes[item] = tuple(box)
+            for by in range(by0, by1 + 1):
+                for bx in range(bx0, bx1 + 1):
+                    buckets.setdefault((bx, by), []).append(item)
+        return index
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def _range(self, lo, hi):
+        return range(math.floor(lo / self.cell_size), math.floor(hi / self.cell_size) + 1)
+
+    def insert(self, item, box):
+        x0, y0, x1, y1 = box
+        self._boxes[item] = (x0, y0, x1, y1)
+        for by in self._range(y0, y1):
+            for bx in self._range(x0, x1):
+                self._buckets.setdefault((bx, by), []).append(item)
+
+    def remove(self, item):
+        box = self._boxes.pop(item, None)
+        if box is None:
+            return
+        x0, y0, x1, y1 = box
+        for by in self._range(y0, y1):
+            for bx in self._range(x0, x1):
+                bucket = self._buckets.get((bx, by))
+                if bucket is not None and item in bucket:
+                    bucket.remove(item)
+
+    def box(self, item):
+        return self._boxes[item]
+
+    def query_point(self, x, y):
+        """Items whose box contains (x, y)."""
+        key = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+        boxes = self._boxes
+        return [item for item in self._buckets.get(key, ())
+                if boxes[item][0] <= x <= boxes[item][2] and boxes[item][1] <= y <= boxes[item][3]]
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Items whose box overlaps the rectangle, each once."""
+        found = set()
+        boxes = self._boxes
+        for by in self._range(y0, y1):
+            for bx in self._range(x0, x1):
+                for item in self._buckets.get((bx, by), ()):
+                    if item in found:
+                        continue
+                    bx0, by0, bx1, by1 = boxes[item]
+                    if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0:
+                        found.add(item)
+        return found
+
+
+def point_in_polygon(x, y, polygon):
+    """Even-odd test of (x, y) against a (K, 2) polygon, vectorised over its edges."""
+    px, py = polygon[:, 0], polygon[:, 1]
+    qx, qy = np.roll(px, -1), np.roll(py, -1)
+    crosses = (py > y) != (qy > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        at_x = px + (y - py) * (qx - px) / (qy - py)
+    return bool(np.count_nonzero(crosses & (x < at_x)) % 2)
+
+
+def polygon_area(polygon):
+    px, py = polygon[:, 0], polygon[:, 1]
+    return 0.5 * abs(float(np.dot(px, np.roll(py, -1)) - np.dot(py, np.roll(px, -1))))
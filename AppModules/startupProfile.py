@@ -0,0 +1,179 @@
+'''
+Startup profiler.
+
+Records named phases from process start to the first paint of the main
+window and to the point where it is interactive (deferred construction
+finished). Kept free of Qt at import time so main.py can import it first.
+
+    from AppModules import startupProfile
+    with startupProfile.phase("build shell"):
+        window = MyApp()
+    startupProfile.watch_first_paint(window)
+    ...
+    startupProfile.mark_interactive()
+
+The report is printed when APP_STARTUP_PROFILE=1 or --profile-startup is set,
+or written to data/traces/startup-<time>.txt where there is no console (the
+windowed executable).
+
+Process creation time is read from /proc on Linux, GetProcessTimes on
+Windows (so the frozen exe's bootloader is included) or psutil where it is
+installed. Elsewhere the report says so and starts at this module's import.
+'''
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from AppModules import tracing
+
+_MODULE_LOADED = time.perf_counter()
+_phases = []          # (name, start, end) in perf_counter seconds
+_marks = {}           # milestone -> perf_counter seconds
+_reported = False
+
+
+def _linux_process_age():
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _windows_process_age():
+    """Age of the process from its creation time (GetProcessTimes); covers the frozen exe's bootloader too."""
+    if sys.platform != "win32":
+        return None
+    import ctypes
+    from ctypes import wintypes
+    creation, exit_, kernel, user = (wintypes.FILETIME() for _ in range(4))
+    try:
+        kernel32 = ctypes.windll.kernel32
+        if not kernel32.GetProcessTimes(kernel32.GetCurrentProcess(), ctypes.byref(creation), ctypes.byref(exit_),
+                                        ctypes.byref(kernel), ctypes.byref(user)):
+            return None
+    except (AttributeError, OSError):
+        return None
+    # FILETIME counts 100ns intervals since 1601-01-01 UTC
+    created = ((creation.dwHighDateTime << 32) | creation.dwLowDateTime) / 1e7 - 11644473600
+    return time.time() - created
+
+
+def _psutil_process_age():
+    try:
+        import psutil
+        return time.time() - psutil.Process().create_time()
+    except (ImportError, OSError):
+        return None
+
+
+def _process_start():
+    """
+    (perf_counter() value of process creation, how it was found). Without a
+    way to read the creation time the import of this module stands in for
+    it, and the method is "module import".
+    """
+    for method, read_age in (("/proc", _linux_process_age), ("GetProcessTimes", _windows_process_age),
+                             ("psutil", _psutil_process_age)):
+        age = read_age()
+        if age is not None and age >= 0:
+            return time.perf_counter() - age, method
+    return _MODULE_LOADED, "module import"
+
+
+PROCESS_START, PROCESS_START_METHOD = _process_start()
+
+
+def enabled():
+    return os.environ.get("APP_STARTUP_PROFILE") == "1" or "--profile-startup" in sys.argv
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _phases.append((name, start, end))
+        tracing.complete(f"startup: {name}", start, end - start)
+
+
+def mark(name):
+    _marks.setdefault(name, time.perf_counter())
+
+
+def watch_first_paint(widget):
+    """Marks "first paint" when `widget` receives its first paint event."""
+    from PySide6.QtCore import QObject, QEvent
+
+    class _FirstPaint(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint:
+                mark("first paint")
+                obj.removeEventFilter(self)
+            return False
+
+    watcher = _FirstPaint(widget)
+    widget.installEventFilter(watcher)
+
+
+def mark_interactive():
+    """Marks "interactive" and prints the report if profiling is enabled."""
+    mark("interactive")
+    if enabled():
+        report()
+
+
+def elapsed_ms(name):
+    at = _marks.get(name)
+    return None if at is None else (at - PROCESS_START) * 1000
+
+
+def summary():
+    return {
+        "process_start": PROCESS_START_METHOD,
+        "interpreter": (_MODULE_LOADED - PROCESS_START) * 1000,
+        "phases": [(name, (start - PROCESS_START) * 1000, (end - start) * 1000) for name, start, end in _phases],
+        "marks": {name: elapsed_ms(name) for name in _marks},
+    }
+
+
+def format_report(data=None):
+    data = data or summary()
+    if data.get("process_start", PROCESS_START_METHOD) == "module import":
+        lines = ["startup profile (ms since the profiler was imported: the process start time is not "
+                 "available here, so interpreter and bootloader start-up are NOT included)"]
+    else:
+        lines = ["startup profile (ms since process start)",
+                 f"  {'interpreter + early imports':<32}{'':>9}{data['interpreter']:9.1f}"]
+    for name, at, duration in data["phases"]:
+        lines.append(f"  {name:<32}{at:9.1f}{duration:9.1f}")
+    for name, at in sorted(data["marks"].items(), key=lambda item: item[1]):
+        lines.append(f"  -> {name:<29}{at:9.1f}")
+    return "\n".join(lines)
+
+
+def report(stream=None):
+    """Prints the report, or writes it next to the traces when there is no console. Returns that file."""
+    global _reported
+    if _reported:
+        return None
+    _reported = True
+    if stream is not None or tracing.has_console():
+        print(format_report(), file=stream or sys.stderr)
+        return None
+    path = os.path.join(tracing.TRACE_DIR, time.strftime("startup-%Y%m%d-%H%M%S.txt"))
+    try:
+        os.makedirs(tracing.TRACE_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(format_report() + "\n")
+    except OSError:
+        return None
+    return path
@@ -0,0 +1,199 @@
+'''
+Two-level thumbnail cache for patch grids.
+
+Level 1 is the shared in-memory ImageService (one byte budget for all
+decoded images of the app), level 2 is a directory of small PNGs keyed by
+source path, mtime and target size. Thumbnails are grouped on disk by the patches/ directory or pack they
+come from, so dataPreparation can drop all thumbnails of a plate when it
+regenerates its patches without importing Qt.
+'''
+
+import os
+import sys
+import shutil
+import hashlib
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join("data", "cache", "thumbnails")
+# namespace of the thumbnails in the shared ImageService
+NAMESPACE = "thumbnail"
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def source_group(path):
+    """The patches/ directory or pack file a patch source belongs to."""
+    from AppModules.patchPack import split_ref
+    ref = split_ref(path)
+    return os.path.abspath(ref[0] if ref else os.path.dirname(path))
+
+
+def group_dir(group, cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, _digest(os.path.abspath(group))[:16])
+
+
+def invalidate_group(group, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Drops every cached thumbnail of a patches/ directory or pack on disk, and
+    all decoded images of it held in memory, and closes the pack if this
+    process has it mapped. Called by dataPreparation before and after
+    re-tiling.
+    """
+    shutil.rmtree(group_dir(group, cache_dir), ignore_errors=True)
+    # only if this process already holds decoded images; never imports Qt
+    service = sys.modules.get("AppModules.imageService")
+    if service is not None and service._shared is not None:
+        service._shared.invalidate(group=group)
+    # after the images, which may still be views into the mapping
+    packs = sys.modules.get("AppModules.patchPack")
+    if packs is not None:
+        packs.close_pack(group)
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, service=None):
+        self.cache_dir = cache_dir
+        self._service = service
+        self._lock = threading.RLock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def service(self):
+        # imported lazily: dataPreparation uses this module without Qt
+        if self._service is None:
+            from AppModules.imageService import get_image_service
+            self._service = get_image_service()
+        return self._service
+
+    def _key(self, path, width, height):
+        from AppModules.imageIO import source_mtime_ns
+        return (NAMESPACE, path, source_mtime_ns(path), width, height)
+
+    def _disk_path(self, key):
+        _, path, mtime_ns, width, height = key
+        name = _digest(f"{path}|{mtime_ns}|{width}x{height}") + ".png"
+        return os.path.join(group_dir(source_group(path), self.cache_dir), name)
+
+    def cached_image(self, path, size):
+        """The thumbnail if it is already in memory, else None. Never touches the disk."""
+        try:
+            key = self._key(path, size.width(), size.height())
+        except OSError:
+            return None
+        image = self.service.get(key)
+        if image is not None:
+            with self._lock:
+                self.memory_hits += 1
+        return image
+
+    def image(self, path, size):
+        """
+        Returns a QImage of `path` scaled to fit `size` (a QSize), keeping the
+        aspect ratio. Safe to call from worker threads. Returns a null QImage
+        if the source cannot be read.
+        """
+        from PySide6.QtCore import Qt
+        from PySide6.QtGui import QImage
+        from AppModules import tracing
+        from AppModules.imageIO import read_qimage, is_memory_ref
+
+        try:
+            key = self._key(path, size.width(), size.height())
+        except OSError:
+            return QImage()
+        image = self.service.get(key)
+        if image is not None:
+            with self._lock:
+                self.memory_hits += 1
+            tracing.counter("thumbnail cache", memory_hits=self.memory_hits,
+                            disk_hits=self.disk_hits, misses=self.misses)
+            return image
+
+        # memory sources have nothing on disk to cache thumbnails for
+        disk_path = None if is_memory_ref(path) else self._disk_path(key)
+        with tracing.span("thumbnail disk read"):
+            image = QImage(disk_path) if disk_path and os.path.isfile(disk_path) else QImage()
+        if not image.isNull():
+            with self._lock:
+                self.disk_hits += 1
+            self.service.put(key, image)
+            return image
+
+        image = read_qimage(path, size)
+        if image.isNull():
+            return image
+        fitted = image.size().scaled(size, Qt.KeepAspectRatio)
+        if image.size() != fitted:
+            # sources smaller than the thumbnail are scaled up like before
+            with tracing.span("scale", width=fitted.width(), height=fitted.height()):
+                image = image.scaled(fitted, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        with self._lock:
+            self.misses += 1
+        self.service.put(key, image)
+        tracing.counter("thumbnail cache", memory_hits=self.memory_hits,
+                        disk_hits=self.disk_hits, misses=self.misses)
+        if disk_path is None:
+            return image
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+            if image.save(tmp_path, "PNG", 80):
+                os.replace(tmp_path, disk_path)
+        except OSError:
+            # the disk layer is best effort, the thumbnail is still served from memory
+            pass
+        return image
+
+    def pixmap(self, path, size):
+        """QPixmap version of image(); GUI thread only."""
+        from PySide6.QtGui import QPixmap
+        image = self.image(path, size)
+        return QPixmap.fromImage(image) if not image.isNull() else QPixmap()
+
+    def invalidate(self, path=None, group=None, disk=True):
+        """
+        Forgets thumbnails of one source path, of every source of a group
+        (patches/ directory or pack), or everything when neither is given.
+        """
+        if path is None and group is None:
+            self.service.invalidate(namespace=NAMESPACE)
+            if disk:
+                shutil.rmtree(self.cache_dir, ignore_errors=True)
+            return
+        self.service.invalidate(path=path, group=group, namespace=NAMESPACE)
+        if disk and group is not None:
+            shutil.rmtree(group_dir(group, self.cache_dir), ignore_errors=True)
+        elif disk and path is not None:
+            # file names include the mtime and size, so remove the whole group
+            shutil.rmtree(group_dir(source_group(path), self.cache_dir), ignore_errors=True)
+
+    def stats(self):
+        memory = self.service.namespace_stats(NAMESPACE)
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": memory["entries"],
+                "memory_bytes": memory["bytes"],
+                "memory_budget": self.service.budget_bytes,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_thumbnail_cache():
+    """The process-wide cache used by the grids."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ThumbnailCache()
+        return _shared
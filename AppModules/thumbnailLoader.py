@@ -0,0 +1,113 @@
+'''
+Background thumbnail loading for the patch grids.
+
+Thumbnails are produced on QThreadPool workers through the shared
+ThumbnailCache and handed back to the GUI thread with a queued signal.
+Every load() starts a new generation; results and pending work of older
+generations are dropped, so a grid that has moved on never gets stale tiles.
+'''
+
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtGui import QImage
+
+from AppModules.thumbnailCache import get_thumbnail_cache
+
+
+class _LoaderSignals(QObject):
+    loaded = Signal(int, int, QImage)  # generation, index, thumbnail
+
+
+class _CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class _ThumbnailTask(QRunnable):
+    def __init__(self, signals, token, generation, index, path, size, cache):
+        super().__init__()
+        self.signals = signals
+        self.token = token
+        self.generation = generation
+        self.index = index
+        self.path = path
+        self.size = size
+        self.cache = cache
+
+    def run(self):
+        if self.token.cancelled:
+            return
+        image = self.cache.image(self.path, self.size)
+        if not self.token.cancelled:
+            self.signals.loaded.emit(self.generation, self.index, image)
+
+
+class ThumbnailLoader(QObject):
+    """
+    Loads thumbnails of a list of patch sources in the background.
+
+    thumbnailReady(index, image) is emitted on the GUI thread for every
+    thumbnail of the current generation, in completion order.
+    """
+    thumbnailReady = Signal(int, QImage)
+
+    def __init__(self, size, parent=None, pool=None, cache=None):
+        super().__init__(parent)
+        self.size = size
+        self.pool = pool or QThreadPool.globalInstance()
+        self.cache = cache or get_thumbnail_cache()
+        self.generation = 0
+        self._token = [_CancelToken()]
+        self._signals = _LoaderSignals()
+        self._signals.loaded.connect(self._on_loaded)
+        # the owning grid may be deleted mid-load; stop its queued work too
+        token = self._token
+        self.destroyed.connect(lambda *_: token[0].cancel())
+
+    def cached(self, path):
+        """The thumbnail if it is already in memory, else None."""
+        return self.cache.cached_image(path, self.size)
+
+    def load(self, paths, skip=()):
+        """
+        Cancels any running load and queues `paths`; indexes in `skip` are
+        not queued (e.g. because they were served from memory already).
+        Returns the new generation.
+        """
+        self.cancel()
+        self.generation += 1
+        skip = set(skip)
+        for index, path in enumerate(paths):
+            if index in skip:
+                continue
+            task = _ThumbnailTask(self._signals, self._token[0], self.generation, index, path, self.size, self.cache)
+            self.pool.start(task)
+        return self.generation
+
+    def reset(self):
+        """Cancels everything and starts an empty generation for request()."""
+        self.cancel()
+        self.generation += 1
+        return self.generation
+
+    def request(self, index, path):
+        """Queues one more thumbnail for the current generation."""
+        task = _ThumbnailTask(self._signals, self._token[0], self.generation, index, path, self.size, self.cache)
+        self.pool.start(task)
+
+    def cancel(self):
+        """Drops all pending and in-flight work of the current generation."""
+        self._token[0].cancel()
+        self._token[0] = _CancelToken()
+
+    def _on_loaded(self, generation, index, image):
+        if generation == self.generation:
+            self.thumbnailReady.emit(index, image)
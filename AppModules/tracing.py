@@ -0,0 +1,216 @@
+'''
+Lightweight tracing of the hot paths, exported as Chrome trace JSON.
+
+    from AppModules import tracing
+
+    with tracing.span("decode", path=path):
+        ...
+    tracing.counter("thumbnail cache", hits=12, misses=3)
+    tracing.instant("patch clicked", path=path)
+
+Tracing is off unless enabled with tracing.enable(), the --trace command
+line flag of main.py or APP_TRACE=1. While off, span() hands back one
+shared no-op object, so instrumented code pays a function call and a flag
+check. While on, events go into a bounded in-memory ring buffer and are
+written at exit (or by export()) to data/traces/, ready for
+chrome://tracing or https://ui.perfetto.dev.
+
+Timestamps come from perf_counter, which is a system-wide monotonic clock,
+so events recorded in worker processes line up with those of the GUI.
+'''
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from collections import deque
+
+TRACE_DIR = os.path.join("data", "traces")
+MAX_EVENTS = 200_000
+
+_enabled = False
+_events = deque(maxlen=MAX_EVENTS)
+_thread_names = {}
+_export_path = None
+
+
+def has_console():
+    """False in the windowed executable (main.spec builds with console=False), which has no stderr."""
+    return sys.stderr is not None and not getattr(sys, "frozen", False)
+
+
+def _now_us():
+    return time.perf_counter_ns() / 1000.0
+
+
+def _tid():
+    tid = threading.get_ident()
+    if tid not in _thread_names:
+        _thread_names[tid] = threading.current_thread().name
+    return tid
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc):
+        end = _now_us()
+        _events.append(("X", self.name, self.start, end - self.start, _tid(), self.args))
+        return False
+
+    def set(self, **args):
+        """Adds arguments known only inside the span, e.g. a result size."""
+        self.args.update(args)
+
+
+def enabled():
+    return _enabled
+
+
+def span(name, **args):
+    """Context manager timing a block as a complete ("X") event."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator form of span(); the span is named after the function by default."""
+    def decorate(function):
+        label = name or function.__qualname__
+
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(label, {}):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__qualname__ = function.__qualname__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorate
+
+
+def instant(name, **args):
+    if _enabled:
+        _events.append(("i", name, _now_us(), 0, _tid(), args))
+
+
+def counter(name, **values):
+    """One or more named values over time, drawn as a chart track."""
+    if _enabled:
+        _events.append(("C", name, _now_us(), 0, _tid(), values))
+
+
+def complete(name, start_seconds, seconds, pid=None, tid=None, **args):
+    """
+    Records a span measured elsewhere, e.g. in a worker process, from its
+    perf_counter() start and duration in seconds.
+    """
+    if _enabled:
+        _events.append(("X", name, start_seconds * 1e6, seconds * 1e6, tid or _tid(), dict(args, _pid=pid)))
+
+
+def enable(path=None):
+    """
+    Starts recording. The trace is written to `path` (default a timestamped
+    file in data/traces/) when the process exits.
+    """
+    global _enabled, _export_path
+    if not _enabled:
+        atexit.register(_export_at_exit)
+    _enabled = True
+    _export_path = path or os.path.join(TRACE_DIR, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+    return _export_path
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def enable_from_environment(argv=None):
+    """Enables tracing for --trace[=PATH] in argv or APP_TRACE=1 / APP_TRACE=PATH."""
+    argv = sys.argv if argv is None else argv
+    for arg in argv:
+        if arg == "--trace":
+            return enable()
+        if arg.startswith("--trace="):
+            return enable(arg.split("=", 1)[1])
+    value = os.environ.get("APP_TRACE")
+    if value:
+        return enable(None if value == "1" else value)
+    return None
+
+
+def clear():
+    _events.clear()
+
+
+def events():
+    """The recorded events in Chrome trace format."""
+    pid = os.getpid()
+    trace = []
+    for phase, name, ts, dur, tid, args in list(_events):
+        event = {"ph": phase, "name": name, "ts": ts, "pid": pid, "tid": tid}
+        if args:
+            args = dict(args)
+            event["pid"] = args.pop("_pid", None) or pid
+            if args:
+                event["args"] = args
+        if phase == "X":
+            event["dur"] = dur
+        elif phase == "i":
+            event["s"] = "t"
+        trace.append(event)
+    for tid, thread_name in list(_thread_names.items()):
+        trace.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+    return trace
+
+
+def export(path=None):
+    """Writes the trace as JSON and returns its path."""
+    path = path or _export_path or os.path.join(TRACE_DIR, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _export_at_exit():
+    if _events:
+        try:
+            path = export()
+        except OSError:
+            return
+        # without a console the trace is found in TRACE_DIR
+        if has_console():
+            print(f"trace written to {path}", file=sys.stderr)
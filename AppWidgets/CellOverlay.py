@@ -0,0 +1,239 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+from PySide6.QtWidgets import QWidget
+from PySide6.QtGui import QPainter, QPainterPath, QPolygonF, QPen, QColor
+from PySide6.QtCore import Qt, QPointF, QRect, QSize, QEvent, Signal
+
+from AppModules import tracing
+from AppModules.spatialIndex import GridIndex, point_in_polygon, polygon_area
+
+OUTLINE_COLOR = QColor(0, 220, 120)
+HOVER_COLOR = QColor(255, 200, 0)
+SELECTED_COLOR = QColor(235, 0, 0)
+# Outlines are grouped into square chunks of this many image pixels; a chunk
+# is drawn as one cached path, and only chunks near the exposed area are drawn
+CHUNK_SIZE = 256
+MAX_CACHED_PATHS = 4096
+# Coarse zoom levels keep roughly one outline point per this many screen pixels
+POINT_SPACING = 3.0
+MIN_POINTS = 4
+
+
+class CellOverlay(QWidget):
+    """
+    Cell outlines drawn on top of another widget that shows an image.
+
+    The overlay covers its target (it is the target's child and follows its
+    size) and maps image coordinates to it by the ratio of the two sizes, so
+    it works for a label with scaled contents as well as for a zoomed view.
+
+    Outlines are painted from QPainterPaths cached per zoom level (levels
+    are powers of two; coarser levels keep fewer points) and per chunk of
+    the image, and chunks outside the exposed area are skipped. Hover and
+    clicks are resolved through a GridIndex of the outline boxes followed
+    by an exact point-in-polygon test of the few candidates.
+    """
+    cellHovered = Signal(int)  # outline index, -1 when leaving a cell
+    cellClicked = Signal(int)
+
+    def __init__(self, target):
+        super().__init__(target)
+        self.setAttribute(Qt.WA_NoSystemBackground)
+        self.setMouseTracking(True)
+        self._image_size = QSize()
+        self._contours = []
+        self._boxes = np.empty((0, 4))
+        self._index = None
+        self._chunks = {}  # (cx, cy) -> [outline index]
+        self._paths = OrderedDict()  # (level, cx, cy) -> QPainterPath
+        self._max_extent = 0.0
+        self._hovered = -1
+        self._selected = -1
+        self.setTarget(target)
+
+    def setTarget(self, target):
+        """Moves the overlay onto another widget (e.g. when a viewer swaps its display widget)."""
+        old = self.parentWidget()
+        if old is not None:
+            old.removeEventFilter(self)
+        if old is not target:
+            self.setParent(target)
+        target.installEventFilter(self)
+        self.setGeometry(target.rect())
+        self.raise_()
+        self.show()
+
+    def eventFilter(self, obj, event):
+        if obj is self.parentWidget() and event.type() == QEvent.Resize:
+            self.setGeometry(obj.rect())
+        return False
+
+    # ---- data --------------------------------------------------------------
+
+    def setContours(self, contours, image_size):
+        """
+        Shows `contours` ((K, 2) arrays of x, y in image pixels) over an image
+        of `image_size` (QSize).
+        """
+        self._contours = [np.asarray(contour, dtype=np.float32) for contour in contours]
+        self._image_size = QSize(image_size)
+        self._paths.clear()
+        self._hovered = self._selected = -1
+        if self._contours:
+            points = np.concatenate(self._contours)
+            starts = np.cumsum([0] + [len(contour) for contour in self._contours[:-1]])
+            mins = np.minimum.reduceat(points, starts)
+            maxs = np.maximum.reduceat(points, starts)
+            self._boxes = np.hstack([mins, maxs]).astype(np.float64)
+            self._index = GridIndex.from_boxes(self._boxes)
+            self._max_extent = float((maxs - mins).max())
+            centres = ((mins + maxs) / 2 // CHUNK_SIZE).astype(np.int64)
+            self._chunks = {}
+            for item, (cx, cy) in enumerate(centres.tolist()):
+                self._chunks.setdefault((cx, cy), []).append(item)
+        else:
+            self._boxes = np.empty((0, 4))
+            self._index = None
+            self._chunks = {}
+            self._max_extent = 0.0
+        self.update()
+
+    def clear(self):
+        self.setContours([], QSize())
+
+    def contourCount(self):
+        return len(self._contours)
+
+    def contour(self, index):
+        return self._contours[index]
+
+    def cellBoxes(self):
+        """(N, 4) array of the outlines' x0, y0, x1, y1 in image pixels."""
+        return self._boxes
+
+    def selectedCell(self):
+        return self._selected
+
+    def setSelectedCell(self, index):
+        if index != self._selected:
+            previous, self._selected = self._selected, index
+            self._update_cell(previous)
+            self._update_cell(index)
+
+    # ---- geometry ----------------------------------------------------------
+
+    def _scales(self):
+        if self._image_size.isEmpty():
+            return 0.0, 0.0
+        return self.width() / self._image_size.width(), self.height() / self._image_size.height()
+
+    @staticmethod
+    def _level(scale):
+        """Zoom level: 0 at full detail (scale >= 1), -1 below 1, -2 below 1/2, ..."""
+        return 0 if scale >= 1.0 else max(-8, math.floor(math.log2(scale)))
+
+    def _path(self, level, chunk):
+        key = (level,) + chunk
+        path = self._paths.get(key)
+        if path is not None:
+            self._paths.move_to_end(key)
+            return path
+        # image pixels between the points kept at this level
+        spacing = POINT_SPACING / 2.0 ** (level + 1) if level < 0 else 1.0
+        path = QPainterPath()
+        for item in self._chunks[chunk]:
+            contour = self._contours[item]
+            step = max(1, min(int(spacing), len(contour) // MIN_POINTS))
+            path.addPolygon(QPolygonF([QPointF(x, y) for x, y in contour[::step].tolist()]))
+            path.closeSubpath()
+        self._paths[key] = path
+        while len(self._paths) > MAX_CACHED_PATHS:
+            self._paths.popitem(last=False)
+        return path
+
+    def _cell_path(self, index):
+        path = QPainterPath()
+        path.addPolygon(QPolygonF([QPointF(x, y) for x, y in self._contours[index].tolist()]))
+        path.closeSubpath()
+        return path
+
+    def _update_cell(self, index):
+        """Repaints only the widget area of one outline."""
+        sx, sy = self._scales()
+        if index < 0 or index >= len(self._contours) or not sx:
+            return
+        x0, y0, x1, y1 = self._boxes[index]
+        self.update(QRect(int(x0 * sx) - 3, int(y0 * sy) - 3, int((x1 - x0) * sx) + 7, int((y1 - y0) * sy) + 7))
+
+    # ---- painting and hit testing -------------------------------------------
+
+    def paintEvent(self, event):
+        sx, sy = self._scales()
+        if not self._contours or not sx or not sy:
+            return
+        level = self._level(min(sx, sy))
+        exposed = event.rect()
+        # outlines belong to the chunk of their centre, so look one outline size further
+        x0 = (exposed.left() / sx - self._max_extent) // CHUNK_SIZE
+        x1 = (exposed.right() / sx + self._max_extent) // CHUNK_SIZE
+        y0 = (exposed.top() / sy - self._max_extent) // CHUNK_SIZE
+        y1 = (exposed.bottom() / sy + self._max_extent) // CHUNK_SIZE
+        with tracing.span("overlay paint", level=level) as span:
+            painter = QPainter(self)
+            painter.scale(sx, sy)
+            pen = QPen(OUTLINE_COLOR)
+            pen.setCosmetic(True)
+            painter.setPen(pen)
+            painter.setBrush(Qt.NoBrush)
+            drawn = 0
+            for cy in range(int(y0), int(y1) + 1):
+                for cx in range(int(x0), int(x1) + 1):
+                    if (cx, cy) in self._chunks:
+                        painter.drawPath(self._path(level, (cx, cy)))
+                        drawn += 1
+            for index, color in ((self._hovered, HOVER_COLOR), (self._selected, SELECTED_COLOR)):
+                if 0 <= index < len(self._contours):
+                    pen = QPen(color, 2)
+                    pen.setCosmetic(True)
+                    painter.setPen(pen)
+                    painter.drawPath(self._cell_path(index))
+            painter.end()
+            span.set(chunks=drawn)
+
+    def cellAt(self, pos):
+        """Index of the outline under a widget position, or -1. Smallest cell wins."""
+        sx, sy = self._scales()
+        if self._index is None or not sx or not sy:
+            return -1
+        x, y = pos.x() / sx, pos.y() / sy
+        hits = [item for item in self._index.query_point(x, y) if point_in_polygon(x, y, self._contours[item])]
+        if not hits:
+            return -1
+        return min(hits, key=lambda item: polygon_area(self._contours[item]))
+
+    def mouseMoveEvent(self, event):
+        index = self.cellAt(event.position())
+        if index != self._hovered:
+            previous, self._hovered = self._hovered, index
+            self._update_cell(previous)
+            self._update_cell(index)
+            self.cellHovered.emit(index)
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        if self._hovered != -1:
+            previous, self._hovered = self._hovered, -1
+            self._update_cell(previous)
+            self.cellHovered.emit(-1)
+        super().leaveEvent(event)
+
+    def mousePressEvent(self, event):
+        index = self.cellAt(event.position()) if event.button() == Qt.LeftButton else -1
+        if index < 0:
+            # let the image widget below handle clicks outside cells
+            event.ignore()
+            return
+        self.setSelectedCell(index)
+        self.cellClicked.emit(index)
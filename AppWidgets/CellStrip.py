@@ -0,0 +1,194 @@
+import numpy as np
+from PySide6.QtWidgets import QAbstractScrollArea
+from PySide6.QtGui import QPainter, QPen, QColor, QImage
+from PySide6.QtCore import Qt, QRect, QRectF, QSize, QTimer, Signal
+
+from AppModules import tracing
+
+SPACING = 4
+# crops show this much of the surroundings around the cell, relative to its size
+CROP_MARGIN = 0.25
+SELECTED_COLOR = QColor(235, 0, 0)
+EMPTY_COLOR = QColor(225, 225, 225)
+# feedCells() hands this many cells to the strip per event loop turn
+FEED_BATCH = 64
+
+
+class CellStrip(QAbstractScrollArea):
+    """
+    Horizontally scrolling strip with one square crop per cell.
+
+    All crops come from one decoded image (setSource): paintEvent draws the
+    source rectangle of each visible cell straight into its slot, so there is
+    no per-crop decode or copy and the cost of a repaint depends on the width
+    of the strip, not on the number of cells. Cells can be added in batches
+    with addCells() while they are being found, or queued with feedCells(),
+    which adds them a batch per event loop turn; the strip grows as they come.
+    """
+    cellClicked = Signal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setFrameShape(QAbstractScrollArea.NoFrame)
+        self._image = QImage()
+        self._scale = (1.0, 1.0)  # source pixels -> image pixels
+        self._boxes = np.empty((0, 4))  # (x0, y0, x1, y1) per cell, in source pixels
+        self._selected = -1
+        self._pending = []
+        self._feed_timer = QTimer(self)
+        self._feed_timer.setInterval(0)
+        self._feed_timer.timeout.connect(self._feed)
+
+    # ---- data --------------------------------------------------------------
+
+    def setSource(self, image, source_size=None):
+        """
+        Crops are cut from `image`. If it was decoded smaller than the source
+        the boxes refer to, pass the source size (QSize) to map them.
+        """
+        self._image = image
+        if source_size is not None and not source_size.isEmpty() and not image.isNull():
+            self._scale = (image.width() / source_size.width(), image.height() / source_size.height())
+        else:
+            self._scale = (1.0, 1.0)
+        self.clearCells()
+
+    def clearCells(self):
+        self._feed_timer.stop()
+        self._pending = []
+        self._boxes = np.empty((0, 4))
+        self._selected = -1
+        self.horizontalScrollBar().setValue(0)
+        self._update_range()
+        self.viewport().update()
+
+    def addCells(self, boxes):
+        """Appends cells given as a (N, 4) array of x0, y0, x1, y1 in source pixels."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if not len(boxes):
+            return
+        first = len(self._boxes)
+        self._boxes = np.vstack([self._boxes, boxes])
+        self._update_range()
+        # only the slots of the new cells can have changed
+        self.viewport().update(self._slot_rect(first).united(self._slot_rect(len(self._boxes) - 1)))
+
+    def feedCells(self, boxes):
+        """Queues cells for addCells(), FEED_BATCH at a time, without blocking the caller."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self._pending.extend(np.array_split(boxes, max(1, -(-len(boxes) // FEED_BATCH))))
+        self._feed_timer.start()
+
+    def _feed(self):
+        if self._pending:
+            self.addCells(self._pending.pop(0))
+        if not self._pending:
+            self._feed_timer.stop()
+
+    def pendingCells(self):
+        return sum(len(boxes) for boxes in self._pending)
+
+    def cellCount(self):
+        return len(self._boxes)
+
+    def selectedCell(self):
+        return self._selected
+
+    def setSelectedCell(self, index):
+        """Highlights a cell and scrolls it into view."""
+        if index == self._selected:
+            return
+        previous, self._selected = self._selected, index
+        if 0 <= index < len(self._boxes):
+            rect = self._slot_rect(index)
+            bar = self.horizontalScrollBar()
+            if rect.left() < 0:
+                bar.setValue(bar.value() + rect.left() - SPACING)
+            elif rect.right() > self.viewport().width():
+                bar.setValue(bar.value() + rect.right() - self.viewport().width() + SPACING)
+        for cell in (previous, index):
+            if cell >= 0:
+                self.viewport().update(self._slot_rect(cell).adjusted(-2, -2, 2, 2))
+
+    # ---- geometry ----------------------------------------------------------
+
+    def _slot(self):
+        return max(1, self.viewport().height() - 2 * SPACING)
+
+    def _slot_rect(self, index):
+        """Viewport rectangle of a cell's slot."""
+        step = self._slot() + SPACING
+        x = SPACING + index * step - self.horizontalScrollBar().value()
+        return QRect(x, SPACING, self._slot(), self._slot())
+
+    def _update_range(self):
+        total = SPACING + len(self._boxes) * (self._slot() + SPACING)
+        bar = self.horizontalScrollBar()
+        bar.setRange(0, max(0, total - self.viewport().width()))
+        bar.setPageStep(self.viewport().width())
+        bar.setSingleStep(self._slot() + SPACING)
+
+    def _source_rect(self, index):
+        """The square part of the image a cell's crop shows."""
+        x0, y0, x1, y1 = self._boxes[index]
+        sx, sy = self._scale
+        side = max((x1 - x0) * sx, (y1 - y0) * sy) * (1 + 2 * CROP_MARGIN) + 2
+        cx, cy = (x0 + x1) / 2 * sx, (y0 + y1) / 2 * sy
+        return QRectF(cx - side / 2, cy - side / 2, side, side)
+
+    def cellAt(self, pos):
+        step = self._slot() + SPACING
+        index = int((pos.x() + self.horizontalScrollBar().value() - SPACING) // step)
+        if 0 <= index < len(self._boxes) and self._slot_rect(index).contains(pos.toPoint()):
+            return index
+        return -1
+
+    # ---- events ------------------------------------------------------------
+
+    def paintEvent(self, event):
+        exposed = event.rect()
+        step = self._slot() + SPACING
+        offset = self.horizontalScrollBar().value()
+        first = max(0, (exposed.left() + offset - SPACING) // step)
+        last = min(len(self._boxes) - 1, (exposed.right() + offset) // step)
+        with tracing.span("cell strip paint", crops=max(0, last - first + 1)):
+            painter = QPainter(self.viewport())
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            for index in range(first, last + 1):
+                target = self._slot_rect(index)
+                if self._image.isNull():
+                    painter.fillRect(target, EMPTY_COLOR)
+                else:
+                    painter.fillRect(target, Qt.black)
+                    painter.drawImage(QRectF(target), self._image, self._source_rect(index))
+                if index == self._selected:
+                    painter.setPen(QPen(SELECTED_COLOR, 2))
+                    painter.drawRect(target.adjusted(-1, -1, 1, 1))
+            painter.end()
+
+    def scrollContentsBy(self, dx, dy):
+        # move what is already painted, only the uncovered slots are drawn again
+        self.viewport().scroll(dx, 0)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_range()
+
+    def wheelEvent(self, event):
+        # the strip only scrolls sideways, so the ordinary wheel does that
+        delta = event.angleDelta()
+        steps = delta.x() if abs(delta.x()) > abs(delta.y()) else delta.y()
+        bar = self.horizontalScrollBar()
+        bar.setValue(bar.value() - steps * bar.singleStep() // 120)
+        event.accept()
+
+    def mousePressEvent(self, event):
+        index = self.cellAt(event.position()) if event.button() == Qt.LeftButton else -1
+        if index >= 0:
+            self.setSelectedCell(index)
+            self.cellClicked.emit(index)
+
+    def sizeHint(self):
+        return QSize(400, 50)
@@ -1,55 +1,154 @@
 import sys
-from PySide6.QtWidgets import (QApplication,QMainWindow, QWidget, QGridLayout, QLabel)
-from PySide6.QtGui import QPixmap, Qt
+from PySide6.QtWidgets import (QApplication,QMainWindow, QWidget, QGridLayout, QLabel, QStackedWidget)
+from PySide6.QtGui import QPixmap, QColor, Qt
 from PySide6.QtCore import Signal
 from PySide6.QtCore import QSize
 
+from AppModules import tracing
+from AppModules.classificationLoader import ClassificationLoader
+from AppModules.thumbnailLoader import ThumbnailLoader
 from AppWidgets.MiniWidgets import ClickableLabel
+from AppWidgets.PatchGridView import PatchGridView
 from AppWidgets.ImageViewer import ImageViewer
 from assets.widgetStyles import highlight_image_label
 
 
+THUMBNAIL_SIZE = QSize(100,100)
+GRID_ROWS = 4
+GRID_COLUMNS = 4
+
+
+def placeholder_pixmap(size=THUMBNAIL_SIZE):
+    pixmap = QPixmap(size)
+    pixmap.fill(QColor(225,225,225))
+    return pixmap
+
+
 class ImageGridWindow(QMainWindow):
     patch_clicked = Signal(str)
+    patch_scored = Signal(str, float, bool)  # path, score, highlighted
 
-    def __init__(self, image_paths):
+    def __init__(self, image_paths, virtualized=None):
         super().__init__()
         self.setWindowTitle("Image Grid")
+        self._labels = []
+        self._paths = []
+        self._highlight_style = highlight_image_label(color="rgb(235,0,0)")
+        self._virtualized = virtualized
+        self.grid_view = None
+        self._grid_widget = None
 
+        # thumbnails are decoded on worker threads and filled in as they arrive
+        self._loader = ThumbnailLoader(THUMBNAIL_SIZE, self)
+        self._loader.thumbnailReady.connect(self._set_thumbnail)
+        # patches are scored in batches in worker processes; highlights
+        # follow as each batch comes back
+        self._classifier = ClassificationLoader(parent=self)
+        self._classifier.patchScored.connect(self._set_prediction)
+        self._classifier.finished.connect(self._classification_finished)
+
+        # both layouts are built on first use and then kept, so switching
+        # plates only rebinds paths and pixmaps
+        self._stack = QStackedWidget()
+        self.setCentralWidget(self._stack)
+        self.setImagePaths(image_paths)
+
+    def _build_fixed_grid(self):
         central_widget = QWidget()
         grid_layout = QGridLayout(central_widget)
         central_widget.setStyleSheet("background-color:rgb(255,255,255);")
+        for index in range(GRID_ROWS * GRID_COLUMNS):
+            row, col = divmod(index, GRID_COLUMNS)
+            image_label = ClickableLabel(self)
+            image_label.setGeometry(0,0,150,150) ##XYWH
+            image_label.setAlignment(Qt.AlignCenter)
+            # the label stays bound to its grid slot, the path is looked up on click
+            image_label.widgetClicked.connect(lambda index=index: self._label_clicked(index))
+            grid_layout.addWidget(image_label, row, col)
+            self._labels.append(image_label)
+        central_widget.setLayout(grid_layout)
+        self._placeholder = placeholder_pixmap()
+        self._grid_widget = central_widget
+        self._stack.addWidget(central_widget)
+
+    def _build_grid_view(self):
+        # anything but a 4x4 plate goes into the scrolling, model-backed grid
+        self.grid_view = PatchGridView((), THUMBNAIL_SIZE)
+        self.grid_view.patch_clicked.connect(self.image_clicked)
+        self._stack.addWidget(self.grid_view)
 
-        if len(image_paths) != 16:
-            print("Warning: Expected 16 image paths for a 4x4 grid.")
+    def setImagePaths(self, image_paths):
+        """Shows another set of patches, reusing the existing labels or view."""
+        self._paths = list(image_paths)
+        virtualized = self._virtualized
+        if virtualized is None:
+            virtualized = len(self._paths) != GRID_ROWS * GRID_COLUMNS
+        with tracing.span("grid build", patches=len(self._paths), virtualized=virtualized):
+            self._bind_paths(virtualized)
+
+    def _bind_paths(self, virtualized):
+        self._loader.cancel()
+        if virtualized:
+            if self.grid_view is None:
+                self._build_grid_view()
+            self.grid_view.setImagePaths(self._paths)
+            self._stack.setCurrentWidget(self.grid_view)
+            self._classifier.classify(self._paths)
+            return
+
+        if self.grid_view is not None:
+            # drop the old model rows so their thumbnails are not kept alive
+            self.grid_view.setImagePaths([])
+        if self._grid_widget is None:
+            self._build_fixed_grid()
+        in_memory = []
+        for index, image_label in enumerate(self._labels):
+            image_label.setStyleSheet("")
+            if index >= len(self._paths):
+                image_label.clear()
+                continue
+            cached = self._loader.cached(self._paths[index])
+            if cached is not None:
+                image_label.setPixmap(QPixmap.fromImage(cached))
+                in_memory.append(index)
+            else:
+                image_label.setPixmap(self._placeholder)
+        self._stack.setCurrentWidget(self._grid_widget)
+        self._loader.load(self._paths[:len(self._labels)], skip=in_memory)
+        self._classifier.classify(self._paths[:len(self._labels)])
+
+    def imagePaths(self):
+        return list(self._paths)
+
+    def _set_thumbnail(self, index, image):
+        if index < len(self._labels) and not image.isNull():
+            self._labels[index].setPixmap(QPixmap.fromImage(image))
+
+    def _set_prediction(self, path, score, highlighted):
+        if self._stack.currentWidget() is self.grid_view:
+            self.grid_view.setHighlighted(path, highlighted)
         else:
-            row = 0
-            col = 0
-            for image_path in image_paths:
-                print(image_path)
-                image_label = ClickableLabel(self)
-                image_label.setGeometry(0,0,150,150) ##XYWH
-
-                pixmap = QPixmap(image_path)
-                res = QSize(100,100) # Resize to 100x100 pixels
-                pixmap = pixmap.scaled(res, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                image_label.setPixmap(pixmap)
-                image_label.setAlignment(Qt.AlignCenter)
-                needed_style= highlight_image_label(color="rgb(235,0,0)")
-                if (row+col)%10 ==0:  ## THIS SECTION HAS TO BE CHANGED TO PREDICTION BASED
-                    image_label.setStyleSheet(needed_style)
-                # update lambda to map the path to this image click
-                image_label.widgetClicked.connect(lambda path=image_path: (self.image_clicked(path), print(f"Image clicked: {path}")))
-
-                grid_layout.addWidget(image_label, row, col)
-
-                col += 1
-                if col == 4:
-                    col = 0
-                    row += 1
+            for index, image_path in enumerate(self._paths[:len(self._labels)]):
+                if image_path == path:
+                    self._labels[index].setStyleSheet(self._highlight_style if highlighted else "")
+        self.patch_scored.emit(path, score, highlighted)
 
-        central_widget.setLayout(grid_layout)
-        self.setCentralWidget(central_widget)
+    def _classification_finished(self, stats):
+        if stats["patches"]:
+            tracing.counter("classifier", patches_per_second=stats["patches_per_second"],
+                            patches_per_second_per_core=stats["patches_per_second_per_core"],
+                            cache_hits=stats["cache_hits"])
+
+    def _label_clicked(self, index):
+        if index < len(self._paths):
+            path = self._paths[index]
+            tracing.instant("patch clicked", path=path)
+            self.image_clicked(path)
+
+    def closeEvent(self, event):
+        self._loader.cancel()
+        self._classifier.cancel()
+        super().closeEvent(event)
     
     def image_clicked(self, image_path):
         self.patch_clicked.emit(image_path)
@@ -3,7 +3,12 @@ from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, Q
 from PySide6.QtGui import (QColorSpace, QGuiApplication,
                            QImageReader, QImageWriter, QKeySequence,
                            QPalette, QPainter, QPixmap)
-from PySide6.QtCore import QDir, QStandardPaths, Qt, Slot, Signal, QFile
+from PySide6.QtCore import QDir, QStandardPaths, Qt, Slot, Signal, QFile, QTimer
+
+from AppModules.imageService import get_image_service, display_size
+
+# A resize only triggers a sharper decode once the label outgrows the image by this much
+REDECODE_GROWTH = 1.25
 
 
 class ImageViewer(QMainWindow):
@@ -20,13 +25,41 @@ class ImageViewer(QMainWindow):
         self.image_label.setScaledContents(True)  # Important: allows QLabel to scale the image
 
         self.layout.addWidget(self.image_label)
+        self._image_path = None
+        self._requested_size = None
+        # the image is only ever shown fitted into the label, so it is decoded
+        # at the label's size and decoded again when the label grows
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(100)
+        self._resize_timer.timeout.connect(self._redecode_if_needed)
     
     @Slot()
     def setImage(self, img_path):
-        pix = QPixmap(img_path)
-        if not pix.isNull():
-            self.image_label.setPixmap(pix)
+        self._image_path = img_path
+        self._requested_size = display_size(self.image_label)
+        image = get_image_service().image(img_path, self._requested_size)
+        if not image.isNull():
+            self.image_label.setPixmap(QPixmap.fromImage(image))
             self.image_label.adjustSize()
         else:
             QMessageBox.warning(self, "Image Load Error", f"Could not load image from {img_path}")
+
+    def _redecode_if_needed(self):
+        if self._image_path is None or self._requested_size is None:
+            return
+        needed = display_size(self.image_label)
+        pixmap = self.image_label.pixmap()
+        # a source smaller than the last request cannot get any sharper
+        limited = pixmap.width() >= self._requested_size.width() or pixmap.height() >= self._requested_size.height()
+        if limited and (needed.width() > self._requested_size.width() * REDECODE_GROWTH
+                        or needed.height() > self._requested_size.height() * REDECODE_GROWTH):
+            self._requested_size = needed
+            image = get_image_service().image(self._image_path, needed)
+            if not image.isNull():
+                self.image_label.setPixmap(QPixmap.fromImage(image))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._resize_timer.start()
         
\ No newline at end of file
@@ -1,25 +1,74 @@
 import sys
+import time
+from collections import OrderedDict, deque
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
     QToolBar, QScrollArea, QLabel, QSizePolicy
 )
-from PySide6.QtGui import QPixmap, QAction, Qt, QPalette, QColor, QPainter, QFont
-from PySide6.QtCore import QSize, QRectF
+from PySide6.QtGui import QImage, QPixmap, QAction, Qt, QPalette, QColor, QPainter, QFont
+from PySide6.QtCore import QSize, QRectF, QTimer
+
+from AppModules import tracing
+from AppModules.imageIO import source_size
+from AppModules.imageService import get_image_service, display_size
+from AppWidgets.TiledImageCanvas import TiledImageCanvas
+from AppWidgets.CellOverlay import CellOverlay
+
+# Images with at least this many pixels are shown through the tile pyramid
+DEEP_ZOOM_MIN_PIXELS = 4_000_000
+# Interactive renders are coalesced to at most one per frame
+FRAME_INTERVAL_MS = 16
+# The smooth pass runs once zooming/resizing has been idle this long
+SMOOTH_RENDER_DELAY_MS = 200
+# Smooth renders of this many recent zoom levels are kept
+ZOOM_CACHE_SIZE = 4
 
 class ImageViewerWidget(QWidget):
     """
     A custom PySide6 widget for viewing images with zoom and fit-to-window functionality.
+
+    Large images are rendered in deep-zoom mode: instead of rescaling the
+    whole pixmap on every zoom step, a TiledImageCanvas paints only the
+    visible tiles of a resolution pyramid. deep_zoom=None picks the mode per
+    image from DEEP_ZOOM_MIN_PIXELS, True/False forces it.
+
+    Other images are first decoded at the size of the viewport, which is all
+    fit-to-window needs; the full resolution is only decoded (through the
+    shared ImageService) once a zoom asks for more pixels than that.
+
+    Zoom steps and resize events are rendered in two passes: bursts are
+    coalesced into one fast (unfiltered) render per frame, and a single smooth
+    render follows once the interaction has been idle. frame_stats() reports
+    how long the renders took.
+
+    setCellContours() draws cell outlines over the image in either mode
+    (see CellOverlay); the overlay follows zoom and scrolling by itself.
     """
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, deep_zoom=None):
         super().__init__(parent)
+        self._deep_zoom_setting = deep_zoom
+        self._deep_zoom = False
         self.setWindowTitle("Image Viewer")
         self._image_path = None
-        self._original_pixmap = QPixmap()
+        self._source_image = QImage()  # shared with the ImageService, not copied
+        self._source_is_full = False
+        self._full_size = QSize()
         self._current_pixmap = QPixmap()
         self._scale_factor = 1.0
         self._zoom_step = 0.1  # How much to zoom in/out each step
         self._min_scale_factor = 0.1
         self._max_scale_factor = 5.0
+        self._zoom_cache = OrderedDict()  # scale factor -> smoothly scaled QPixmap
+        self._frame_times = deque(maxlen=240)  # ms per render
+
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.setInterval(FRAME_INTERVAL_MS)
+        self._render_timer.timeout.connect(lambda: self._update_image_display(smooth=False))
+        self._smooth_timer = QTimer(self)
+        self._smooth_timer.setSingleShot(True)
+        self._smooth_timer.setInterval(SMOOTH_RENDER_DELAY_MS)
+        self._smooth_timer.timeout.connect(self._update_image_display)
 
         self._init_ui()
 
@@ -78,6 +127,10 @@ class ImageViewerWidget(QWidget):
         self.image_label.setAutoFillBackground(True) # Enable auto-fill for background
 
 
+        self.canvas = TiledImageCanvas()
+        # cell outlines sit on whichever widget shows the image
+        self.overlay = CellOverlay(self.image_label)
+
         self.scroll_area.setWidget(self.image_label)
         main_layout.addWidget(self.scroll_area)
 
@@ -88,13 +141,35 @@ class ImageViewerWidget(QWidget):
         Loads an image from the specified path into the viewer.
 
         Args:
-            image_path (str): The file path to the image.
+            image_path (str): The file path to the image or a patch pack reference.
         """
         self._image_path = image_path
-        self._original_pixmap = QPixmap(image_path)
-
-        if self._original_pixmap.isNull():
-            print(f"Error: Could not load image from {image_path}")
+        self._zoom_cache.clear()
+        self.overlay.clear()
+        service = get_image_service()
+        # the header is enough to pick the mode, nothing is decoded yet
+        full_size = source_size(image_path)
+        self._deep_zoom = full_size.isValid() and (
+            self._deep_zoom_setting if self._deep_zoom_setting is not None
+            else full_size.width() * full_size.height() >= DEEP_ZOOM_MIN_PIXELS)
+
+        if self._deep_zoom:
+            image = service.image(image_path)
+            self._source_image = QImage()
+            self.canvas.setImage(image)
+            self._set_display_widget(self.canvas)
+        else:
+            viewport = display_size(self.scroll_area.viewport())
+            image = service.image(image_path, viewport) if full_size.isValid() else QImage()
+            self._source_image = image
+            self._source_is_full = image.size() == full_size
+            self.canvas.clear()
+            self._set_display_widget(self.image_label)
+        self._full_size = full_size if not image.isNull() else QSize()
+
+        if image.isNull():
+            print(f"Error: Could not load image from {image_path}", file=sys.stderr)
+            tracing.instant("image load failed", path=image_path)
             self.image_label.setText("Failed to load image.")
             self.image_label.setAlignment(Qt.AlignCenter)
             self._current_pixmap = QPixmap() # Clear current pixmap
@@ -106,19 +181,77 @@ class ImageViewerWidget(QWidget):
             self.fit_to_window() # Fit the new image to the window initially
             self._update_actions_state(True)
 
-    def _update_image_display(self):
+    def _set_display_widget(self, widget):
+        """Puts either the label or the tile canvas into the scroll area."""
+        if self.scroll_area.widget() is not widget:
+            self.scroll_area.takeWidget() # take, so the scroll area does not delete it
+            self.scroll_area.setWidget(widget)
+            self.overlay.setTarget(widget)
+
+    def setCellContours(self, contours, image_size=None):
+        """
+        Draws cell outlines ((K, 2) x, y arrays in source pixels) over the
+        current image. image_size defaults to the size of the loaded source.
+        """
+        self.overlay.setContours(contours, image_size if image_size is not None else self._image_size())
+
+    def _has_image(self):
+        return not self.canvas.isNull() if self._deep_zoom else not self._source_image.isNull()
+
+    def _image_size(self):
+        return self.canvas.imageSize() if self._deep_zoom else self._full_size
+
+    def _schedule_render(self):
+        """
+        Requests an interactive render. Bursts of requests within one frame
+        collapse into a single fast render; the smooth pass is pushed back
+        until the requests stop.
+        """
+        if not self._render_timer.isActive():
+            self._render_timer.start()
+        self._smooth_timer.start()
+
+    def _update_image_display(self, smooth=True):
         """
         Scales the original pixmap by the current scale factor and updates the QLabel.
+        In deep-zoom mode only the canvas scale changes; tiles are painted on demand.
+        With smooth=False a fast, unfiltered scale is used unless a smooth render
+        of this zoom level is cached.
         """
-        if not self._original_pixmap.isNull():
-            # Calculate the new size based on the original size and scale factor
-            new_width = int(self._original_pixmap.width() * self._scale_factor)
-            new_height = int(self._original_pixmap.height() * self._scale_factor)
-
-            # Scale the pixmap while maintaining aspect ratio
-            self._current_pixmap = self._original_pixmap.scaled(
-                new_width, new_height, Qt.KeepAspectRatio, Qt.SmoothTransformation
-            )
+        start = time.perf_counter()
+        if smooth:
+            self._render_timer.stop()
+            self._smooth_timer.stop()
+        if self._deep_zoom:
+            self.canvas.smooth = smooth
+            self.canvas.setScale(self._scale_factor)
+        elif not self._source_image.isNull():
+            key = round(self._scale_factor, 4)
+            pixmap = self._zoom_cache.get(key)
+            if pixmap is not None:
+                self._zoom_cache.move_to_end(key)
+            else:
+                # Calculate the new size based on the full image size and scale factor
+                new_width = int(self._full_size.width() * self._scale_factor)
+                new_height = int(self._full_size.height() * self._scale_factor)
+                if smooth and not self._source_is_full and (new_width > self._source_image.width()
+                                                            or new_height > self._source_image.height()):
+                    # zoomed past the display-resolution decode; fast renders
+                    # make do with it, the smooth pass gets the real pixels
+                    self._source_image = get_image_service().image(self._image_path)
+                    self._source_is_full = True
+
+                # Scale the image while maintaining aspect ratio
+                with tracing.span("scale", width=new_width, height=new_height, smooth=smooth):
+                    pixmap = QPixmap.fromImage(self._source_image.scaled(
+                        new_width, new_height, Qt.KeepAspectRatio,
+                        Qt.SmoothTransformation if smooth else Qt.FastTransformation
+                    ))
+                if smooth:
+                    self._zoom_cache[key] = pixmap
+                    while len(self._zoom_cache) > ZOOM_CACHE_SIZE:
+                        self._zoom_cache.popitem(last=False)
+            self._current_pixmap = pixmap
             self.image_label.setPixmap(self._current_pixmap)
             # Set fixed size for the label so the scroll area can manage scrolling
             self.image_label.setFixedSize(self._current_pixmap.size())
@@ -126,12 +259,27 @@ class ImageViewerWidget(QWidget):
             self.image_label.clear()
             self.image_label.setFixedSize(0, 0) # Collapse label if no image
 
-        self._update_actions_state(not self._original_pixmap.isNull())
+        self._update_actions_state(self._has_image())
+        elapsed = time.perf_counter() - start
+        self._frame_times.append(elapsed * 1000.0)
+        tracing.complete("viewer render", start, elapsed, smooth=smooth, deep_zoom=self._deep_zoom)
+
+    def frame_stats(self):
+        """Render times in ms over the last renders: count, mean, p95 and max."""
+        times = sorted(self._frame_times)
+        if not times:
+            return {"count": 0, "mean_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": len(times),
+            "mean_ms": sum(times) / len(times),
+            "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+            "max_ms": times[-1],
+        }
 
 
     def zoom_in(self):
         """Zooms in on the image."""
-        if self._original_pixmap.isNull():
+        if not self._has_image():
             return
 
         new_scale = self._scale_factor + self._zoom_step
@@ -140,11 +288,11 @@ class ImageViewerWidget(QWidget):
 
         if new_scale != self._scale_factor:
             self._scale_factor = new_scale
-            self._update_image_display()
+            self._schedule_render()
 
     def zoom_out(self):
         """Zooms out from the image."""
-        if self._original_pixmap.isNull():
+        if not self._has_image():
             return
 
         new_scale = self._scale_factor - self._zoom_step
@@ -153,16 +301,16 @@ class ImageViewerWidget(QWidget):
 
         if new_scale != self._scale_factor:
             self._scale_factor = new_scale
-            self._update_image_display()
+            self._schedule_render()
 
     def fit_to_window(self):
         """Fits the image to the current size of the scroll area's viewport."""
-        if self._original_pixmap.isNull():
+        if not self._has_image():
             return
 
         # Get the current size of the scroll area's viewport
         viewport_size = self.scroll_area.viewport().size()
-        image_size = self._original_pixmap.size()
+        image_size = self._image_size()
 
         if image_size.isEmpty() or viewport_size.isEmpty():
             self._scale_factor = 1.0 # Default if sizes are invalid
@@ -194,7 +342,8 @@ class ImageViewerWidget(QWidget):
         # Otherwise, just ensure the scrollbars adjust to the new window size.
         # The QScrollArea handles scrollbar visibility automatically.
         # We just need to ensure the QLabel's size is correct.
-        self._update_image_display()
+        # Resize drags deliver many events; render them through the scheduler.
+        self._schedule_render()
 
 
     def _update_actions_state(self, enabled: bool):
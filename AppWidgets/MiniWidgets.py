@@ -15,6 +15,38 @@ def create_card_frame(color="rgb(235,235,235)"):
         frame.setStyleSheet("QFrame { border: 1px solid gray; background-color:"+color+" ; }") # Background for visibility
         return frame
 
+def create_combo_box(items, current=None):
+        """Helper to create a QComboBox with the app's dropdown styling."""
+        combo = QComboBox()
+        combo.addItems([str(i) for i in items])
+        if current is not None and combo.findText(str(current)) >= 0:
+            combo.setCurrentText(str(current))
+        combo.setStyleSheet("background-color:rgb(255,255,255);color:rgb(23,23,23)")
+        return combo
+
+def set_combo_items(combo, items, current=None):
+        """
+        Replaces the items of an existing QComboBox in place, keeping the
+        selection when it is still listed. Signals are blocked while the list
+        changes; currentTextChanged is emitted once afterwards if the
+        selected text ended up different.
+        """
+        items = [str(i) for i in items]
+        previous = combo.currentText()
+        if current is None and previous in items:
+            current = previous
+        if items != [combo.itemText(i) for i in range(combo.count())]:
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItems(items)
+            combo.blockSignals(False)
+        if current is not None and combo.findText(str(current)) >= 0:
+            combo.blockSignals(True)
+            combo.setCurrentText(str(current))
+            combo.blockSignals(False)
+        if combo.currentText() != previous:
+            combo.currentTextChanged.emit(combo.currentText())
+
 class ClickableLabel(QLabel):
     """
     A QLabel subclass that emits a clicked signal when clicked.
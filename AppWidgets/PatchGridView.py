@@ -0,0 +1,198 @@
+import sys
+from collections import OrderedDict
+
+from PySide6.QtWidgets import QApplication, QListView, QAbstractItemView, QStyledItemDelegate
+from PySide6.QtGui import QPixmap, QColor
+from PySide6.QtCore import (Qt, Signal, QSize, QTimer, QThreadPool,
+                            QAbstractListModel, QModelIndex)
+
+from AppModules.thumbnailLoader import ThumbnailLoader
+
+PathRole = Qt.UserRole + 1
+HIGHLIGHT_COLOR = QColor(235,0,0)
+
+
+class PatchListModel(QAbstractListModel):
+    """
+    List model over patch sources. Thumbnails are only requested when the
+    view asks for a row, i.e. when it becomes visible, and only a bounded
+    number of converted pixmaps is kept around.
+    """
+
+    def __init__(self, paths=(), thumbnail_size=QSize(100,100), pool=None, max_pixmaps=1024, parent=None):
+        super().__init__(parent)
+        self._paths = list(paths)
+        self._rows = None  # path -> row, built on first highlight
+        self._highlighted = set()  # rows
+        self._pixmaps = OrderedDict()  # row -> QPixmap
+        self._max_pixmaps = max_pixmaps
+        self._pending = set()
+        self._placeholder = QPixmap(thumbnail_size)
+        self._placeholder.fill(Qt.lightGray)
+        self._loader = ThumbnailLoader(thumbnail_size, self, pool=pool)
+        self._loader.thumbnailReady.connect(self._on_thumbnail)
+        self._loader.reset()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DecorationRole:
+            return self._pixmap(row)
+        if role in (Qt.ToolTipRole, PathRole):
+            return self._paths[row]
+        if role == Qt.BackgroundRole and row in self._highlighted:
+            return HIGHLIGHT_COLOR
+        return None
+
+    def path(self, row):
+        return self._paths[row]
+
+    def paths(self):
+        return list(self._paths)
+
+    def setPaths(self, paths):
+        self.beginResetModel()
+        self._paths = list(paths)
+        self._rows = None
+        self._highlighted.clear()
+        self._pixmaps.clear()
+        self._pending.clear()
+        self._loader.reset()
+        self.endResetModel()
+
+    def setHighlighted(self, path, highlighted):
+        if self._rows is None:
+            self._rows = {p: row for row, p in enumerate(self._paths)}
+        row = self._rows.get(path)
+        if row is None or (row in self._highlighted) == highlighted:
+            return
+        if highlighted:
+            self._highlighted.add(row)
+        else:
+            self._highlighted.discard(row)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.BackgroundRole])
+
+    def _pixmap(self, row):
+        pixmap = self._pixmaps.get(row)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(row)
+            return pixmap
+        if row in self._pending:
+            return self._placeholder
+        cached = self._loader.cached(self._paths[row])
+        if cached is not None:
+            return self._store(row, QPixmap.fromImage(cached))
+        self._pending.add(row)
+        self._loader.request(row, self._paths[row])
+        return self._placeholder
+
+    def _store(self, row, pixmap):
+        self._pixmaps[row] = pixmap
+        while len(self._pixmaps) > self._max_pixmaps:
+            self._pixmaps.popitem(last=False)
+        return pixmap
+
+    def _on_thumbnail(self, row, image):
+        self._pending.discard(row)
+        if row >= len(self._paths) or image.isNull():
+            return
+        self._store(row, QPixmap.fromImage(image))
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def restrictPending(self, rows):
+        """
+        Drops queued thumbnail work for rows that scrolled out of view; rows
+        still visible are queued again. Work already running is not touched.
+        """
+        self._loader.pool.clear()
+        still_wanted = self._pending & rows
+        self._pending = set()
+        for row in sorted(still_wanted):
+            self._pending.add(row)
+            self._loader.request(row, self._paths[row])
+
+
+class HighlightDelegate(QStyledItemDelegate):
+    """Fills the cell of highlighted patches before the default painting, like highlight_image_label."""
+
+    def paint(self, painter, option, index):
+        color = index.data(Qt.BackgroundRole)
+        if color is not None:
+            painter.fillRect(option.rect, color)
+        super().paint(painter, option, index)
+
+
+class PatchGridView(QListView):
+    """
+    Virtualized patch grid for hundreds to thousands of patches. Only the
+    visible cells are painted by the one shared item delegate, and
+    thumbnails are loaded as cells scroll into view.
+    """
+    patch_clicked = Signal(str)
+
+    def __init__(self, image_paths=(), thumbnail_size=QSize(100,100), parent=None):
+        super().__init__(parent)
+        # a private pool so scrolling can drop queued work without touching other loaders
+        self._pool = QThreadPool(self)
+        self._model = PatchListModel(image_paths, thumbnail_size, pool=self._pool, parent=self)
+        self.setModel(self._model)
+        self.setItemDelegate(HighlightDelegate(self))
+
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(256)
+        self.setIconSize(thumbnail_size)
+        self.setGridSize(thumbnail_size + QSize(8,8))
+        self.setSpacing(0)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setStyleSheet("background-color:rgb(255,255,255);")
+
+        self.clicked.connect(lambda index: self.patch_clicked.emit(self._model.path(index.row())))
+
+        self._scroll_timer = QTimer(self)
+        self._scroll_timer.setSingleShot(True)
+        self._scroll_timer.setInterval(50)
+        self._scroll_timer.timeout.connect(self._prune_offscreen)
+        self.verticalScrollBar().valueChanged.connect(self._scroll_timer.start)
+
+    def setImagePaths(self, image_paths):
+        self._model.setPaths(image_paths)
+        self.scrollToTop()
+
+    def setHighlighted(self, path, highlighted):
+        self._model.setHighlighted(path, highlighted)
+
+    def visibleRows(self):
+        viewport = self.viewport().rect()
+        first = self.indexAt(viewport.topLeft())
+        if not first.isValid():
+            return set()
+        last = self.indexAt(viewport.bottomRight())
+        last_row = last.row() if last.isValid() else self._model.rowCount() - 1
+        return set(range(first.row(), last_row + 1))
+
+    def _prune_offscreen(self):
+        self._model.restrictPending(self.visibleRows())
+
+
+# Example usage
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    image_paths = sys.argv[1:] or [f"image_{i}.png" for i in range(10000)]  # Mock paths for illustration
+    window = PatchGridView(image_paths)
+    window.patch_clicked.connect(print)
+    window.resize(600, 500)
+    window.show()
+    sys.exit(app.exec())
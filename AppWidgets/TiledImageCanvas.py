@@ -0,0 +1,113 @@
+import math
+from collections import OrderedDict
+
+from PySide6.QtWidgets import QWidget
+from PySide6.QtGui import QImage, QPainter, QPixmap
+from PySide6.QtCore import Qt, QRect, QRectF, QSize
+
+from AppModules import tracing
+
+
+class TiledImageCanvas(QWidget):
+    """
+    Paints a large image from a resolution pyramid of fixed-size tiles.
+
+    Level 0 is the full image, every further level halves it. Levels are
+    generated the first time they are needed and tiles are converted to
+    pixmaps lazily and kept in a bounded LRU. A paint only touches the tiles
+    of the nearest level that intersect the exposed area, so the cost of a
+    zoom or pan step does not depend on the image size or zoom factor.
+    """
+
+    def __init__(self, parent=None, tile_size=256, max_tiles=384):
+        super().__init__(parent)
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._levels = []
+        self._tiles = OrderedDict()  # (level, tx, ty) -> QPixmap
+        self._scale = 1.0
+        self.smooth = True
+        self.setAttribute(Qt.WA_OpaquePaintEvent, False)
+
+    def setImage(self, image: QImage):
+        self._levels = [image] if not image.isNull() else []
+        self._tiles.clear()
+        self.setScale(self._scale)
+
+    def clear(self):
+        self.setImage(QImage())
+
+    def imageSize(self):
+        return self._levels[0].size() if self._levels else QSize()
+
+    def isNull(self):
+        return not self._levels
+
+    def scale(self):
+        return self._scale
+
+    def setScale(self, scale):
+        self._scale = scale
+        if not self._levels:
+            self.setFixedSize(0, 0)
+        else:
+            size = self.imageSize()
+            self.setFixedSize(int(size.width() * scale), int(size.height() * scale))
+        self.update()
+
+    def maxLevel(self):
+        size = self.imageSize()
+        longest = max(size.width(), size.height(), 1)
+        return max(0, math.ceil(math.log2(longest / self.tile_size)))
+
+    def levelForScale(self, scale):
+        """The coarsest level that still has at least one source pixel per screen pixel."""
+        if scale >= 1.0:
+            return 0
+        return min(self.maxLevel(), int(math.floor(math.log2(1.0 / scale))))
+
+    def _level(self, level):
+        while len(self._levels) <= level:
+            previous = self._levels[-1]
+            with tracing.span("scale", level=len(self._levels)):
+                self._levels.append(previous.scaled(max(1, previous.width() // 2), max(1, previous.height() // 2),
+                                                    Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+        return self._levels[level]
+
+    def _tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+        source = self._level(level)
+        rect = QRect(tx * self.tile_size, ty * self.tile_size, self.tile_size, self.tile_size).intersected(source.rect())
+        pixmap = QPixmap.fromImage(source.copy(rect))
+        self._tiles[key] = pixmap
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+    def paintEvent(self, event):
+        if not self._levels:
+            return
+        level = self.levelForScale(self._scale)
+        source = self._level(level)
+        # size of one level pixel on screen
+        factor = self._scale * self.imageSize().width() / source.width()
+        step = self.tile_size * factor
+        exposed = event.rect()
+        first_x = max(0, int(exposed.left() // step))
+        first_y = max(0, int(exposed.top() // step))
+        last_x = min((source.width() - 1) // self.tile_size, int(exposed.right() // step))
+        last_y = min((source.height() - 1) // self.tile_size, int(exposed.bottom() // step))
+
+        with tracing.span("paint tiles", level=level, tiles=(last_x - first_x + 1) * (last_y - first_y + 1)):
+            painter = QPainter(self)
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, self.smooth)
+            for ty in range(first_y, last_y + 1):
+                for tx in range(first_x, last_x + 1):
+                    pixmap = self._tile(level, tx, ty)
+                    target = QRectF(tx * step, ty * step, pixmap.width() * factor, pixmap.height() * factor)
+                    painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+            painter.end()
@@ -3,33 +3,77 @@ from PySide6.QtWidgets import (
     QLabel, QPushButton, QComboBox, QFrame, QScrollArea,QSizePolicy
 )
 
-from PySide6.QtGui import QPixmap, QAction
+from PySide6.QtGui import QPixmap, QAction, QImage
 from PySide6.QtGui import   QCursor
-from PySide6.QtCore import Qt
-
-from AppModules.AppData import AppData
-from AppWidgets.ImageGrid import ImageGridWindow
+from PySide6.QtCore import Qt, QSize, QTimer
+
+from AppModules import tracing
+from AppModules.AppData import get_app_data
+from AppModules.catalogLoader import CatalogRefresher
+from AppModules.cellCountLoader import CellCountLoader, CellContourLoader
+from AppModules.imageService import get_image_service
+from AppModules.prefetch import PatchPrefetcher
+from AppModules.selectionController import SelectionController
+from AppModules.thumbnailLoader import ThumbnailLoader
+from AppWidgets.CellOverlay import CellOverlay
+from AppWidgets.CellStrip import CellStrip
+from AppWidgets.ImageGrid import ImageGridWindow, THUMBNAIL_SIZE, placeholder_pixmap
 from AppWidgets.ImageViewer import ImageViewer
-from AppWidgets.MiniWidgets import create_card_frame, create_combo_box
+from AppWidgets.MiniWidgets import create_card_frame, create_combo_box, set_combo_items, ClickableLabel
 
 
+GRID_COLUMNS = 4
+STRIP_THUMBNAIL_SIZE = QSize(50, 50)
+# The patch image is shown fitted into this size, so it is decoded at it
+PATCH_VIEW_SIZE = QSize(400, 400)
+# How many patches of the next well / measurement are decoded ahead of time
+PREFETCH_NEXT_SELECTION = 2
+# How often the dataset catalog is swept for new or changed directories
+CATALOG_REFRESH_MS = 30000
+# Highlighted patches shown in the strip above the patch image, best first
+STRIP_SLOTS = 6
 
 
 class Page2(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.appData = AppData()
+        self.appData = get_app_data()
+        # the mtime sweep runs on a worker thread; new plates and wells reach the dropdowns
+        self.catalog_refresher = CatalogRefresher(self.appData, parent=self)
+        self.catalog_refresher.catalogChanged.connect(self.catalogChanged)
+        self.catalog_timer = QTimer(self)
+        self.catalog_timer.timeout.connect(self.catalog_refresher.refresh)
+        self.catalog_timer.start(CATALOG_REFRESH_MS)
+        self.prefetcher = PatchPrefetcher(PATCH_VIEW_SIZE, parent=self)
+        # cells of the whole well are counted in one batched call off the GUI thread
+        self.cell_counter = CellCountLoader(parent=self)
+        self.cell_counter.countsReady.connect(self.setCellCounts)
+        self.cell_counts = {}  # normalized patch path -> count
+        # outlines of the selected patch are found in a worker process too
+        self.contour_loader = CellContourLoader(parent=self)
+        self.contour_loader.contoursReady.connect(self.setCellContours)
+        self.cell_areas = []
+        # dropdown changes are debounced and looked up off the GUI thread;
+        # applySelection() runs once per settled selection
+        self.selection = SelectionController(self.appData, parent=self)
+        self.selection.selectionReady.connect(self.applySelection)
+        self.patch_image = QImage()  # decoded once, shown in the viewer and cropped by the cell strip
+        self.plate_dropdown = None
+        self.well_dropdown = None
+        self.measurement_dropdown = None
+        self.patch_grid = None
         self.selected_plate = None
         self.selected_well = None
         self.selected_measurement = None
         self.selected_patch_path = None
         self.patch_path_list = []
+        self.patch_scores = {}  # path -> (score, highlighted)
         self.plateNames = self.appData.getPlateNames()
         total_recs = self.appData.getTotalRecords()
         self.dataset = self.appData.getDataByIndex(-1)
         if total_recs> 0:
-            self.setSelectedPlate(self.plateNames[0])
-        print("DEBUG::: Page2.__init__ ::: selected plate = {}".format(self.selected_plate))
+            self.selected_plate = self.plateNames[0]
+        tracing.instant("initial selection", plate=self.selected_plate)
         self.page_data = {
             "patch_name":"",
             "cell_count":0,
@@ -39,6 +83,8 @@ class Page2(QMainWindow):
         self.patchImage.setGeometry(0,0,400,400)
         # self.patchImage.setSizePolicy(QSizePolicy.Policy.Ignored,QSizePolicy.Policy.Ignored)
         self.patchImage.setScaledContents(True)
+        self.cellOverlay = CellOverlay(self.patchImage)
+        self.cellOverlay.cellClicked.connect(self.setSelectedCell)
         self.setWindowTitle("SCANN App/Page2")
 
         # Central widget to hold our main layout
@@ -73,19 +119,22 @@ class Page2(QMainWindow):
         dropdown_frame.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
 
         # Plates dropdown
-        plates_dropdown = create_combo_box(self.plateNames, self.selected_plate)
+        self.plate_dropdown = plates_dropdown = create_combo_box(self.plateNames, self.selected_plate)
         plates_dropdown.setPlaceholderText("Select Plate name")
         plates_dropdown.currentTextChanged.connect(self.setSelectedPlate)
         # Wells dropdown
         self.well_dropdown = create_combo_box(self.appData.getWellNames(self.selected_plate))
         self.well_dropdown.setPlaceholderText("Select Well Name")
-        self.setSelectedWell(self.well_dropdown.currentText())
+        self.selected_well = self.well_dropdown.currentText()
         self.well_dropdown.currentTextChanged.connect(self.setSelectedWell)
         # Measurement dropdown
-        measurement_dropdown = create_combo_box(["001", "002", "003", "004"], "001")
+        self.measurement_dropdown = measurement_dropdown = create_combo_box(["001", "002", "003", "004"], "001")
         measurement_dropdown.setPlaceholderText("Select Measurement")
-        self.setSelectedMeasurement(measurement_dropdown.currentText())
+        self.selected_measurement = measurement_dropdown.currentText()
         measurement_dropdown.currentTextChanged.connect(self.setSelectedMeasurement)
+        # the initial selection is looked up once, right away, so the grid is built with it
+        self.selection.setSelection(self.selected_plate, self.selected_well, self.selected_measurement)
+        self.patch_path_list = self.selection.resolve()["paths"]
 
         dropdown_layout.addWidget(plates_dropdown)
         dropdown_layout.addWidget(self.well_dropdown)
@@ -106,9 +155,13 @@ class Page2(QMainWindow):
         col1_layout.addStretch(1) # Push content to top
         
         if len(self.patch_path_list) > 0:
-            self.setSelectedPatchPath(self.patch_path_list[0])
-            self.patch_grid = ImageGridWindow(self.patch_path_list)
-            self.patch_grid.patch_clicked.connect(self.setSelectedPatchPath)
+            # decode the first full-size patch after the window has been shown
+            first_patch = self.patch_path_list[0]
+            QTimer.singleShot(0, lambda: self.selected_patch_path is None and self.setSelectedPatchPath(first_patch))
+        # built once; selection changes rebind it in place
+        self.patch_grid = ImageGridWindow(self.patch_path_list)
+        self.patch_grid.patch_clicked.connect(self.setSelectedPatchPath)
+        self.patch_grid.patch_scored.connect(self.setPatchScore)
         col1_layout.addWidget(self.patch_grid)
         col1_layout.addStretch(1)
 
@@ -116,10 +169,16 @@ class Page2(QMainWindow):
         col2_frame = create_card_frame(color="rgb(255,255,255)")
         col2_layout = QVBoxLayout(col2_frame)
         self.img_data = QFormLayout()
-        self.img_data.addRow(QLabel("Selected Patch: "), QLabel(self.page_data["patch_name"]))
-        self.img_data.addRow(QLabel("No. of Cells: "), QLabel(str(self.page_data["cell_count"])))
-        self.img_data.addRow(QLabel("No. of Cells: "), QLabel(str(self.page_data["cell_count"])))
+        self.patch_name_value = QLabel(self.page_data["patch_name"])
+        self.cell_count_value = QLabel(str(self.page_data["cell_count"]))
+        self.well_count_value = QLabel("")
+        self.selected_cell_value = QLabel("")
+        self.img_data.addRow(QLabel("Selected Patch: "), self.patch_name_value)
+        self.img_data.addRow(QLabel("No. of Cells: "), self.cell_count_value)
+        self.img_data.addRow(QLabel("Cells in Well: "), self.well_count_value)
+        self.img_data.addRow(QLabel("Selected Cell: "), self.selected_cell_value)
         col2_layout.addLayout(self.img_data)
+        self.cell_counter.count(self.patch_path_list)
         col2_layout.addStretch(1)
 
         # Column 3 (Rest of the width, 2 rows)
@@ -129,15 +188,35 @@ class Page2(QMainWindow):
         col3_layout.setSpacing(4) # Spacing between rows in col3
 
         # Column 3 - Row 1 (Thumbnails - 50px height)
-        ## @TODO: Update the code to reflect the model results.
+        # the highest scoring highlighted patches of the classifier, filled
+        # in by updatePredictionStrip() as scores arrive
         col3_row1_frame = create_card_frame(color="rgb(255,255,255)")
         col3_row1_layout = QHBoxLayout(col3_row1_frame)
-        col3_row1_layout.addWidget(self.updated_cellpicture())
-        col3_row1_layout.addWidget(self.updated_cellpicture())
+        self.strip_labels = []
+        self.strip_paths = []
+        # strip thumbnails are decoded on worker threads like the grid's
+        self.strip_loader = ThumbnailLoader(STRIP_THUMBNAIL_SIZE, self)
+        self.strip_loader.thumbnailReady.connect(self._set_strip_thumbnail)
+        self.strip_placeholder = placeholder_pixmap(STRIP_THUMBNAIL_SIZE)
+        for slot in range(STRIP_SLOTS):
+            img_label = self.updated_cellpicture()
+            img_label.widgetClicked.connect(lambda slot=slot: self._strip_clicked(slot))
+            col3_row1_layout.addWidget(img_label)
+            self.strip_labels.append(img_label)
         col3_row1_layout.addStretch(1)
+        # scores arrive per patch; redraw the strip at most every 100ms
+        self.strip_timer = QTimer(self)
+        self.strip_timer.setSingleShot(True)
+        self.strip_timer.setInterval(100)
+        self.strip_timer.timeout.connect(self.updatePredictionStrip)
         col3_row1_frame.setFixedHeight(50)
         col3_row1_frame.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
 
+        # Column 3 - Cell crops of the selected patch, one per detected cell
+        self.cellStrip = CellStrip()
+        self.cellStrip.setFixedHeight(64)
+        self.cellStrip.cellClicked.connect(self.setSelectedCell)
+
         # Column 3 - Row 2 (Takes the rest of the height)
         col3_row2_frame = create_card_frame(color="rgb(255,255,255)")
         col3_row2_layout = QVBoxLayout(col3_row2_frame)
@@ -145,7 +224,10 @@ class Page2(QMainWindow):
         col3_row2_layout.addStretch(1)
 
         col3_layout.addWidget(col3_row1_frame)
+        col3_layout.addWidget(self.cellStrip)
         col3_layout.addWidget(col3_row2_frame)
+        # the patch image is the first thing to change on screen after a selection
+        self.selection.watchPaint(self.patchImage)
 
 
         # Add columns to the main columns layout
@@ -168,40 +250,191 @@ class Page2(QMainWindow):
             return f"Patch-{_t.split('.')[0]}"
         return ""
     
+    # The dropdowns only feed the selection controller; the lookup and the
+    # refresh of grid, viewer and counts happen in applySelection()
+
     def setSelectedPlate(self, newval):
-        self.selected_plate = newval
-        self.well_dropdown = create_combo_box(self.appData.getWellNames(self.selected_plate))
-        self.patch_path_list = self.appData.getPatchImageFiles(self.selected_plate, self.selected_well, self.selected_measurement)
+        self.selection.setPlate(newval)
 
     def setSelectedWell(self, value):
-        self.selected_well = value
-        self.patch_path_list = self.appData.getPatchImageFiles(self.selected_plate, self.selected_well, self.selected_measurement)
+        self.selection.setWell(value)
 
     def setSelectedMeasurement(self, value):
-        self.selected_measurement = value
-        self.patch_path_list = self.appData.getPatchImageFiles(self.selected_plate, self.selected_well, self.selected_measurement)
+        self.selection.setMeasurement(value)
 
+    def catalogChanged(self):
+        """New, changed or removed plates: refreshes the plate list and looks the selection up again."""
+        self.plateNames = self.appData.getPlateNames()
+        # emits currentTextChanged -> setSelectedPlate if the selected plate is gone
+        set_combo_items(self.plate_dropdown, self.plateNames)
+        self.selection.reload()
+
+    @tracing.traced("apply selection")
+    def applySelection(self, result):
+        """Shows a settled selection: well list, grid, viewer and cell counts, each refreshed once."""
+        self.selected_plate = result["plate"]
+        self.selected_well = result["well"]
+        self.selected_measurement = result["measurement"]
+        # the well list follows the plate; it is already the selection, so no signal
+        self.well_dropdown.blockSignals(True)
+        set_combo_items(self.well_dropdown, result["wells"], current=result["well"])
+        self.well_dropdown.blockSignals(False)
+        paths = result["paths"]
+        if paths == self.patch_path_list:
+            return
+        self.patch_path_list = paths
+        self.patch_grid.setImagePaths(paths)
+        self.strip_timer.start()
+        self.cell_counts = {}
+        normalized = [p.replace("\\","/") for p in paths]
+        if paths and self.selected_patch_path not in normalized:
+            self.setSelectedPatchPath(paths[0])
+        else:
+            self.updatePatchInfo()
+        self.cell_counter.count(paths)
+
+    @tracing.traced("select patch")
     def setSelectedPatchPath(self, value):
         self.selected_patch_path = value.replace("\\","/")
         if self.selected_patch_path is not None:
             self.page_data["patch_name"] = self.parsePatchName()
-            pix = QPixmap(value)
+            self.updatePatchInfo()
+            image = self.prefetcher.get(value)
+            tracing.counter("patch prefetch", hit=int(image is not None))
+            if image is None:
+                image = get_image_service().image(value, PATCH_VIEW_SIZE)
+            self.patch_image = image
+            pix = QPixmap.fromImage(image)
             self.patchImage.setPixmap(pix)
             self.patchImage.adjustSize()
             img_size = self.patchImage.pixmap().size()
             self.patchImage.resize(img_size)
             # self.patchImage.setScaledContents(True)
             # self.patchImage.setImage(value)
+            self.cellOverlay.clear()
+            self.cellStrip.clearCells()
+            self.selected_cell_value.setText("")
+            self.contour_loader.load(value)
+            self.prefetchLikelyNext()
+
+    def setCellContours(self, path, result):
+        if path.replace("\\","/") != self.selected_patch_path:
+            return
+        self.cell_areas = result["areas"]
+        source_size = QSize(result["width"], result["height"])
+        self.cellOverlay.setContours(result["contours"], source_size)
+        # crops are cut from the image already decoded for the viewer
+        self.cellStrip.setSource(self.patch_image, source_size)
+        self.cellStrip.feedCells(self.cellOverlay.cellBoxes())
+
+    def setSelectedCell(self, index):
+        self.cellOverlay.setSelectedCell(index)
+        self.cellStrip.setSelectedCell(index)
+        if 0 <= index < len(self.cell_areas):
+            self.selected_cell_value.setText(f"#{index + 1}, {int(self.cell_areas[index])} px")
+
+    def setCellCounts(self, counts):
+        self.cell_counts = {path.replace("\\","/"): count for path, count in counts.items()}
+        self.updatePatchInfo()
+
+    def updatePatchInfo(self):
+        """Refreshes the column-2 form from page_data and the latest cell counts."""
+        count = self.cell_counts.get(self.selected_patch_path)
+        self.page_data["cell_count"] = count if count is not None else 0
+        self.patch_name_value.setText(self.page_data["patch_name"])
+        self.cell_count_value.setText(str(count) if count is not None else "...")
+        well_total = sum(self.cell_counts.values())
+        self.well_count_value.setText(str(well_total) if self.cell_counts else "...")
+
+    def _next_option(self, dropdown):
+        if dropdown is None or dropdown.count() == 0:
+            return None
+        index = dropdown.currentIndex() + 1
+        return dropdown.itemText(index) if index < dropdown.count() else None
+
+    def prefetchLikelyNext(self):
+        """
+        Decodes what the operator is most likely to open next: the grid
+        neighbours of the selected patch, then the first patches of the next
+        well and the next measurement (with their grid thumbnails).
+        """
+        paths = self.patch_path_list
+        if self.selected_patch_path is None or not paths:
+            return
+        normalized = [p.replace("\\","/") for p in paths]
+        try:
+            index = normalized.index(self.selected_patch_path)
+        except ValueError:
+            index = 0
+        likely = []
+        for step in (1, -1, GRID_COLUMNS, -GRID_COLUMNS):
+            if 0 <= index + step < len(paths):
+                likely.append(paths[index + step])
+
+        upcoming = []
+        next_well = self._next_option(self.well_dropdown)
+        if next_well:
+            upcoming.append(self.appData.getPatchImageFiles(self.selected_plate, next_well, self.selected_measurement))
+        next_measurement = self._next_option(self.measurement_dropdown)
+        if next_measurement:
+            upcoming.append(self.appData.getPatchImageFiles(self.selected_plate, self.selected_well, next_measurement))
+        for upcoming_paths in upcoming:
+            likely += upcoming_paths[:PREFETCH_NEXT_SELECTION]
+        self.prefetcher.prefetch(likely, thumbnail_sizes=(STRIP_THUMBNAIL_SIZE,))
+        grid_thumbnails = [p for upcoming_paths in upcoming for p in upcoming_paths]
+        self.prefetcher.prefetch(grid_thumbnails, full=False, thumbnail_sizes=(THUMBNAIL_SIZE,), replace=False)
+
+    def keyPressEvent(self, event):
+        """Arrow keys step through the patches in grid order."""
+        steps = {Qt.Key_Left: -1, Qt.Key_Right: 1, Qt.Key_Up: -GRID_COLUMNS, Qt.Key_Down: GRID_COLUMNS}
+        step = steps.get(event.key())
+        if step is None or not self.patch_path_list:
+            super().keyPressEvent(event)
+            return
+        normalized = [p.replace("\\","/") for p in self.patch_path_list]
+        current = normalized.index(self.selected_patch_path) if self.selected_patch_path in normalized else 0
+        target = current + step
+        if 0 <= target < len(self.patch_path_list):
+            self.setSelectedPatchPath(self.patch_path_list[target])
+
+    def setPatchScore(self, path, score, highlighted):
+        self.patch_scores[path] = (score, highlighted)
+        self.strip_timer.start()
+
+    def updatePredictionStrip(self):
+        current = set(self.patch_path_list)
+        ranked = sorted((score, path) for path, (score, highlighted) in self.patch_scores.items()
+                        if highlighted and path in current)
+        paths = [path for _, path in reversed(ranked[-STRIP_SLOTS:])]
+        if paths == self.strip_paths:
+            return
+        self.strip_paths = paths
+        in_memory = []
+        for slot, img_label in enumerate(self.strip_labels):
+            if slot >= len(paths):
+                img_label.clear()
+                continue
+            cached = self.strip_loader.cached(paths[slot])
+            if cached is not None:
+                img_label.setPixmap(QPixmap.fromImage(cached))
+                in_memory.append(slot)
+            else:
+                img_label.setPixmap(self.strip_placeholder)
+        self.strip_loader.load(paths, skip=in_memory)
+
+    def _set_strip_thumbnail(self, slot, image):
+        if slot < len(self.strip_paths) and not image.isNull():
+            self.strip_labels[slot].setPixmap(QPixmap.fromImage(image))
+
+    def _strip_clicked(self, slot):
+        if slot < len(self.strip_paths):
+            self.setSelectedPatchPath(self.strip_paths[slot])
 
     def updated_cellpicture(self):
-        print("Inside the update patch picture")
-        img_label = QLabel()
-        if self.selected_patch_path is not None:
-            pixmap = QPixmap(self.selected_patch_path)
-            pixmap = pixmap.scaled(50, 50, aspectMode=Qt.KeepAspectRatio)
-            img_label.setPixmap(pixmap)
-            img_label.setAlignment(Qt.AlignCenter)
+        # filled in by updatePredictionStrip()
+        img_label = ClickableLabel()
+        img_label.setAlignment(Qt.AlignCenter)
         return img_label
     
     def patchImageClicked(self):
-        print("Patch image clicked!!!")
\ No newline at end of file
+        tracing.instant("patch image clicked", path=self.selected_patch_path)
\ No newline at end of file
@@ -0,0 +1,156 @@
+'''
+Headless batch processing of a whole data directory.
+
+Tiles every plate, analyses every patch (cell counts and classifier scores)
+and writes the per-patch / per-well report, using all cores and no display:
+
+    python batch.py data/images
+    python batch.py data/images --shard 1/4 --workers 4   # one of four processes
+    python batch.py data/images --skip-tiling --report data/reports/run1.csv
+
+Runs are resumable: tiling skips plates its manifest says are up to date,
+and analysis results are kept in the result cache, so an interrupted run
+picks up where it stopped when started again with the same arguments.
+
+With --shard i/n the plates are split by a stable hash of their name
+(dataPreparation.in_shard), so n processes started with 1/n .. n/n share a
+dataset without coordinating; each writes its own manifest and report
+(report.shard-i-of-n.csv).
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+
+# nothing here needs a display; keep Qt quiet should anything import it
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from AppModules import dataPreparation, patchClassifier, reportExport, tracing
+from AppModules.memoryStats import peak_rss_bytes
+
+DEFAULT_REPORT = os.path.join("data", "reports", "report.csv")
+
+
+def parse_shard(value):
+    """'i/n' -> (i, n), with 1 <= i <= n."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected --shard i/n, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def shard_report_path(path, shard):
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+
+def default_workers(shard):
+    """All cores, divided between the shards running side by side on this machine."""
+    cores = os.cpu_count() or 1
+    return max(1, cores // shard[1]) if shard is not None else cores
+
+
+def _progress(label):
+    if not sys.stdout.isatty():
+        return None
+    return lambda done, total: print(f"\r{label} {done}/{total}", end="", flush=True)
+
+
+def run(input_dir, shard=None, workers=None, tile=True, analyse=True, report=DEFAULT_REPORT,
+        force=False, tiling_options=None):
+    """Runs the enabled stages; returns their stats as a dict."""
+    workers = workers or default_workers(shard)
+    stats = {"input_dir": input_dir, "shard": list(shard) if shard else None, "workers": workers}
+    start = time.perf_counter()
+
+    if tile:
+        tiling = dataPreparation.tile_dataset(input_dir, workers=workers, force=force, shard=shard,
+                                              **(tiling_options or {}))
+        stats["tiling"] = {key: tiling[key] for key in ("tiled", "skipped", "failed", "seconds",
+                                                        "images_per_second")}
+        stats["tiling"]["patches"] = sum(image["patches"] for image in tiling["images"].values())
+        print(dataPreparation.format_report(tiling))
+        for key, error in tiling["failed"].items():
+            print(f"  {key}: {error}", file=sys.stderr)
+
+    if analyse:
+        from AppModules.AppData import AppData, catalog_path
+        app_data = AppData(input_dir, catalog_path(input_dir))
+        plates = {plate for plate in app_data.getPlateNames() if dataPreparation.in_shard(plate, shard)}
+        path = shard_report_path(report, shard)
+        export = reportExport.export_report(path, app_data, plates, workers=workers,
+                                            progress=_progress("analysed patches"))
+        if sys.stdout.isatty():
+            print()
+        export["plates"] = len(plates)
+        export["patches_per_second"] = export["patch_rows"] / export["seconds"] if export["seconds"] > 0 else 0.0
+        stats["analysis"] = export
+        print(f"analysed {len(plates)} plates: {reportExport.format_stats(export)}")
+        print(f"report written to {export['path']} and {export['well_path']}")
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["peak_rss"] = peak_rss_bytes()
+    return stats
+
+
+def format_throughput(stats):
+    lines = [f"total {stats['seconds']:.2f}s with {stats['workers']} workers"
+             + (f", shard {stats['shard'][0]}/{stats['shard'][1]}" if stats["shard"] else "")]
+    if "tiling" in stats:
+        tiling = stats["tiling"]
+        lines.append(f"  tiling   {tiling['images_per_second']:.2f} images/s "
+                     f"({tiling['patches']} patches from {tiling['tiled']} images)")
+    if "analysis" in stats:
+        analysis = stats["analysis"]
+        lines.append(f"  analysis {analysis['patches_per_second']:.1f} patches/s, "
+                     f"{analysis['patches_per_second'] / stats['workers']:.1f} per worker")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tile, analyse and report a data directory without the GUI.")
+    parser.add_argument("input_dir", nargs="?", default=dataPreparation.DATA_DIR)
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="I/N",
+                        help="process only shard I of N (1-based), for N processes sharing the dataset")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: all cores, divided by N when sharded)")
+    parser.add_argument("--skip-tiling", action="store_true")
+    parser.add_argument("--skip-analysis", action="store_true")
+    parser.add_argument("--force", action="store_true", help="re-tile even if the manifest is up to date")
+    parser.add_argument("--report", default=DEFAULT_REPORT, help="report file (.csv or .parquet)")
+    parser.add_argument("--json", default=None, metavar="PATH", help="also write the stats to PATH as JSON")
+    parser.add_argument("--trace", default=None, metavar="PATH", help="write a Chrome trace of the run to PATH")
+    dataPreparation.add_tiling_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.trace:
+        tracing.enable(args.trace)
+
+    try:
+        stats = run(args.input_dir, args.shard, args.workers, tile=not args.skip_tiling,
+                    analyse=not args.skip_analysis, report=args.report, force=args.force,
+                    tiling_options=dataPreparation.tiling_options_from_args(args))
+    except KeyboardInterrupt:
+        print("\ninterrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+    except (RuntimeError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        patchClassifier.shutdown_executor()
+    print(format_throughput(stats))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+    failed = stats.get("tiling", {}).get("failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
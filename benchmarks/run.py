@@ -0,0 +1,579 @@
+'''
+Headless benchmark suite for the GUI hot paths.
+
+    python -m benchmarks.run                       # run everything
+    python -m benchmarks.run --only grid16,viewer  # a subset
+    python -m benchmarks.run --save-baseline       # store this run as the baseline
+
+Runs offscreen on any Linux box. A synthetic dataset is generated in a
+temporary directory, which also becomes the working directory so the app's
+relative data/ paths point at it. Results are written as JSON and compared
+with benchmarks/baseline.json; a metric that got worse by more than the
+threshold is reported as a regression and the exit code is 1.
+
+Metrics ending in _per_second are better when higher, all others (times in
+ms) when lower.
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from benchmarks import synthetic
+
+BENCH_DIR = os.path.join(REPO_ROOT, "benchmarks")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+# differences smaller than this are noise, whatever the ratio
+MIN_DELTA_MS = 1.0
+
+
+def median(values):
+    return statistics.median(values) if values else 0.0
+
+
+class Context:
+    def __init__(self, args, root):
+        self.args = args
+        self.root = root
+        self._app = None
+
+    @property
+    def app(self):
+        if self._app is None:
+            from PySide6.QtWidgets import QApplication
+            self._app = QApplication.instance() or QApplication([])
+        return self._app
+
+    def spin(self, ms):
+        from PySide6.QtCore import QEventLoop, QTimer
+        self.app
+        loop = QEventLoop()
+        QTimer.singleShot(ms, loop.quit)
+        loop.exec()
+
+    def wait_for(self, condition, timeout_ms=10000, step_ms=5):
+        """Runs the event loop until condition() is true; returns the elapsed ms."""
+        start = time.perf_counter()
+        while not condition():
+            if (time.perf_counter() - start) * 1000 > timeout_ms:
+                break
+            self.spin(step_ms)
+        return (time.perf_counter() - start) * 1000
+
+    def dataset_patches(self):
+        from AppModules import patchPack
+        first = os.path.join(self.root, "data", "images", "P01", "W01", "001")
+        return patchPack.list_patch_sources(first)
+
+
+# ---- benchmarks --------------------------------------------------------------
+
+def bench_cut(ctx):
+    """cut_image_into_4x4 throughput on synthetic JPEGs."""
+    from AppModules import dataPreparation
+    size = ctx.args.image_size
+    source_dir = os.path.join(ctx.root, "cut")
+    images = [synthetic.make_image(os.path.join(source_dir, f"image_{i}.jpg"), size, seed=100 + i)
+              for i in range(ctx.args.repeats)]
+    times = []
+    for i, image_path in enumerate(images):
+        output_dir = os.path.join(source_dir, f"patches_{i}")
+        os.makedirs(output_dir, exist_ok=True)
+        start = time.perf_counter()
+        dataPreparation.cut_image_into_4x4(image_path, output_dir=output_dir)
+        times.append(time.perf_counter() - start)
+    total = sum(times)
+    return {
+        "cut_ms_per_image": median(times) * 1000,
+        "cut_images_per_second": len(times) / total,
+        "cut_megapixels_per_second": len(times) * size * size / 1e6 / total,
+    }
+
+
+def bench_memcut(ctx):
+    """cut_image_in_memory, then its patches in a 4x4 grid straight from memory."""
+    from AppModules import dataPreparation, imageBridge
+    from AppWidgets.ImageGrid import ImageGridWindow
+    size = ctx.args.image_size
+    source_dir = os.path.join(ctx.root, "memcut")
+    images = [synthetic.make_image(os.path.join(source_dir, f"image_{i}.jpg"), size, seed=200 + i)
+              for i in range(ctx.args.repeats)]
+    cut, thumbnails, copies = [], [], []
+    for i, image_path in enumerate(images):
+        start = time.perf_counter()
+        refs = dataPreparation.cut_image_in_memory(image_path, name=f"memcut{i}")
+        cut.append((time.perf_counter() - start) * 1000)
+        imageBridge.reset_stats()
+        start = time.perf_counter()
+        grid = ImageGridWindow(refs)
+        grid.show()
+        thumbnails.append((time.perf_counter() - start) * 1000 + ctx.wait_for(lambda: _grid_thumbnails_done(grid)))
+        copies.append(imageBridge.stats()["copies"])
+        grid.close()
+        grid.deleteLater()
+        imageBridge.clear_registry(f"memcut{i}/")
+        ctx.spin(10)
+    return {
+        "memcut_ms_per_image": median(cut),
+        "memcut_grid16_thumbnails_ms": median(thumbnails),
+        # pixel copies made by the bridge while the grid was filled
+        "memcut_grid16_bridge_copies": median(copies),
+    }
+
+
+def bench_codecs(ctx):
+    """Encode and decode time per patch of the patch codecs, on the patches of a synthetic image."""
+    from AppModules import dataPreparation, patchCodecs
+    image_path = synthetic.make_image(os.path.join(ctx.root, "codecs", "image.jpg"), ctx.args.image_size, seed=300)
+    patches = [patch for _, _, patch in dataPreparation.iter_patches(image_path)]
+    results = {}
+    for r in patchCodecs.benchmark(patches, ("png", "webp", "ppm"), ctx.args.repeats):
+        results[f"codecs_{r['codec']}_encode_ms"] = r["encode_ms"]
+        results[f"codecs_{r['codec']}_decode_ms"] = r["decode_ms"]
+    return results
+
+
+def _grid_thumbnails_done(grid):
+    loaded = [label.pixmap().cacheKey() != grid._placeholder.cacheKey() for label in grid._labels[:len(grid._paths)]]
+    return all(loaded)
+
+
+def bench_grid16(ctx):
+    """ImageGridWindow construction and time until all 16 thumbnails are shown."""
+    from AppModules.thumbnailCache import get_thumbnail_cache
+    from AppWidgets.ImageGrid import ImageGridWindow
+    paths = ctx.dataset_patches()
+    construct, thumbnails, rebind = [], [], []
+    for _ in range(ctx.args.repeats):
+        get_thumbnail_cache().invalidate()
+        start = time.perf_counter()
+        grid = ImageGridWindow(paths)
+        construct.append((time.perf_counter() - start) * 1000)
+        grid.show()
+        thumbnails.append((time.perf_counter() - start) * 1000 + ctx.wait_for(lambda: _grid_thumbnails_done(grid)))
+        # switching to another plate reuses the widgets
+        start = time.perf_counter()
+        grid.setImagePaths(list(reversed(paths)))
+        rebind.append((time.perf_counter() - start) * 1000)
+        grid.close()
+        grid.deleteLater()
+        ctx.spin(10)
+    return {
+        "grid16_construct_ms": median(construct),
+        "grid16_thumbnails_ms": median(thumbnails),
+        "grid16_rebind_ms": median(rebind),
+    }
+
+
+def bench_gridN(ctx):
+    """ImageGridWindow with N patches: construction and scroll frame time."""
+    from AppWidgets.ImageGrid import ImageGridWindow
+    count = ctx.args.patches
+    paths = synthetic.make_patch_dir(os.path.join(ctx.root, "grid"), count)
+    construct, frames = [], []
+    for _ in range(ctx.args.repeats):
+        start = time.perf_counter()
+        grid = ImageGridWindow(paths)
+        construct.append((time.perf_counter() - start) * 1000)
+        grid.resize(600, 500)
+        grid.show()
+        ctx.spin(50)
+        view = grid.grid_view
+        bar = view.verticalScrollBar()
+        for step in range(20):
+            bar.setValue(int(bar.maximum() * step / 19))
+            start = time.perf_counter()
+            view.viewport().grab()
+            frames.append((time.perf_counter() - start) * 1000)
+        grid.close()
+        grid.deleteLater()
+        ctx.spin(10)
+    return {
+        "gridN_patches": count,
+        "gridN_construct_ms": median(construct),
+        "gridN_scroll_frame_ms": median(frames),
+    }
+
+
+def _viewer_metrics(ctx, prefix, image_path):
+    from AppModules.imageService import get_image_service
+    from AppWidgets.ImageViewer2 import ImageViewerWidget
+    service = get_image_service()
+    viewer = ImageViewerWidget()
+    viewer.resize(800, 600)
+    viewer.show()
+    ctx.spin(20)
+    load, zoom, fit, resize = [], [], [], []
+    for _ in range(ctx.args.repeats):
+        # measure the decode, not a hit in the shared image memory
+        service.invalidate()
+        decoded = service.decoded_bytes
+        start = time.perf_counter()
+        viewer.load_image(image_path)
+        viewer.grab()
+        load.append((time.perf_counter() - start) * 1000)
+        decoded = service.decoded_bytes - decoded
+    for i in range(ctx.args.repeats * 2):
+        start = time.perf_counter()
+        viewer.zoom_in() if i % 4 < 2 else viewer.zoom_out()
+        # the interactive pass the scheduler would run, plus the paint
+        viewer._update_image_display(smooth=False)
+        viewer.grab()
+        zoom.append((time.perf_counter() - start) * 1000)
+    for i in range(ctx.args.repeats):
+        start = time.perf_counter()
+        viewer.fit_to_window()
+        viewer.grab()
+        fit.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        viewer.resize(800 + 40 * (i % 2), 600)
+        viewer._update_image_display(smooth=False)
+        viewer.grab()
+        resize.append((time.perf_counter() - start) * 1000)
+    viewer.close()
+    viewer.deleteLater()
+    ctx.spin(10)
+    return {
+        f"{prefix}_load_ms": median(load),
+        # bytes decoded to show the image fitted to the window
+        f"{prefix}_load_decoded_mb": decoded / 2**20,
+        f"{prefix}_zoom_ms": median(zoom),
+        f"{prefix}_fit_ms": median(fit),
+        f"{prefix}_resize_ms": median(resize),
+    }
+
+
+def bench_viewer(ctx):
+    """ImageViewerWidget load, zoom, fit and resize latency for a patch and a large image."""
+    large = synthetic.make_image(os.path.join(ctx.root, "viewer", "large.jpg"), ctx.args.large_image_size, seed=7)
+    metrics = _viewer_metrics(ctx, "viewer_patch", ctx.dataset_patches()[0])
+    metrics.update(_viewer_metrics(ctx, "viewer_large", large))
+    return metrics
+
+
+def _circle_contours(count, width, height, seed=0):
+    """`count` round outlines spread over a width x height image."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform((20, 20), (width - 20, height - 20), (count, 2))
+    radii = rng.uniform(5, 15, count)
+    contours = []
+    for (cx, cy), radius in zip(centres, radii):
+        angles = np.linspace(0, 2 * np.pi, int(radius * 4), endpoint=False)
+        contours.append(np.stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)], axis=1))
+    return contours
+
+
+def bench_overlay(ctx):
+    """CellOverlay with 10k outlines on a large image: set, pan and zoom frames, hit testing."""
+    import numpy as np
+    from PySide6.QtCore import QPointF
+    from AppWidgets.ImageViewer2 import ImageViewerWidget
+    large = synthetic.make_image(os.path.join(ctx.root, "viewer", "large.jpg"), ctx.args.large_image_size, seed=7)
+    viewer = ImageViewerWidget()
+    viewer.resize(800, 600)
+    viewer.show()
+    viewer.load_image(large)
+    ctx.spin(20)
+    size = viewer._image_size()
+    contours = _circle_contours(ctx.args.contours, size.width(), size.height())
+    set_times, pan, zoom = [], [], []
+    for _ in range(ctx.args.repeats):
+        start = time.perf_counter()
+        viewer.setCellContours(contours)
+        viewer.grab()
+        set_times.append((time.perf_counter() - start) * 1000)
+    for i in range(ctx.args.repeats * 2):
+        start = time.perf_counter()
+        viewer.zoom_in() if i % 4 < 2 else viewer.zoom_out()
+        viewer._update_image_display(smooth=False)
+        viewer.grab()
+        zoom.append((time.perf_counter() - start) * 1000)
+    for _ in range(3):
+        viewer.zoom_in()
+    viewer._update_image_display(smooth=False)
+    bar = viewer.scroll_area.horizontalScrollBar()
+    for i in range(ctx.args.repeats * 4):
+        start = time.perf_counter()
+        bar.setValue((bar.value() + 97) % max(1, bar.maximum()))
+        viewer.grab()
+        pan.append((time.perf_counter() - start) * 1000)
+    overlay = viewer.overlay
+    rng = np.random.default_rng(1)
+    points = [QPointF(x, y) for x, y in rng.uniform((0, 0), (overlay.width(), overlay.height()), (2000, 2))]
+    start = time.perf_counter()
+    for point in points:
+        overlay.cellAt(point)
+    hit_us = (time.perf_counter() - start) * 1e6 / len(points)
+    viewer.close()
+    viewer.deleteLater()
+    ctx.spin(10)
+    return {
+        "overlay_set_ms": median(set_times),
+        "overlay_zoom_ms": median(zoom),
+        "overlay_pan_ms": median(pan),
+        "overlay_hit_test_us": hit_us,
+    }
+
+
+def bench_page2(ctx):
+    """Page2 selection changes: plate and well to first pixels, a burst of well changes, patch."""
+    from PySide6.QtWidgets import QComboBox
+    from AppWidgets.page2 import Page2
+    page = Page2()
+    page.show()
+    ctx.spin(100)
+    plates, wells, _ = page.findChildren(QComboBox)[:3]
+    latencies = []
+    page.selection.latencyMeasured.connect(latencies.append)
+    applied = []
+    page.selection.selectionReady.connect(applied.append)
+
+    def settle():
+        # the latency is measured at the first paint after the selection was applied
+        count = len(latencies)
+        ctx.wait_for(lambda: len(latencies) > count, timeout_ms=2000)
+        return latencies[-1] if len(latencies) > count else None
+
+    plate_times, well_times, first_pixels, patch_times, burst_applies = [], [], [], [], []
+    for i in range(ctx.args.repeats):
+        for combo, times in ((plates, plate_times), (wells, well_times)):
+            if combo.count() < 2:
+                continue
+            combo.setCurrentIndex((combo.currentIndex() + 1) % combo.count())
+            latency = settle()
+            if latency is not None:
+                # the work done for the selection, without the deliberate debounce wait
+                times.append(latency["first_pixels_ms"] - latency["debounce_ms"])
+                first_pixels.append(latency["first_pixels_ms"])
+        if wells.count() >= 2:
+            # stepping through the wells faster than the debounce refreshes the page once
+            before = len(applied)
+            for step in range(wells.count() - 1):
+                wells.setCurrentIndex((wells.currentIndex() + 1) % wells.count())
+                ctx.spin(10)
+            settle()
+            burst_applies.append(len(applied) - before)
+        path = page.patch_path_list[i % len(page.patch_path_list)]
+        start = time.perf_counter()
+        page.setSelectedPatchPath(path)
+        page.grab()
+        patch_times.append((time.perf_counter() - start) * 1000)
+        ctx.spin(20)
+    page.close()
+    page.deleteLater()
+    ctx.spin(10)
+    return {
+        "page2_plate_switch_ms": median(plate_times),
+        "page2_well_switch_ms": median(well_times),
+        "page2_selection_first_pixels_ms": median(first_pixels),
+        "page2_well_burst_refreshes": median(burst_applies),
+        "page2_patch_select_ms": median(patch_times),
+    }
+
+
+STARTUP_SCRIPT = """
+import json, sys
+from AppModules import startupProfile
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QTimer
+import main
+app = QApplication(sys.argv)
+window = main.MyApp()
+startupProfile.watch_first_paint(window)
+window.show()
+def check():
+    if startupProfile.elapsed_ms("interactive") is None or startupProfile.elapsed_ms("first paint") is None:
+        QTimer.singleShot(5, check)
+        return
+    print("STARTUP " + json.dumps(startupProfile.summary()["marks"]))
+    app.quit()
+QTimer.singleShot(0, check)
+app.exec()
+"""
+
+
+def bench_startup(ctx):
+    """Cold start of MyApp in a fresh interpreter: first paint and interactive."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    first_paint, interactive = [], []
+    for _ in range(ctx.args.repeats):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=ctx.root, env=env,
+                                capture_output=True, text=True, timeout=120).stdout
+        for line in output.splitlines():
+            if line.startswith("STARTUP "):
+                marks = json.loads(line[len("STARTUP "):])
+                first_paint.append(marks["first paint"])
+                interactive.append(marks["interactive"])
+    return {
+        "startup_first_paint_ms": median(first_paint),
+        "startup_interactive_ms": median(interactive),
+    }
+
+
+BENCHMARKS = {
+    "cut": bench_cut,
+    "memcut": bench_memcut,
+    "codecs": bench_codecs,
+    "grid16": bench_grid16,
+    "gridN": bench_gridN,
+    "viewer": bench_viewer,
+    "overlay": bench_overlay,
+    "page2": bench_page2,
+    "startup": bench_startup,
+}
+
+
+# ---- results -----------------------------------------------------------------
+
+def higher_is_better(metric):
+    return metric.endswith("_per_second")
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Regressions of `results` against `baseline` as (benchmark, metric, base, value, change) tuples."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base or not isinstance(value, (int, float)) or metric.endswith("_patches"):
+                continue
+            change = (value - base) / base
+            if higher_is_better(metric):
+                worse = change < -threshold
+            else:
+                worse = change > threshold and value - base > MIN_DELTA_MS
+            if worse:
+                regressions.append((name, metric, base, value, change))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    lines = []
+    for name, metrics in results.items():
+        lines.append(name)
+        for metric, value in metrics.items():
+            line = f"  {metric:<32}{value:12.2f}"
+            base = (baseline or {}).get(name, {}).get(metric)
+            if base:
+                line += f"   baseline {base:10.2f}  ({(value - base) / base:+.0%})"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def metadata(args):
+    import PySide6
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pyside6": PySide6.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "dataset": {"plates": args.plates, "wells": args.wells, "image_size": args.image_size,
+                    "patches": args.patches, "large_image_size": args.large_image_size},
+        "repeats": args.repeats,
+    }
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the GUI hot paths.")
+    parser.add_argument("--only", default="", help="comma separated subset of: " + ",".join(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--plates", type=int, default=2)
+    parser.add_argument("--wells", type=int, default=2)
+    parser.add_argument("--image-size", type=int, default=1536, help="side of the synthetic source images")
+    parser.add_argument("--large-image-size", type=int, default=4096, help="side of the deep-zoom viewer image")
+    parser.add_argument("--contours", type=int, default=10000, help="cell outlines in the overlay benchmark")
+    parser.add_argument("--patches", type=int, default=2000, help="N for the N-patch grid")
+    parser.add_argument("--workdir", default=None, help="where to build the dataset (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated dataset")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="only measure; do not require or compare with a baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    args = parser.parse_args(argv)
+
+    selected = [name for name in args.only.split(",") if name] or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    compare_with_baseline = not args.save_baseline and not args.no_baseline
+    if compare_with_baseline and not os.path.exists(args.baseline):
+        # without a baseline nothing could ever count as a regression
+        print(f"error: no baseline at {args.baseline}; record one on the reference machine with\n"
+              f"  python -m benchmarks.run --save-baseline\n"
+              f"or run with --no-baseline to only measure", file=sys.stderr)
+        return 2
+
+    root = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="app-bench-"))
+    os.makedirs(root, exist_ok=True)
+    previous_dir = os.getcwd()
+    results = {}
+    try:
+        print(f"generating dataset in {root}")
+        synthetic.make_dataset(root, args.plates, args.wells, image_size=args.image_size)
+        os.chdir(root)
+        ctx = Context(args, root)
+        ctx.app
+        for name in selected:
+            start = time.perf_counter()
+            results[name] = BENCHMARKS[name](ctx)
+            print(f"{name}: done in {time.perf_counter() - start:.1f}s")
+    finally:
+        os.chdir(previous_dir)
+        if not args.keep and args.workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    baseline = {}
+    if compare_with_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+    print(format_results(results, baseline))
+    data = {"meta": metadata(args), "results": results}
+    save_json(args.output, data)
+    print(f"results written to {args.output}")
+    if args.save_baseline:
+        save_json(args.baseline, data)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not compare_with_baseline:
+        return 0
+    unmeasured = [name for name in results if name not in baseline]
+    if unmeasured:
+        print(f"warning: the baseline has no results for {', '.join(unmeasured)}; "
+              f"run with --save-baseline to include them", file=sys.stderr)
+    regressions = compare(results, baseline, args.threshold)
+    for name, metric, base, value, change in regressions:
+        print(f"REGRESSION {name}.{metric}: {base:.2f} -> {value:.2f} ({change:+.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
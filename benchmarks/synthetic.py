@@ -0,0 +1,69 @@
+'''
+Synthetic datasets for the benchmarks.
+
+Images are a noisy bright background with dark round "cells", so the
+classifier and the cell counter have something to find. The layout is the
+one the app reads:
+
+    <root>/data/images/<plate>/<well>/<measurement>/source.jpg + patches/
+'''
+
+import os
+
+import numpy as np
+from PIL import Image
+
+from AppModules import dataPreparation
+
+
+def make_image(path, size=2048, cells=400, seed=0, quality=90):
+    """Writes a size x size JPEG with `cells` dark disks and returns its path."""
+    rng = np.random.default_rng(seed)
+    image = rng.normal(200, 12, (size, size)).astype(np.float32)
+    radius = max(3, size // 200)
+    for cy, cx in rng.integers(radius, size - radius, (cells, 2)):
+        y0, y1, x0, x1 = cy - radius, cy + radius + 1, cx - radius, cx + radius + 1
+        yy, xx = np.ogrid[y0:y1, x0:x1]
+        disk = (yy - cy) ** 2 + (xx - cx) ** 2 <= radius * radius
+        image[y0:y1, x0:x1][disk] = rng.normal(60, 10)
+    grey = np.clip(image, 0, 255).astype(np.uint8)
+    rgb = np.stack([grey, (grey * 0.9).astype(np.uint8), grey], axis=-1)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    Image.fromarray(rgb).save(path, quality=quality)
+    return path
+
+
+def make_dataset(root, plates=2, wells=2, measurements=1, image_size=1536, cut=True):
+    """
+    Creates plates/wells/measurements below <root>/data/images, each with a
+    source image and (if cut) its 4x4 patches. Returns the source images.
+    """
+    images = []
+    for p in range(plates):
+        for w in range(wells):
+            for m in range(measurements):
+                directory = os.path.join(root, "data", "images", f"P{p + 1:02d}", f"W{w + 1:02d}", f"{m + 1:03d}")
+                seed = (p * wells + w) * measurements + m
+                image_path = make_image(os.path.join(directory, "source.jpg"), image_size, seed=seed)
+                if cut:
+                    patch_dir = dataPreparation.output_path(directory)
+                    os.makedirs(patch_dir, exist_ok=True)
+                    dataPreparation.cut_image_into_4x4(image_path, output_dir=patch_dir)
+                images.append(image_path)
+    return images
+
+
+def make_patch_dir(directory, count, size=128, seed=0):
+    """Writes `count` small PNG patches named patch_<row>_<col>.png; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    source = make_image(os.path.join(directory, "source.jpg"), size * 8, cells=200, seed=seed)
+    with Image.open(source) as image:
+        tiles = [image.crop((x * size, y * size, (x + 1) * size, (y + 1) * size)) for y in range(8) for x in range(8)]
+    os.remove(source)
+    columns = max(1, int(count ** 0.5))
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"patch_{i // columns}_{i % columns}.png")
+        tiles[i % len(tiles)].save(path)
+        paths.append(path)
+    return paths
@@ -1,20 +1,29 @@
+from AppModules import startupProfile, tracing
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
-    QLabel, QPushButton, QComboBox, QFrame, QSizePolicy, QMenuBar
+    QLabel, QPushButton, QComboBox, QFrame, QSizePolicy, QMenuBar, QFileDialog, QProgressDialog
 )
-from PySide6.QtCore import Qt, Slot
-import os
+from PySide6.QtCore import Qt, Slot, QTimer
 
 from AppWidgets.MiniWidgets import create_card_frame
-from AppWidgets.ImageGrid import ImageGridWindow
-from AppWidgets.ImageViewer import ImageViewer
-
-DATA_DIR = "data/images"
+# AppData, the grid and the viewer are imported in finish_setup() so the
+# shell window can be shown before they are loaded
 
 class MyApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, deferred=True):
+        """
+        With deferred=True only the shell (menu, dropdown row, empty columns)
+        is built here; the catalog, grid and viewer follow in finish_setup()
+        right after the window is first painted.
+        """
         super().__init__()
         self.setWindowTitle("My PySide6 App")
+        self.appData = None
+        self.gridImage = None
+        self.patchImg = None
+        self.reportExporter = None
+        self.reportProgress = None
+        self._setup_pending = True
 
         # Central widget to hold our main layout
         self.central_widget = QWidget()
@@ -26,6 +35,14 @@ class MyApp(QMainWindow):
         self.main_v_layout.setSpacing(0) # No extra spacing between main sections
 
         self.setup_ui()
+        if not deferred:
+            self.finish_setup()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self._setup_pending:
+            # the shell has been painted; build the rest on the next loop pass
+            QTimer.singleShot(0, self.finish_setup)
 
     def setup_ui(self):
         # --- 1. Menu Bar (Red Color) ---
@@ -40,6 +57,8 @@ class MyApp(QMainWindow):
         # For simplicity, let's just make "menu" items as actions
         view_list_action = self.menu_bar.addAction("Menu1")
         download_report_action = self.menu_bar.addAction("Menu2")
+        download_report_action.setToolTip("Download Report")
+        download_report_action.triggered.connect(self.downloadReport)
 
         # Align actions to the right (QMenuBar handles this automatically for actions)
         # For a more custom layout within the menu bar, you'd embed a QWidget and use a QHBoxLayout within it.
@@ -71,13 +90,10 @@ class MyApp(QMainWindow):
         dropdown_frame.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
 
         # Example Dropdowns
-        dropdown1 = QComboBox()
+        self.plate_dropdown = dropdown1 = QComboBox()
         dropdown1.setGeometry(0,0,40,100)
-        options = os.listdir(DATA_DIR)
-        dropdown1.addItems(list(options))
         dropdown1.setPlaceholderText("Select 1")
         dropdown1.setStyleSheet("background-color:rgb(255,255,255);color:rgb(23,23,23)")
-        dropdown1.currentTextChanged.connect(self.setGridView)
 
         # dropdown2 = QComboBox()
         # dropdown2.addItems(["Option A", "Option B"])
@@ -102,11 +118,9 @@ class MyApp(QMainWindow):
 
         # Column 1 (40% screen width)
         col1_frame = create_card_frame(color="rgb(255,255,255)")
-        col1_layout = QVBoxLayout(col1_frame)
+        self.col1_layout = col1_layout = QVBoxLayout(col1_frame)
         col1_layout.addWidget(QLabel("Column 1 (40%)"))
-        self.gridImage = self.setGridView(options[0])
-        col1_layout.addWidget(self.gridImage)
-       
+        # the grid is inserted here by finish_setup()
         col1_layout.addStretch(1) # Push content to top
 
         # Column 2 (20% screen width or max 250px width)
@@ -131,10 +145,9 @@ class MyApp(QMainWindow):
 
         # Column 3 - Row 2 (Takes the rest of the height)
         col3_row2_frame = create_card_frame(color="rgb(255,255,255)")
-        col3_row2_layout = QVBoxLayout(col3_row2_frame)
+        self.col3_row2_layout = col3_row2_layout = QVBoxLayout(col3_row2_frame)
         col3_row2_layout.addWidget(QLabel("Col 3 - Row 2 (Rest)"))
-        self.patchImg = ImageViewer(None)
-        col3_row2_layout.addWidget(self.patchImg)
+        # the patch viewer is inserted here by finish_setup()
         col3_row2_layout.addStretch(1)
 
 
@@ -155,24 +168,117 @@ class MyApp(QMainWindow):
 
         self.main_v_layout.addWidget(main_content_container)
 
+    def finish_setup(self):
+        """Loads the catalog and builds the grid and viewer; runs once."""
+        if not self._setup_pending:
+            return
+        self._setup_pending = False
+        with startupProfile.phase("load catalog"):
+            from AppModules.AppData import get_app_data
+            # the same catalog as Page2, so both see its refreshes
+            self.appData = get_app_data()
+            options = self.appData.getPlateNames()
+            self.plate_dropdown.blockSignals(True)
+            self.plate_dropdown.addItems(list(options))
+            self.plate_dropdown.blockSignals(False)
+            self.plate_dropdown.currentTextChanged.connect(self.setGridView)
+
+        with startupProfile.phase("build grid"):
+            if options:
+                self.gridImage = self.setGridView(options[0])
+                self.col1_layout.insertWidget(1, self.gridImage)
+
+        with startupProfile.phase("build viewer"):
+            from AppWidgets.ImageViewer import ImageViewer
+            self.patchImg = ImageViewer(None)
+            self.col3_row2_layout.insertWidget(1, self.patchImg)
+        startupProfile.mark_interactive()
+
     def setGridView(self, value):
-        print("{} selected".format(value))
-        patches = [os.path.join(DATA_DIR,value,"patches",i) for i in os.listdir(os.path.join(DATA_DIR,value,"patches"))]
-        print(len(patches))
+        with tracing.span("select plate", plate=value) as span:
+            patches = self.appData.getPatchImageFiles(value)
+            span.set(patches=len(patches))
+            if self.gridImage is not None:
+                # rebind the existing grid instead of building a new window
+                self.gridImage.setImagePaths(patches)
+                return self.gridImage
+        from AppWidgets.ImageGrid import ImageGridWindow
         gridImage = ImageGridWindow(patches)
         gridImage.patch_clicked.connect(self.setPatchImage)
         return gridImage
+
+    def downloadReport(self):
+        """Exports per-patch and per-well statistics of every plate in the background."""
+        if self.appData is None:
+            return
+        if self.reportExporter is not None and self.reportExporter.isRunning():
+            self.reportProgress.show()
+            return
+        from AppModules.reportExport import parquet_available
+        # only offer Parquet where the writer can run
+        filters = "CSV (*.csv);;Parquet (*.parquet)" if parquet_available() else "CSV (*.csv)"
+        path, _ = QFileDialog.getSaveFileName(self, "Download Report", "report.csv", filters)
+        if not path:
+            return
+        if self.reportExporter is None:
+            from AppModules.reportExportLoader import ReportExportLoader
+            self.reportExporter = ReportExportLoader(parent=self)
+            self.reportExporter.progress.connect(self._reportProgress)
+            self.reportExporter.finished.connect(self._reportFinished)
+            self.reportExporter.failed.connect(self._reportFailed)
+            self.reportProgress = QProgressDialog("Exporting report...", "Cancel", 0, 0, self)
+            self.reportProgress.setWindowTitle("Download Report")
+            self.reportProgress.setMinimumDuration(0)
+            self.reportProgress.canceled.connect(self.reportExporter.cancel)
+        self.reportProgress.setRange(0, 0)
+        self.reportProgress.show()
+        self.reportExporter.export(path, self.appData)
+
+    def _reportProgress(self, done, total):
+        self.reportProgress.setMaximum(max(total, 1))
+        self.reportProgress.setValue(done)
+        self.reportProgress.setLabelText(f"Exporting report: {done} of {total} patches")
+
+    def _reportFinished(self, stats):
+        from AppModules.reportExport import format_stats
+        self.reportProgress.reset()
+        self.statusBar().showMessage(f"Report saved to {stats['path']}: {format_stats(stats)}")
+
+    def _reportFailed(self, message):
+        self.reportProgress.reset()
+        self.statusBar().showMessage(f"Report export {message}" if message == "cancelled"
+                                     else f"Report export failed: {message}")
+
+    def showQtStats(self, qobjects, widgets):
+        self.statusBar().showMessage(f"QObjects: {qobjects}   Widgets: {widgets}")
     
     @Slot()
     def setPatchImage(self,image_path):
-        self.patchImg.setImage(image_path)
-        print(f"Patch image set to: {image_path}")
+        if self.patchImg is None:
+            return
+        with tracing.span("show patch", path=image_path):
+            self.patchImg.setImage(image_path)
 
 
 if __name__ == "__main__":
     import sys
-    app = QApplication(sys.argv)
-    window = MyApp()
+    import multiprocessing
+    # the frozen exe starts the classifier's worker processes from itself
+    multiprocessing.freeze_support()
+    # --trace[=PATH] or APP_TRACE=1 records spans of the hot paths for chrome://tracing
+    tracing.enable_from_environment()
+    startupProfile.mark("imports done")
+    with startupProfile.phase("create QApplication"):
+        app = QApplication(sys.argv)
+    with startupProfile.phase("build shell"):
+        window = MyApp()
+    startupProfile.watch_first_paint(window)
+    if "--qt-stats" in sys.argv:
+        from AppModules.qtStats import QObjectMonitor
+        # live object counts in the status bar, to watch for widget churn
+        monitor = QObjectMonitor(parent=window)
+        monitor.sampled.connect(window.showQtStats)
+        monitor.sample()
     window.resize(1000, 700) # Initial size for demonstration
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -1,16 +1,26 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+# Built as a one-folder app: a one-file exe unpacks itself to a temp
+# directory on every launch, which dominates the cold start time.
+# Modules the app never imports are excluded so they are not collected.
+excludes = [
+    'pandas', 'matplotlib', 'seaborn', 'scipy', 'tkinter', 'IPython', 'pytest',
+    'PySide6.QtWebEngineCore', 'PySide6.QtWebEngineWidgets', 'PySide6.QtQml',
+    'PySide6.QtQuick', 'PySide6.QtMultimedia', 'PySide6.Qt3DCore', 'PySide6.QtCharts',
+    'PySide6.QtDataVisualization', 'PySide6.QtPdf', 'PySide6.QtBluetooth',
+]
 
 a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # the Parquet report writer imports pyarrow lazily
+    hiddenimports=['pyarrow', 'pyarrow.parquet'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=excludes,
     noarchive=False,
     optimize=0,
 )
@@ -19,16 +29,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='My App',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +43,13 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='My App',
+)